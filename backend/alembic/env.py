@@ -9,6 +9,7 @@ from sqlmodel import SQLModel
 from app.models.book import Book # noqa F401
 from app.models.bookshelf import Bookshelf # noqa F401
 from app.models.book_bookshelf import BookBookshelfLink # noqa F401
+from app.models.search_cache import SearchCache # noqa F401
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -25,6 +26,14 @@ if config.config_file_name is not None:
 # target_metadata = mymodel.Base.metadata
 target_metadata = SQLModel.metadata
 
+
+def include_object(object, name, type_, reflected, compare_to):
+    # The full-text index and its shadow tables are created by raw DDL, not the metadata,
+    # so autogenerate would otherwise try to drop them
+    if type_ == "table" and reflected and compare_to is None and name.startswith("book_fts"):
+        return False
+    return True
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -47,6 +56,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -70,7 +80,9 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
         )
 
         with context.begin_transaction():
@@ -0,0 +1,57 @@
+"""Add book_fts full-text index over book title, author and review
+
+Revision ID: 5b2e7c9d41f0
+Revises: 411363141e85
+Create Date: 2026-10-18 10:12:44.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b2e7c9d41f0'
+down_revision: Union[str, None] = '411363141e85'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # External content FTS5 table: only the index is stored, text is read from `book`
+    op.execute("""
+        CREATE VIRTUAL TABLE book_fts USING fts5(
+            title, author, review,
+            content='book', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+    op.execute("""
+        CREATE TRIGGER book_fts_after_insert AFTER INSERT ON book BEGIN
+            INSERT INTO book_fts(rowid, title, author, review)
+            VALUES (new.id, new.title, new.author, new.review);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER book_fts_after_delete AFTER DELETE ON book BEGIN
+            INSERT INTO book_fts(book_fts, rowid, title, author, review)
+            VALUES ('delete', old.id, old.title, old.author, old.review);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER book_fts_after_update AFTER UPDATE OF title, author, review ON book BEGIN
+            INSERT INTO book_fts(book_fts, rowid, title, author, review)
+            VALUES ('delete', old.id, old.title, old.author, old.review);
+            INSERT INTO book_fts(rowid, title, author, review)
+            VALUES (new.id, new.title, new.author, new.review);
+        END
+    """)
+    # Index every book that already exists
+    op.execute("INSERT INTO book_fts(book_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS book_fts_after_update")
+    op.execute("DROP TRIGGER IF EXISTS book_fts_after_delete")
+    op.execute("DROP TRIGGER IF EXISTS book_fts_after_insert")
+    op.execute("DROP TABLE IF EXISTS book_fts")
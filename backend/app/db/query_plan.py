@@ -0,0 +1,134 @@
+import re
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from sqlalchemy import event
+
+# SQLite reports a table read without any index as `SCAN <table>` (`SCAN TABLE <table>` before 3.36).
+# Scans through an index, of a virtual table such as `book_fts`, or of a subquery all carry a suffix
+SCAN_DETAIL = re.compile(r"^SCAN (?:TABLE )?(\w+)$")
+CLAUSE = re.compile(r"\b(WHERE|GROUP BY|HAVING|ORDER BY|LIMIT)\b", re.IGNORECASE)
+COLUMN = re.compile(r"\b(\w+)\.(\w+)\b")
+
+# Tables that are read in full on purpose
+ALLOWED_FULL_SCANS = {
+    # Every bookshelf is listed at once, and there are only ever a handful
+    "bookshelf",
+}
+
+
+@dataclass
+class FullScan:
+    statement: str
+    table: str
+    plan: list[str] = field(default_factory=list)
+
+    def __str__(self) -> str:
+        return f"Full scan of {self.table}:\n{self.statement}\n" + "\n".join(f"  {detail}" for detail in self.plan)
+
+
+def explain_query_plan(connection, statement: str, parameters=()) -> list[str]:
+    """The detail column of `EXPLAIN QUERY PLAN` for `statement`, one line per step.
+
+    `connection` is a SQLAlchemy `Connection`. Parameters are those the driver received.
+    """
+    result = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", tuple(parameters))
+    return [row[-1] for row in result]
+
+
+def top_level_clauses(statement: str) -> dict[str, str]:
+    """The WHERE, ORDER BY and LIMIT clauses, among others, of the outermost query in `statement`.
+
+    Clauses of subqueries, i.e. inside parentheses, are part of the clause they appear in.
+    """
+    depth = 0
+    depths = []
+    for character in statement:
+        if character == "(":
+            depth += 1
+        depths.append(depth)
+        if character == ")":
+            depth -= 1
+
+    keywords = [match for match in CLAUSE.finditer(statement) if depths[match.start()] == 0]
+    clauses = {}
+    for match, following in zip(keywords, keywords[1:] + [None]):
+        end = following.start() if following else len(statement)
+        clauses[match.group(1).upper()] = statement[match.end():end].strip()
+    return clauses
+
+
+def is_ordered_page_of(table: str, statement: str) -> bool:
+    """Whether `statement` reads `table` in the order it asks for, stopping at a LIMIT.
+
+    That holds only for the table the ORDER BY is on, and only if nothing else filters it.
+    A condition on the ORDER BY columns themselves, such as a keyset cursor, does not count.
+    Any other condition, or a subquery, may have the scan read the whole table to fill a page.
+    """
+    clauses = top_level_clauses(statement)
+    if "LIMIT" not in clauses or "ORDER BY" not in clauses:
+        return False
+
+    ordered_by = COLUMN.findall(clauses["ORDER BY"])
+    if not ordered_by or ordered_by[0][0] != table:
+        return False
+
+    where = clauses.get("WHERE", "")
+    if re.search(r"\bSELECT\b", where, re.IGNORECASE):
+        return False
+    return all(column in ordered_by for column in COLUMN.findall(where))
+
+
+def full_scans(statement: str, plan: list[str], allowed: set[str] = ALLOWED_FULL_SCANS) -> list[FullScan]:
+    """Each table `plan` reads without an index, bar the `allowed` ones.
+
+    A scan that already yields rows in the requested order and stops at a LIMIT,
+    such as a page of books ordered by ID, reads no more rows than it returns.
+    Those are not counted, see `is_ordered_page_of`. Once rows have to be sorted
+    first (`USE TEMP B-TREE`), they are.
+    """
+    sorted_first = any("TEMP B-TREE" in detail for detail in plan)
+
+    scans = []
+    for detail in plan:
+        match = SCAN_DETAIL.match(detail.strip())
+        if not match or match.group(1) in allowed:
+            continue
+        if not sorted_first and is_ordered_page_of(match.group(1), statement):
+            continue
+        scans.append(FullScan(statement=statement, table=match.group(1), plan=plan))
+    return scans
+
+
+def is_explainable(statement: str) -> bool:
+    # Plain INSERTs have no plan worth checking, and PRAGMAs and transaction control have none at all
+    verb = statement.lstrip().split(None, 1)[0].upper()
+    return verb in ("SELECT", "UPDATE", "DELETE", "WITH") or (
+        verb == "INSERT" and re.search(r"\bSELECT\b", statement, re.IGNORECASE) is not None
+    )
+
+
+@contextmanager
+def record_statements(engine):
+    """Collect the distinct statements executed through `engine`, each with the parameters of its first execution"""
+    statements: dict[str, tuple] = {}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not is_explainable(statement) or statement in statements:
+            return
+        # Batched executions share one plan, so the first set of parameters stands in for all of them
+        statements[statement] = tuple(parameters[0] if executemany else parameters)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def audit(connection, statements: dict[str, tuple], allowed: set[str] = ALLOWED_FULL_SCANS) -> list[FullScan]:
+    """Explain every recorded statement against `connection` and return the full scans found"""
+    scans = []
+    for statement, parameters in statements.items():
+        scans.extend(full_scans(statement, explain_query_plan(connection, statement, parameters), allowed))
+    return scans
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+from sqlalchemy import update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from app.db.sqlite import get_async_engine
+from app.models.book import Book # noqa F401, imported first as it imports the image model itself
+from app.models.image import Image
+from app.utils.images.content import content_hash
+from app.utils.images.deletion import orphaned_image_keys
+from app.utils.images.factory import get_image_handler
+from app.utils.images.variants import variant_key
+
+# One-time rewrite of covers stored before content addressing, which are keyed by source ID
+# Each is copied to the key of its hash, as are its variants, then the old keys are deleted
+# Safe to re-run, e.g. after an interruption, as rewritten covers are skipped
+# From root directory `backend`, run python3 -m app.db.scripts.content_address_images
+
+logger = logging.getLogger(__name__)
+
+# Covers are rewritten this many at a time
+BATCH_SIZE = 50
+
+
+async def rewrite(image_handler, image) -> tuple[str, list[str]] | None:
+    """Copy a cover and its variants to content addressed keys. Returns the hash and the variants copied"""
+    try:
+        content = await run_in_threadpool(image_handler.load_image, image.source_id + image.extension)
+        digest = content_hash(content)
+        await run_in_threadpool(image_handler.save_image, digest + image.extension, content)
+    except Exception:
+        logger.exception("Unable to rewrite %s, leaving it in place", image.source_id + image.extension)
+        return None
+
+    variants = []
+    for variant in image.variants:
+        try:
+            content = await run_in_threadpool(image_handler.load_image, variant_key(image.source_id, variant))
+            await run_in_threadpool(image_handler.save_image, variant_key(digest, variant), content)
+        except Exception:
+            # Variants are optional, and can be rendered again by `app.db.scripts.generate_cover_variants`
+            logger.exception("Unable to rewrite the %s variant of %s", variant, image.source_id + image.extension)
+            continue
+        variants.append(variant)
+
+    return digest, variants
+
+
+async def content_address_images():
+    image_handler = get_image_handler()
+    rewritten = 0
+    last_id = 0
+    # (source_id, extension) => the rewrite, as books picked with the same OLID share a cover
+    rewrites = {}
+
+    async with AsyncSession(get_async_engine()) as session:
+        while True:
+            images = (await session.exec(
+                select(Image.id, Image.source_id, Image.extension, Image.variants)
+                .where(Image.id > last_id, Image.content_hash.is_(None))
+                .order_by(Image.id)
+                .limit(BATCH_SIZE)
+            )).all()
+            if not images:
+                break
+            last_id = images[-1].id
+
+            for image in images:
+                if (image.source_id, image.extension) not in rewrites:
+                    rewrites[(image.source_id, image.extension)] = await rewrite(image_handler, image)
+
+                if (result := rewrites[(image.source_id, image.extension)]) is None:
+                    continue
+                digest, variants = result
+                await session.exec(
+                    update(Image).where(Image.id == image.id).values(content_hash=digest, variants=variants)
+                )
+                rewritten += 1
+            await session.commit()
+
+        # The old keys go once nothing refers to them, which may not be the case for covers that failed
+        old_keys = await orphaned_image_keys(
+            session, [(None, source_id, extension) for (source_id, extension), result in rewrites.items() if result]
+        )
+
+    failed = await run_in_threadpool(image_handler.delete_images, sorted(old_keys))
+    if failed:
+        print(f"Unable to delete {len(failed)} old images: {', '.join(failed)}")
+
+    print(f"Rewrote {rewritten} covers to content addressed keys")
+
+
+if __name__ == "__main__":
+    asyncio.run(content_address_images())
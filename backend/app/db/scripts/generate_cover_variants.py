@@ -0,0 +1,47 @@
+import asyncio
+from sqlalchemy import update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.db.sqlite import get_async_engine
+from app.models.book import Book # noqa F401, imported first as it imports the image model itself
+from app.models.image import Image
+from app.utils.images.content import storage_stem
+from app.utils.images.variants import get_cover_variant_renderer
+
+# Renders variants for covers stored before they existed
+# From root directory `backend`, run python3 -m app.db.scripts.generate_cover_variants
+
+# Covers are rendered this many at a time
+BATCH_SIZE = 50
+
+
+async def generate_missing_variants():
+    renderer = get_cover_variant_renderer()
+    rendered = 0
+    last_id = 0
+
+    async with AsyncSession(get_async_engine()) as session:
+        while True:
+            images = (await session.exec(
+                select(Image.id, Image.content_hash, Image.source_id, Image.extension, Image.variants)
+                .where(Image.id > last_id)
+                .order_by(Image.id)
+                .limit(BATCH_SIZE)
+            )).all()
+            if not images:
+                break
+            last_id = images[-1].id
+
+            images = [image for image in images if not image.variants]
+            variants = await renderer.create_many([(storage_stem(image.content_hash, image.source_id), image.extension) for image in images])
+            for image, names in zip(images, variants):
+                await session.exec(update(Image).where(Image.id == image.id).values(variants=names))
+            await session.commit()
+
+            rendered += sum(bool(names) for names in variants)
+
+    print(f"Rendered variants for {rendered} covers")
+
+
+if __name__ == "__main__":
+    asyncio.run(generate_missing_variants())
@@ -1,4 +1,7 @@
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 import os
 from pathlib import Path
 from dotenv import load_dotenv
@@ -9,12 +12,107 @@ if env_path.exists():
     load_dotenv(dotenv_path=env_path)
 
 DATABASE_URL = os.getenv('DATABASE_URL')
+# The same database, reached through the aiosqlite driver so queries can be awaited
+ASYNC_DATABASE_URL = DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
 
-engine = create_engine(DATABASE_URL, echo=True, connect_args={"check_same_thread": False})
+# PRAGMAs are per connection in SQLite, so they are applied on every connect
+# event rather than once at startup, where they would only reach a single pooled connection
+SQLITE_PROFILES = {
+    # Safe on network file systems such as the EFS mount the Lambda opens its database on,
+    # where WAL's shared memory index and memory mapping are unreliable across hosts
+    "production": {
+        "echo": False,
+        "pragmas": {
+            # SQLite's default rollback journal, set explicitly as the mode persists in the file
+            "journal_mode": "DELETE",
+            # Wait on a locked database for up to 5s rather than failing immediately
+            "busy_timeout": 5000,
+            # Negative values are in KiB, so this is a 64MB page cache per connection
+            "cache_size": -64 * 1024,
+            "temp_store": "MEMORY",
+            "foreign_keys": "ON",
+        },
+    },
+    # Tuned for concurrent readers alongside a writer, only for databases on a local disk
+    "local": {
+        "echo": False,
+        "pragmas": {
+            # Readers no longer block on the writer, and vice versa
+            "journal_mode": "WAL",
+            # Safe with WAL; only fsync at checkpoints rather than every commit
+            "synchronous": "NORMAL",
+            "busy_timeout": 5000,
+            # Memory-map up to 256MB of the database file
+            "mmap_size": 256 * 1024 * 1024,
+            "cache_size": -64 * 1024,
+            "temp_store": "MEMORY",
+            "foreign_keys": "ON",
+        },
+    },
+    # As local, but with SQL echoed for debugging
+    "development": {
+        "echo": True,
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "busy_timeout": 5000,
+            "temp_store": "MEMORY",
+            "foreign_keys": "ON",
+        },
+    },
+    # SQLite defaults, apart from enforcing foreign keys
+    "minimal": {
+        "echo": False,
+        "pragmas": {
+            "foreign_keys": "ON",
+        },
+    },
+}
+
+SQLITE_PROFILE = os.getenv('SQLITE_PROFILE', 'production')
+
+if SQLITE_PROFILE not in SQLITE_PROFILES:
+    raise ValueError(f"Unknown SQLITE_PROFILE: {SQLITE_PROFILE}")
+
+
+def apply_sqlite_pragmas(engine, pragmas: dict):
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return engine
+
+
+engine = apply_sqlite_pragmas(
+    create_engine(
+        DATABASE_URL,
+        echo=SQLITE_PROFILES[SQLITE_PROFILE]["echo"],
+        connect_args={"check_same_thread": False},
+    ),
+    SQLITE_PROFILES[SQLITE_PROFILE]["pragmas"],
+)
+
+# Used by the routers. The sync engine above remains for startup and scripts
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    echo=SQLITE_PROFILES[SQLITE_PROFILE]["echo"],
+)
+apply_sqlite_pragmas(async_engine.sync_engine, SQLITE_PROFILES[SQLITE_PROFILE]["pragmas"])
 
 def get_engine():
     return engine
 
+def get_async_engine():
+    return async_engine
+
 def get_db():
     with Session(engine) as session:
         yield session
+
+async def get_async_db():
+    # Objects are not expired on commit, as refreshing them would need an implicit await
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
@@ -1,17 +1,17 @@
-import base64
 import json
 import os
 import logging
 
 from fastapi import FastAPI, Request
 from starlette.datastructures import UploadFile
-from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from contextlib import asynccontextmanager
 from app.routers import books, bookshelves
-from sqlmodel import SQLModel, text
+from sqlmodel import SQLModel
 from app.db.sqlite import get_engine
+from app.utils.http_client import get_http_client, close_http_client
+from app.utils.images.static import ImageStaticFiles
 from dotenv import load_dotenv
 from mangum import Mangum
 
@@ -20,6 +20,7 @@ from mangum import Mangum
 from app.models.book import Book  # noqa: F401
 from app.models.bookshelf import Bookshelf  # noqa: F401
 from app.models.book_bookshelf import BookBookshelfLink  # noqa: F401
+from app.models.search_cache import SearchCache  # noqa: F401
 
 logging.disable(logging.INFO)
 
@@ -31,44 +32,83 @@ engine = get_engine()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Per-connection PRAGMAs, including foreign key enforcement, are applied by `app.db.sqlite`
     SQLModel.metadata.create_all(engine)
-    with engine.connect() as connection:
-        connection.execute(text("PRAGMA foreign_keys=ON"))  # for SQLite only
+    # Open the pooled HTTP client shared by Open Library searches and cover fetches
+    get_http_client()
     yield
+    await close_http_client()
 
 
 # Normalize all incoming data to JSON so as not to burden our routes with
 # validating and handling multiple content types
 # This comes into play when the client sends Form Data along with a file upload
-class FormToJSONMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        content_type = request.headers.get("Content-Type", "").split(";", 1)[0]
-        if content_type == "multipart/form-data":
-            form_data = await request.form()
-            # This can include a File of type UploadFile
-            json_data = {}
-            for key, value in form_data.items():
-                if isinstance(value, UploadFile):
-                    file_bytes = await value.read()
-                    json_data[key] = base64.b64encode(file_bytes).decode("utf-8")
-                else:
-                    json_data[key] = value
-            # Convert JSON data to bytes and set as the new request body
-            json_body = json.dumps(json_data).encode("utf-8")
-            # Update the request scope
-            request.scope["headers"] = [
+# Files are not encoded into the JSON body. They are set aside on `request.state.uploads`
+# (already spooled to disk by the form parser) so routes can stream them to storage
+# This is a pure ASGI middleware: anything that is not multipart form data, which is
+# nearly every request, is handed straight to the app without being wrapped
+class FormToJSONMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self.is_multipart(scope):
+            await self.app(scope, receive, send)
+            return
+
+        form_data = await Request(scope, receive).form()
+        # This can include a File of type UploadFile
+        json_data = {}
+        uploads = {}
+        for key, value in form_data.items():
+            if isinstance(value, UploadFile):
+                uploads[key] = value
+            else:
+                json_data[key] = value
+        # Convert JSON data to bytes to be served as the new request body
+        json_body = json.dumps(json_data).encode("utf-8")
+
+        scope = {
+            **scope,
+            "headers": [
                 (b"content-type", b"application/json"),
-                *(header for header in request.scope["headers"] if header[0] != b"content-type"),
-            ]
-            request._body = json_body  # Set the new body directly
-
-        return await call_next(request)
+                (b"content-length", str(len(json_body)).encode("latin-1")),
+                *(
+                    header for header in scope["headers"]
+                    if header[0] not in (b"content-type", b"content-length")
+                ),
+            ],
+            "state": {**scope.get("state", {}), "uploads": uploads},
+        }
+
+        body_sent = False
+
+        async def receive_json() -> Message:
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": json_body, "more_body": False}
+            # The original body has been consumed, so this only ever yields a disconnect
+            return await receive()
+
+        try:
+            await self.app(scope, receive_json, send)
+        finally:
+            # Release the spooled temporary files backing any uploads
+            await form_data.close()
+
+    @staticmethod
+    def is_multipart(scope: Scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == b"content-type":
+                return value.split(b";", 1)[0].strip().lower() == b"multipart/form-data"
+        return False
 
 
 app = FastAPI(lifespan=lifespan)
 
 if os.getenv("STORAGE_BACKEND") == "local":
-    app.mount("/images", StaticFiles(directory=os.getenv("LOCAL_IMAGE_DIRECTORY")), name="images")
+    app.mount("/images", ImageStaticFiles(directory=os.getenv("LOCAL_IMAGE_DIRECTORY")), name="images")
 
 origins = ["*"]
 
@@ -1,4 +1,5 @@
 from app.models.book_bookshelf import BookBookshelfLink
+from sqlalchemy import DDL, Index, event, insert_sentinel
 from sqlmodel import SQLModel, Field, Relationship
 from typing import Optional, TYPE_CHECKING, List
 from enum import Enum
@@ -27,16 +28,30 @@ class BookBase(SQLModel):
 
 
 class Book(BookBase, table=True):
+    # Listings and bookshelves page through books ordered by (sort key, id),
+    # so each sortable column gets a composite index in that order
+    __table_args__ = (
+        Index("ix_book_title_id", "title", "id"),
+        Index("ix_book_author_id", "author", "id"),
+        Index("ix_book_year_id", "year", "id"),
+        Index("ix_book_rating_id", "rating", "id"),
+        # Listings filter on read status, and it is usually the only filter
+        Index("ix_book_read_status_id", "read_status", "id"),
+        # Bulk imports insert many books in one statement. SQLite returns their IDs in no
+        # particular order, so each row carries its position for SQLAlchemy to match them up
+        insert_sentinel("insert_sentinel"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
+    # Relationships are loaded lazily by default. Routes eager-load exactly
+    # what their response model needs via `app.db.loaders`
     bookshelves: List["Bookshelf"] = Relationship(
         back_populates="books",
         link_model=BookBookshelfLink,
-        sa_relationship_kwargs=dict(lazy="selectin"),
     )
     image: "Image" = Relationship(
         back_populates="book",
         cascade_delete=True,
-        # sa_relationship_kwargs=dict(lazy="selectin"), 
     )
 
     # There are instances where we want to validate with the Book class
@@ -46,6 +61,45 @@ class Book(BookBase, table=True):
         extra = "allow" 
 
 
+# Full-text index over the searchable text of every book
+# This is an external content FTS5 table, so it stores only the index and reads
+# the text itself from `book`. Triggers keep the two in sync
+# Existing databases get this via Alembic, new ones when `book` is created
+BOOK_FTS_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS book_fts USING fts5(
+        title, author, review,
+        content='book', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS book_fts_after_insert AFTER INSERT ON book BEGIN
+        INSERT INTO book_fts(rowid, title, author, review)
+        VALUES (new.id, new.title, new.author, new.review);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS book_fts_after_delete AFTER DELETE ON book BEGIN
+        INSERT INTO book_fts(book_fts, rowid, title, author, review)
+        VALUES ('delete', old.id, old.title, old.author, old.review);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS book_fts_after_update AFTER UPDATE OF title, author, review ON book BEGIN
+        INSERT INTO book_fts(book_fts, rowid, title, author, review)
+        VALUES ('delete', old.id, old.title, old.author, old.review);
+        INSERT INTO book_fts(rowid, title, author, review)
+        VALUES (new.id, new.title, new.author, new.review);
+    END
+    """,
+]
+
+for statement in BOOK_FTS_DDL:
+    event.listen(Book.__table__, "after_create", DDL(statement))
+event.listen(Book.__table__, "before_drop", DDL("DROP TABLE IF EXISTS book_fts"))
+
+
 # These fields may be present when creating a book, but do not ultimately
 # become a part of a Book record
 class BookCreate(BookBase):
@@ -90,11 +144,80 @@ class BookPublicWithBookshelves(BookPublic):
 
 # `noqa` is used to suppress linter errors
 # we needed the import here to avoid circular imports
-from app.models.image import Image, ImagePublic # noqa
+from app.models.image import Image, ImagePublic, resolve_image_uris # noqa
 from app.models.bookshelf import BookshelfPublic  # noqa
 
 BookPublic.model_rebuild()
 BookPublicWithBookshelves.model_rebuild()
 
+
+# A single page of books, along with an opaque cursor for fetching the next one
+# `next_cursor` is None when there are no more books to fetch
+class BookPage(SQLModel):
+    books: List[BookPublic] = []
+    next_cursor: Optional[str] = None
+
+    def model_dump(self, **kwargs):
+        # Sign every cover URI on the page in one go rather than once per book
+        resolve_image_uris([book.image for book in self.books])
+
+        data = super().model_dump(**kwargs)
+
+        # Ensure each book gets its own `model_dump` call so image URIs are set
+        data["books"] = [book.model_dump() for book in self.books]
+
+        return data
+
+# A local full-text search hit as escaped HTML, with matched terms wrapped in <mark> tags
+class BookSearchResult(BookPublic):
+    title_highlight: str
+    author_highlight: str
+    review_snippet: Optional[str] = None
+
+
+class BookSearchPage(BookPage):
+    books: List[BookSearchResult] = []
+
+
+# Just enough of a book to pick it from a grid of covers
+class BookSummary(SQLModel):
+    id: int
+    title: str
+    author: str
+    thumbnail_uri: Optional[str] = None
+
+
+class BookSummaryPage(SQLModel):
+    books: List[BookSummary] = []
+    next_cursor: Optional[str] = None
+
+
+# The editions of a book that have a real cover on Open Library, in the order of `Book.olids`
+class BookCovers(SQLModel):
+    olids: List[str] = []
+
+
 class BookIds(SQLModel):
     book_ids: List[int]
+
+
+class BookImportStatus(str, Enum):
+    created = "created"
+    # The book was created, but its cover could not be fetched
+    created_without_cover = "created_without_cover"
+    invalid = "invalid"
+    failed = "failed"
+
+
+# The outcome for one row of a bulk import. `index` is the row's position in the request
+class BookImportResult(SQLModel):
+    index: int
+    status: BookImportStatus
+    book_id: Optional[int] = None
+    error: Optional[str] = None
+
+
+class BookImportReport(SQLModel):
+    created: int
+    failed: int
+    results: List[BookImportResult]
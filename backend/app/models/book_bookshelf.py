@@ -1,7 +1,14 @@
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
 
 class BookBookshelfLink(SQLModel, table=True):
+    # The primary key leads with `book_id`, so it cannot serve lookups by shelf.
+    # This covers listing a shelf's books and the foreign key check when a shelf is deleted
+    __table_args__ = (
+        Index("ix_bookbookshelflink_bookshelf_id_book_id", "bookshelf_id", "book_id"),
+    )
+
     book_id: int | None = Field(default=None, foreign_key="book.id", primary_key=True)
     bookshelf_id: int | None = Field(
         default=None, foreign_key="bookshelf.id", primary_key=True
@@ -33,7 +33,6 @@ class Bookshelf(BookshelfBase, table=True):
     books: List["Book"] = Relationship(
         back_populates="bookshelves",
         link_model=BookBookshelfLink,
-        sa_relationship_kwargs=dict(lazy="selectin"),
     )
 
 
@@ -52,12 +51,27 @@ class BookshelfUpdate(SQLModel):
     sort_direction: Optional[SortDirection] = None
 
 
+# A bookshelf with a single page of its books, in the bookshelf's own order
+# `next_cursor` is None when there are no more books to fetch
 class BookshelfPublicWithBooks(BookshelfPublic):
     books: list["BookPublic"] = []
+    next_cursor: Optional[str] = None
+
+    def model_dump(self, **kwargs):
+        # Sign every cover URI on the page in one go rather than once per book
+        resolve_image_uris([book.image for book in self.books])
+
+        data = super().model_dump(**kwargs)
+
+        # Ensure each book gets its own `model_dump` call so image URIs are set
+        data["books"] = [book.model_dump() for book in self.books]
+
+        return data
 
 
 # `noqa` is used to suppress linter errors
 # we needed the import here to avoid circular imports
 from app.models.book import BookPublic  # noqa
+from app.models.image import resolve_image_uris  # noqa
 
 BookshelfPublicWithBooks.model_rebuild()
@@ -1,8 +1,10 @@
 from enum import Enum
-from typing import Optional
-from sqlmodel import Field, Relationship, SQLModel
+from typing import Dict, List, Optional
+from sqlmodel import Column, Field, JSON, Relationship, SQLModel
 from app.models.book import Book
+from app.utils.images.content import storage_stem
 from app.utils.images.factory import get_image_handler
+from app.utils.images.variants import variant_key
 
 image_handler = get_image_handler()
 
@@ -14,13 +16,25 @@ class ImageSource(str,Enum):
 class ImageBase(SQLModel):
   source: ImageSource
   # Source ID will either be an OLID for Open Library or a NanoID for direct upload
-  source_id: str
+  source_id: str = Field(index=True)
   extension: str
+  # SHA-256 of the cover's bytes, which names it in storage. Rows sharing a hash share the stored blob
+  content_hash: Optional[str] = Field(default=None, index=True)
+
+  @property
+  def stem(self) -> str:
+    return storage_stem(self.content_hash, self.source_id)
+
+  @property
+  def key(self) -> str:
+    return self.stem + self.extension
 
 
 class Image(ImageBase, table=True):
   id: int = Field(default=None, primary_key=True)
   book_id: int = Field(foreign_key="book.id", unique=True)
+  # Names of the resized copies stored alongside the original, see `app.utils.images.variants`
+  variants: List[str] = Field(default_factory=list, sa_column=Column(JSON, nullable=False, server_default="[]"))
 
   book: "Book" = Relationship(back_populates="image")
 
@@ -28,13 +42,39 @@ class Image(ImageBase, table=True):
 class ImagePublic(ImageBase):
   id: int
   uri: Optional[str] = None
+  content_hash: Optional[str] = Field(default=None, exclude=True)
+  variants: List[str] = Field(default=[], exclude=True)
+  # Variant name => URI, for each variant the image has, e.g. `thumbnail` for grids
+  variant_uris: Dict[str, str] = {}
   
   def model_dump(self, **kwargs):
     # Start by calling the default model_dump() to get the serialized data
     data = super().model_dump(**kwargs)
     
-    # Set `uri` based on `source_id` and `extension`, if not already set
-    if self.source_id and self.extension:
-        data["uri"] = image_handler.get_image_uri(self.source_id + self.extension)
+    # Set `uri` based on the stored key, if not already set
+    # Listings resolve URIs up front in bulk with `resolve_image_uris`
+    if self.uri is None and self.source_id and self.extension:
+        data["uri"] = image_handler.get_image_uri(self.key)
+
+    if not self.variant_uris and self.variants:
+        uris = image_handler.get_image_uris([variant_key(self.stem, variant) for variant in self.variants])
+        data["variant_uris"] = {variant: uris[variant_key(self.stem, variant)] for variant in self.variants}
     
-    return data
\ No newline at end of file
+    return data
+
+
+def resolve_image_uris(images: list[Optional[ImagePublic]]) -> None:
+  """Set `uri` and `variant_uris` on many images with a single bulk call to the image handler."""
+  images = [image for image in images if image is not None and image.uri is None]
+  if not images:
+    return
+
+  keys = set()
+  for image in images:
+    keys.add(image.key)
+    keys.update(variant_key(image.stem, variant) for variant in image.variants)
+
+  uris = image_handler.get_image_uris(keys)
+  for image in images:
+    image.uri = uris[image.key]
+    image.variant_uris = {variant: uris[variant_key(image.stem, variant)] for variant in image.variants}
\ No newline at end of file
@@ -54,3 +54,19 @@ class Works(BaseModel):
                 deduplicated_list.append(work)
 
         return deduplicated_list
+
+    @classmethod
+    def from_dump(cls, dumped_works: list[dict]) -> "Works":
+        """Rebuild `Works` from the output of `model_dump()`, e.g. after it has been sent over the wire or stored"""
+        works = []
+        for work in dumped_works:
+            works.append(Work(
+                title=work["title"],
+                # Convert author back to list
+                author_name=[work["author_name"]],
+                first_publish_year=work["first_publish_year"],
+                # Split OLIDs back into original keys
+                cover_edition_key=work["olids"][0] if work["olids"] else None,
+                edition_key=work["olids"],
+            ))
+        return cls(works=works)
@@ -0,0 +1,13 @@
+from datetime import datetime
+from sqlmodel import Column, Field, JSON, SQLModel
+
+
+class SearchCache(SQLModel, table=True):
+    __tablename__ = "search_cache"
+
+    # The normalized title that was searched for
+    query: str = Field(primary_key=True)
+    # The output of `Works.model_dump()`, restored with `Works.from_dump()`
+    works: list[dict] = Field(sa_column=Column(JSON, nullable=False))
+    # Naive UTC
+    expires_at: datetime = Field(index=True)
@@ -1,29 +1,103 @@
-from fastapi import APIRouter, Depends, Path, status, HTTPException
-from typing import Annotated
+import html
+import os
+import re
+from fastapi import APIRouter, BackgroundTasks, Depends, Path, Query, Request, UploadFile, status, HTTPException
+from typing import Annotated, Optional
 from app.models.book import (
     Book,
+    BookCovers,
     BookCreate,
     BookUpdate,
+    BookPage,
     BookPublic,
     BookPublicWithBookshelves,
-    BookIds
+    BookIds,
+    BookImportReport,
+    BookImportResult,
+    BookImportStatus,
+    BookSearchPage,
+    BookSearchResult,
+    ReadStatus
 )
+from app.models.book_bookshelf import BookBookshelfLink
+from app.models.bookshelf import SortKey, SortDirection
 from app.models.openlibrary import Works
 from app.models.exception import ExceptionHandler
+from app.services.open_library.cache import CachedOpenLibraryHandler
 from app.services.open_library.factory import get_open_library
-from app.db.sqlite import get_db
-from app.utils.book_cover import get_book_cover_handler
-from sqlmodel import Session, select
+from app.db.sqlite import get_async_db
+from app.db.loaders import loader_options, shape
+from app.utils.book_cover import find_covers, find_stored_covers, get_book_cover_handler, get_uploaded_file, parse_olids
+from app.utils.images.factory import get_image_handler
+from app.utils.images.deletion import ImageDeletionQueue, get_image_deletion_queue, orphaned_image_keys, stored_image_keys
+from app.utils.images.variants import CoverVariantRenderer, get_cover_variant_renderer, variant_key
+from app.utils.bulk_import import BULK_IMPORT_CHUNK_SIZE, read_rows, validate_row
+from app.utils.pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    paginate,
+    next_page,
+    encode_offset_cursor,
+    decode_offset_cursor,
+)
+from sqlalchemy import column, delete, func, insert, literal_column, table
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.models.image import Image
+from app.models.image import Image, ImageSource
 
 router = APIRouter()
 
-
-@router.get("/", status_code=status.HTTP_200_OK, response_model=list[BookPublic])
-def get_books(db: Session = Depends(get_db)):
-    books = db.exec(select(Book)).all()
-    return [BookPublic.model_validate(book).model_dump() for book in books]
+book_fts = table("book_fts", column("rowid"))
+# Relative weights of matches in title, author and review when ranking local search results
+BOOK_FTS_WEIGHTS = (10.0, 5.0, 1.0)
+# FTS5 wraps matches in these control characters, which are swapped for <mark> tags once
+# the rest of the text has been HTML escaped, so stored text can never be rendered as markup
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_END = "\x03"
+
+
+@router.get("/", status_code=status.HTTP_200_OK, response_model=BookPage)
+async def get_books(
+    sort_key: SortKey = SortKey.id,
+    sort_direction: SortDirection = SortDirection.ascending,
+    cursor: Annotated[Optional[str], Query(title="Opaque cursor returned as `next_cursor` by the previous page")] = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    read_status: Optional[ReadStatus] = None,
+    author: Annotated[Optional[str], Query(title="Case-insensitive substring of the author")] = None,
+    year: Optional[int] = None,
+    rating: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    statement = shape(select(Book), BookPublic)
+
+    if read_status is not None:
+        statement = statement.where(Book.read_status == read_status)
+    if author is not None:
+        statement = statement.where(Book.author.icontains(author, autoescape=True))
+    if year is not None:
+        statement = statement.where(Book.year == year)
+    if rating is not None:
+        statement = statement.where(Book.rating == rating)
+
+    # Keyset pagination on (sort_key, id) so that every page costs the same to fetch
+    statement = paginate(
+        statement,
+        column=getattr(Book, sort_key.value),
+        id_column=Book.id,
+        sort_key=sort_key,
+        sort_direction=sort_direction,
+        cursor=cursor,
+        limit=limit,
+    )
+
+    books, next_cursor = next_page((await db.exec(statement)).all(), sort_key=sort_key, limit=limit)
+
+    return BookPage(
+        books=[BookPublic.model_validate(book) for book in books],
+        next_cursor=next_cursor,
+    ).model_dump()
 
 
 @router.get(
@@ -31,11 +105,11 @@ def get_books(db: Session = Depends(get_db)):
     status_code=status.HTTP_200_OK,
     response_model=BookPublicWithBookshelves,
 )
-def get_book(
+async def get_book(
     book_id: Annotated[int, Path(title="The ID of the book to get")],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    book = db.get(Book, book_id)
+    book = await db.get(Book, book_id, options=loader_options(BookPublicWithBookshelves))
 
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
@@ -45,114 +119,347 @@ def get_book(
     return book_public_with_bookshelves.model_dump()
 
 
+@router.get(
+    "/{book_id}/covers",
+    status_code=status.HTTP_200_OK,
+    response_model=BookCovers,
+)
+async def get_book_covers(
+    book_id: Annotated[int, Path(title="The ID of the book to find covers for")],
+    db: AsyncSession = Depends(get_async_db),
+    open_library=Depends(get_open_library),
+):
+    book = (await db.exec(select(Book.id, Book.olids).where(Book.id == book_id))).first()
+
+    if not book:
+        raise HTTPException(status_code=404, detail="Book not found")
+
+    return BookCovers(olids=await find_covers(parse_olids(book.olids), open_library))
+
+
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def create_book(
     book_create: BookCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     book_cover_handler = Depends(get_book_cover_handler),
+    upload: UploadFile | None = Depends(get_uploaded_file),
+    image_deletion_queue: ImageDeletionQueue = Depends(get_image_deletion_queue),
 ):
     db_book = Book.model_validate(book_create) 
 
-    # Handle book cover
-    # This may raise an Exception if a file upload is invalid
-    # We hold on committing the book until we validate this
-    image = await book_cover_handler(book_create_or_update=book_create)
+    # The stored cover is in use by nothing until the book and its image commit
+    async with image_deletion_queue.storing() as stored_keys:
+        # Handle book cover
+        # This may raise an Exception if a file upload is invalid
+        # We hold on committing the book until we validate this
+        image = await book_cover_handler(book_create_or_update=book_create, upload=upload, db=db)
+
+        db.add(db_book)
 
-    db.add(db_book)
-    db.commit()
+        if image is not None:
+            stored_keys.update(stored_image_keys(image))
+            # Flushed for its ID, so that the book and its image commit together
+            await db.flush()
+            image.book_id = db_book.id
+            db.add(image)
 
-    if image is not None:  
-        db.refresh(db_book)
-        image.book_id = db_book.id
-        db.add(image)
-        db.commit()
+        await db.commit()
     
     return None
 
 
+@router.post("/bulk", status_code=status.HTTP_200_OK, response_model=BookImportReport)
+async def bulk_create_books(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
+    open_library=Depends(get_open_library),
+    cover_variant_renderer: CoverVariantRenderer = Depends(get_cover_variant_renderer),
+    image_handler=Depends(get_image_handler),
+    image_deletion_queue: ImageDeletionQueue = Depends(get_image_deletion_queue),
+):
+    # Accepts a JSON list of books, or NDJSON or CSV with one book per line
+    rows = await read_rows(request)
+
+    results: list[BookImportResult | None] = [None] * len(rows)
+    valid_rows: list[tuple[int, BookCreate]] = []
+    for index, row in enumerate(rows):
+        book_create, error = validate_row(row)
+        if error is not None:
+            results[index] = BookImportResult(index=index, status=BookImportStatus.invalid, error=error)
+        else:
+            valid_rows.append((index, book_create))
+
+    # Fetched covers are in use by nothing until the chunk storing their books commits
+    async with image_deletion_queue.storing() as stored_keys:
+        # Covers already in storage are reused, and each other distinct cover is fetched once,
+        # concurrently, before anything is inserted
+        olids = list(dict.fromkeys(book_create.olid for _, book_create in valid_rows if book_create.olid))
+        reused_covers = await find_stored_covers(db, olids, image_handler)
+        olids = [olid for olid in olids if olid not in reused_covers]
+        fetched_covers = dict(zip(olids, await open_library.fetch_images_from_olids(olids)))
+        # Each stored cover's content addressed key, split into (stem, extension)
+        stored_covers = {olid: os.path.splitext(key) for olid, key in fetched_covers.items() if isinstance(key, str)}
+        stored_keys.update(stem + extension for stem, extension in stored_covers.values())
+        cover_variants = dict(zip(stored_covers, await cover_variant_renderer.create_many(list(stored_covers.values()))))
+        for olid, variants in cover_variants.items():
+            stored_keys.update(variant_key(stored_covers[olid][0], variant) for variant in variants)
+        for olid, image in reused_covers.items():
+            stored_covers[olid] = (image.content_hash, image.extension)
+            cover_variants[olid] = image.variants
+
+        rolled_back_olids = set()
+        for start in range(0, len(valid_rows), BULK_IMPORT_CHUNK_SIZE):
+            chunk = valid_rows[start:start + BULK_IMPORT_CHUNK_SIZE]
+
+            try:
+                # One multi-row INSERT per table per chunk, rather than a commit per book
+                # IDs are returned in the order rows are listed, lining them up with the chunk
+                book_ids = (await db.exec(
+                    insert(Book).returning(Book.id, sort_by_parameter_order=True),
+                    params=[book_create.model_dump(exclude={"olid", "file"}) for _, book_create in chunk],
+                )).scalars().all()
+
+                images = [
+                    {
+                        "book_id": book_id,
+                        "source": ImageSource.open_library,
+                        "source_id": book_create.olid,
+                        "content_hash": stored_covers[book_create.olid][0],
+                        "extension": stored_covers[book_create.olid][1],
+                        "variants": cover_variants[book_create.olid],
+                    }
+                    for book_id, (_, book_create) in zip(book_ids, chunk)
+                    if book_create.olid in cover_variants
+                ]
+                if images:
+                    await db.exec(insert(Image), params=images)
+
+                await db.commit()
+            except SQLAlchemyError as e:
+                await db.rollback()
+                for index, _ in chunk:
+                    results[index] = BookImportResult(index=index, status=BookImportStatus.failed, error=str(e.orig or e))
+                rolled_back_olids.update(book_create.olid for _, book_create in chunk if book_create.olid)
+                continue
+
+            for book_id, (index, book_create) in zip(book_ids, chunk):
+                cover = fetched_covers.get(book_create.olid)
+                if isinstance(cover, Exception):
+                    results[index] = BookImportResult(
+                        index=index,
+                        status=BookImportStatus.created_without_cover,
+                        book_id=book_id,
+                        error=f"Unable to fetch cover image from Open Library: {cover}",
+                    )
+                elif book_create.olid in fetched_covers and cover is None:
+                    results[index] = BookImportResult(
+                        index=index,
+                        status=BookImportStatus.created_without_cover,
+                        book_id=book_id,
+                        error="Open Library has no cover image for this edition",
+                    )
+                else:
+                    results[index] = BookImportResult(index=index, status=BookImportStatus.created, book_id=book_id)
+
+    # Covers fetched for chunks that rolled back go too, unless another chunk stored a book
+    # with them, which the queue checks before deleting. Reused covers belong to other books
+    orphaned_keys = []
+    for olid in rolled_back_olids - reused_covers.keys():
+        if olid in stored_covers:
+            stem, extension = stored_covers[olid]
+            orphaned_keys.append(stem + extension)
+            orphaned_keys.extend(variant_key(stem, variant) for variant in cover_variants[olid])
+    if orphaned_keys:
+        image_deletion_queue.enqueue(orphaned_keys)
+        background_tasks.add_task(image_deletion_queue.flush)
+
+    created = sum(result.book_id is not None for result in results)
+    return BookImportReport(created=created, failed=len(results) - created, results=results)
+
+
 @router.patch("/{book_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def update_book(
     book_id: Annotated[int, Path(title="The ID of the book to update")],
     book_update: BookUpdate,
-    db: Session = Depends(get_db),
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
     book_cover_handler = Depends(get_book_cover_handler),
+    upload: UploadFile | None = Depends(get_uploaded_file),
+    image_deletion_queue: ImageDeletionQueue = Depends(get_image_deletion_queue),
 ):
-    db_book = db.get(Book, book_id)
+    db_book = await db.get(Book, book_id)
 
     if not db_book:
         raise HTTPException(status_code=404, detail="Book not found") 
 
-    # Handle book cover
-    # This may raise an Exception if a file upload is invalid
-    # We hold on committing the book until we validate this
-    new_image = await book_cover_handler(book_create_or_update=book_update)
+    # The stored cover is in use by nothing until the book's new image commits
+    async with image_deletion_queue.storing() as stored_keys:
+        # Handle book cover
+        # This may raise an Exception if a file upload is invalid
+        # We hold on committing the book until we validate this
+        new_image = await book_cover_handler(book_create_or_update=book_update, upload=upload, db=db)
+
+        if book_update.file:
+            del book_update.file
 
-    if book_update.file:
-        del book_update.file
+        if book_update.olid:
+            del book_update.olid
 
-    if book_update.olid:
-        del book_update.olid
+        book_data = book_update.model_dump(exclude_unset=True)
 
-    book_data = book_update.model_dump(exclude_unset=True)
+        db_book.sqlmodel_update(book_data)
+        db.add(db_book)
 
-    db_book.sqlmodel_update(book_data)
-    db.add(db_book)
+        if new_image:
+            stored_keys.update(stored_image_keys(new_image))
+            # Set the new image's book_id
+            new_image.book_id = book_id
+            # Replace any existing image associated with this book
+            replaced_images = (await db.exec(
+                delete(Image).where(Image.book_id == book_id).returning(Image.content_hash, Image.source_id, Image.extension)
+            )).all()
+            # Add the new image
+            db.add(new_image)
+            await db.flush()
+            # The replaced image's file goes too, unless another book (or the new image) still uses it
+            orphaned_keys = await orphaned_image_keys(db, replaced_images)
+
+        await db.commit()
 
     if new_image:
-        # Set the new image's book_id
-        new_image.book_id = book_id
-        # Check if an existing image is associated with this book
-        existing_image = db.exec(select(Image).where(Image.book_id == book_id)).first()
-        if existing_image:
-            # Delete the old image if it differs from the new one
-            db.delete(existing_image)
-            # TODO delete previously uploaded image if there is one?
-            db.commit()
-        # Add the new image
-        db.add(new_image)
-
-    db.commit()
+        image_deletion_queue.enqueue(orphaned_keys)
+        background_tasks.add_task(image_deletion_queue.flush)
 
     return None
 
 
+async def delete_books(db: AsyncSession, book_ids: list[int]) -> tuple[int, set[str]]:
+    """Delete books, their images and their bookshelf links without loading any of them.
+
+    Returns how many books were deleted, and the keys of stored images that no
+    remaining book uses. Does not commit.
+    """
+    await db.exec(delete(BookBookshelfLink).where(BookBookshelfLink.book_id.in_(book_ids)))
+    deleted_images = (await db.exec(
+        delete(Image).where(Image.book_id.in_(book_ids)).returning(Image.content_hash, Image.source_id, Image.extension)
+    )).all()
+    deleted_books = (await db.exec(delete(Book).where(Book.id.in_(book_ids)).returning(Book.id))).all()
+
+    return len(deleted_books), await orphaned_image_keys(db, deleted_images)
+
+
 # This route needs to appear before the one below so `bulk` is not interpreted as a `book_id`
 @router.delete("/bulk", status_code=status.HTTP_204_NO_CONTENT)
-def bulk_delete_book(
+async def bulk_delete_book(
     bulk_delete: BookIds,
-    db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
+    image_deletion_queue: ImageDeletionQueue = Depends(get_image_deletion_queue),
 ):
-    book_ids = bulk_delete.book_ids
-    statement = select(Book).where(Book.id.in_(book_ids))
-    books_to_delete = db.exec(statement).all()
+    deleted, orphaned_keys = await delete_books(db, bulk_delete.book_ids)
 
-    if not books_to_delete:
+    if not deleted:
         raise HTTPException(status_code=404, detail="Books not found")
-    
-    for book in books_to_delete:
-        db.delete(book)
 
-    db.commit()
+    await db.commit()
+
+    # Stored images are only removed once the rows pointing at them are gone for good
+    image_deletion_queue.enqueue(orphaned_keys)
+    background_tasks.add_task(image_deletion_queue.flush)
 
     return None
 
 
 @router.delete("/{book_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_book(
+async def delete_book(
     book_id: Annotated[int, Path(title="The ID of the book to delete")],
-    db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
+    image_deletion_queue: ImageDeletionQueue = Depends(get_image_deletion_queue),
 ):
-    book = db.get(Book, book_id)
+    deleted, orphaned_keys = await delete_books(db, [book_id])
 
-    if not book:
+    if not deleted:
         raise HTTPException(status_code=404, detail="Book not found")
-    
-    db.delete(book)
-    db.commit()
+
+    await db.commit()
+
+    image_deletion_queue.enqueue(orphaned_keys)
+    background_tasks.add_task(image_deletion_queue.flush)
 
     return None
 
 
+def build_fts_query(q: str) -> str:
+    # Each word becomes a quoted prefix term, so user input can never be
+    # interpreted as FTS5 query syntax, and all words must match
+    terms = re.findall(r"\w+", q)
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def render_highlight(text: Optional[str]) -> Optional[str]:
+    # Escaped first, so the only markup in the result is the <mark> tags added here
+    if text is None:
+        return None
+    return html.escape(text).replace(HIGHLIGHT_START, "<mark>").replace(HIGHLIGHT_END, "</mark>")
+
+
+# This route needs to appear before the one below so `local` is not interpreted as a `title`
+@router.get("/search/local", status_code=status.HTTP_200_OK, response_model=BookSearchPage)
+async def search_local(
+    q: Annotated[str, Query(min_length=1, title="Words to search for in titles, authors and reviews")],
+    cursor: Annotated[Optional[str], Query(title="Opaque cursor returned as `next_cursor` by the previous page")] = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    db: AsyncSession = Depends(get_async_db)
+):
+    fts_query = build_fts_query(q)
+    if not fts_query:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Search must contain at least one word")
+
+    offset = decode_offset_cursor(cursor) if cursor is not None else 0
+    fts = literal_column("book_fts")
+
+    statement = (
+        shape(
+            select(
+                Book,
+                func.highlight(fts, 0, HIGHLIGHT_START, HIGHLIGHT_END),
+                func.highlight(fts, 1, HIGHLIGHT_START, HIGHLIGHT_END),
+                func.snippet(fts, 2, HIGHLIGHT_START, HIGHLIGHT_END, "…", 16),
+            ),
+            BookPublic,
+        )
+        .join(book_fts, book_fts.c.rowid == Book.id)
+        .where(fts.op("MATCH")(fts_query))
+        .order_by(func.bm25(fts, *BOOK_FTS_WEIGHTS), Book.id)
+        .offset(offset)
+        .limit(limit + 1)
+    )
+    rows = (await db.exec(statement)).all()
+
+    return BookSearchPage(
+        books=[
+            BookSearchResult.model_validate(book, update={
+                "title_highlight": render_highlight(title_highlight),
+                "author_highlight": render_highlight(author_highlight),
+                # Only books with a review that matched get a snippet
+                "review_snippet": render_highlight(review_snippet) if review_snippet and HIGHLIGHT_START in review_snippet else None,
+            })
+            for book, title_highlight, author_highlight, review_snippet in rows[:limit]
+        ],
+        next_cursor=encode_offset_cursor(offset + limit) if len(rows) > limit else None,
+    ).model_dump()
+
+
+@router.get("/search/cache/stats", status_code=status.HTTP_200_OK)
+async def get_search_cache_stats(open_library=Depends(get_open_library)):
+    if not isinstance(open_library, CachedOpenLibraryHandler):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Search cache is disabled")
+
+    return open_library.get_stats()
+
+
 @router.get("/search/{title}", status_code=status.HTTP_200_OK)
 async def search_by_title(
     title: Annotated[str, Path(title="The title we are searching for")],
@@ -1,24 +1,31 @@
-from fastapi import APIRouter, Depends, Path, status, HTTPException
-from typing import Annotated
+from fastapi import APIRouter, Depends, Path, Query, status, HTTPException
+from typing import Annotated, Optional
 from app.models.bookshelf import (
     Bookshelf,
     BookshelfCreate,
     BookshelfUpdate,
     BookshelfPublic,
     BookshelfPublicWithBooks,
+    SortDirection,
     SortKey
 )
-from app.models.book import BookIds, Book, BookPublic
+from app.models.book import BookIds, Book, BookPage, BookPublic, BookSummary, BookSummaryPage
 from app.models.book_bookshelf import BookBookshelfLink
-from app.db.sqlite import get_db
-from sqlmodel import Session, select
+from app.models.image import Image, ImagePublic, resolve_image_uris
+from app.db.sqlite import get_async_db
+from app.db.loaders import shape
+from app.utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, paginate, next_page
+from sqlalchemy import delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 router = APIRouter()
 
 
 @router.get("/", status_code=status.HTTP_200_OK, response_model=list[BookshelfPublic])
-def get_bookshelves(db: Session = Depends(get_db)):
-    bookshelves = db.exec(select(Bookshelf)).all()
+async def get_bookshelves(db: AsyncSession = Depends(get_async_db)):
+    bookshelves = (await db.exec(select(Bookshelf))).all()
     return bookshelves
 
 
@@ -33,123 +40,203 @@ def get_bookshelf_sort_keys():
     status_code=status.HTTP_200_OK,
     response_model=BookshelfPublicWithBooks,
 )
-def get_bookshelf(
+async def get_bookshelf(
     bookshelf_id: Annotated[int, Path(title="The ID of the bookshelf to get")],
-    db: Session = Depends(get_db),
+    cursor: Annotated[Optional[str], Query(title="Opaque cursor returned as `next_cursor` by the previous page")] = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    db: AsyncSession = Depends(get_async_db),
 ):
-    bookshelf = db.get(Bookshelf, bookshelf_id)
+    bookshelf = await db.get(Bookshelf, bookshelf_id)
     if not bookshelf:
         raise HTTPException(status_code=404, detail="Bookshelf not found")
-    
-    bookshelf_with_books = BookshelfPublicWithBooks.model_validate(bookshelf)
 
-    book_publics = []
-    for book in bookshelf_with_books.books:
-        book_public = BookPublic.model_validate(book)
-        book_publics.append(book_public.model_dump())
+    # The bookshelf's books, ordered and paged in SQL by the bookshelf's own sort settings
+    statement = (
+        shape(select(Book), BookPublic)
+        .join(BookBookshelfLink, BookBookshelfLink.book_id == Book.id)
+        .where(BookBookshelfLink.bookshelf_id == bookshelf_id)
+    )
+    statement = paginate(
+        statement,
+        column=getattr(Book, bookshelf.sort_key.value),
+        id_column=Book.id,
+        sort_key=bookshelf.sort_key,
+        sort_direction=bookshelf.sort_direction,
+        cursor=cursor,
+        limit=limit,
+    )
 
-    bookshelf_with_books.books = book_publics
-    
-    return bookshelf_with_books
+    books, next_cursor = next_page((await db.exec(statement)).all(), sort_key=bookshelf.sort_key, limit=limit)
+
+    return BookshelfPublicWithBooks(
+        **BookshelfPublic.model_validate(bookshelf).model_dump(),
+        books=[BookPublic.model_validate(book) for book in books],
+        next_cursor=next_cursor,
+    ).model_dump()
 
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
-def create_bookshelf(bookshelf_create: BookshelfCreate, db: Session = Depends(get_db)):
+async def create_bookshelf(bookshelf_create: BookshelfCreate, db: AsyncSession = Depends(get_async_db)):
     db_bookshelf = Bookshelf.model_validate(bookshelf_create)
     db.add(db_bookshelf)
-    db.commit()
+    await db.commit()
     return None
 
 
 @router.patch("/{bookshelf_id}", status_code=status.HTTP_204_NO_CONTENT)
-def update_bookshelf(
+async def update_bookshelf(
     bookshelf_id: Annotated[int, Path(title="The ID of the bookshelf to update")],
     bookshelf: BookshelfUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    db_bookshelf = db.get(Bookshelf, bookshelf_id)
+    db_bookshelf = await db.get(Bookshelf, bookshelf_id)
     if not db_bookshelf:
         raise HTTPException(status_code=404, detail="Bookshelf not found")
     bookshelf_data = bookshelf.model_dump(exclude_unset=True)
     db_bookshelf.sqlmodel_update(bookshelf_data)
     db.add(db_bookshelf)
-    db.commit()
+    await db.commit()
     return None
 
 
 @router.delete("/{bookshelf_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_bookshelf(
+async def delete_bookshelf(
     bookshelf_id: Annotated[int, Path(title="The ID of the bookshelf to delete")],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    bookshelf = db.get(Bookshelf, bookshelf_id)
-    if not bookshelf:
+    # Set based, so that no book on the shelf is loaded just to remove its link
+    await db.exec(delete(BookBookshelfLink).where(BookBookshelfLink.bookshelf_id == bookshelf_id))
+    deleted = (await db.exec(delete(Bookshelf).where(Bookshelf.id == bookshelf_id).returning(Bookshelf.id))).all()
+    if not deleted:
         raise HTTPException(status_code=404, detail="Bookshelf not found")
-    db.delete(bookshelf)
-    db.commit()
+    await db.commit()
     return None
 
 
 @router.get(
     "/{bookshelf_id}/books/exclude/",
     status_code=status.HTTP_200_OK,
-    response_model=list[BookPublic]
+    response_model=BookPage | BookSummaryPage,
 )
-def get_books_not_on_bookshelf(
+async def get_books_not_on_bookshelf(
     bookshelf_id: Annotated[
         int,
         Path(
             title="The ID of the bookshelf for which we want to see books NOT on the shelf"
         ),
     ],
-    db: Session = Depends(get_db),
+    sort_key: SortKey = SortKey.id,
+    sort_direction: SortDirection = SortDirection.ascending,
+    cursor: Annotated[Optional[str], Query(title="Opaque cursor returned as `next_cursor` by the previous page")] = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    summary: Annotated[bool, Query(title="Return only the ID, title, author and thumbnail of each book")] = False,
+    db: AsyncSession = Depends(get_async_db),
 ):
-    # Create a subquery to select book IDs that are in the bookshelf
-    subquery = (
+    # An anti-join. Each book is checked against the link table's primary key as it is
+    # read, so a page stops reading books once it is full
+    on_bookshelf = (
         select(BookBookshelfLink.book_id)
+        .where(BookBookshelfLink.book_id == Book.id)
         .where(BookBookshelfLink.bookshelf_id == bookshelf_id)
-        .distinct()
+        .exists()
+    )
+    sort_column = getattr(Book, sort_key.value)
+
+    if summary:
+        # Only the columns the summary needs, with the cover joined in rather than loaded separately
+        columns = dict.fromkeys([Book.id, Book.title, Book.author, sort_column])
+        statement = select(*columns, Image).outerjoin(Image, Image.book_id == Book.id)
+    else:
+        statement = shape(select(Book), BookPublic)
+
+    statement = paginate(
+        statement.where(~on_bookshelf),
+        column=sort_column,
+        id_column=Book.id,
+        sort_key=sort_key,
+        sort_direction=sort_direction,
+        cursor=cursor,
+        limit=limit,
     )
 
-    # Main query to select books not in the subquery results
-    query = select(Book).where(Book.id.not_in(subquery))
-
-    # Execute the query and fetch all results
-    result = db.exec(query)
-    books = result.fetchall()
-
-    return [BookPublic.model_validate(book).model_dump() for book in books]
+    books, next_cursor = next_page((await db.exec(statement)).all(), sort_key=sort_key, limit=limit)
+
+    if not summary:
+        return BookPage(
+            books=[BookPublic.model_validate(book) for book in books],
+            next_cursor=next_cursor,
+        ).model_dump()
+
+    images = [ImagePublic.model_validate(book.Image) if book.Image is not None else None for book in books]
+    resolve_image_uris(images)
+
+    return BookSummaryPage(
+        books=[
+            BookSummary(
+                id=book.id,
+                title=book.title,
+                author=book.author,
+                # Covers stored before variants existed only have their original
+                thumbnail_uri=image.variant_uris.get("thumbnail", image.uri) if image is not None else None,
+            )
+            for book, image in zip(books, images)
+        ],
+        next_cursor=next_cursor,
+    ).model_dump()
 
 
 @router.post("/{bookshelf_id}/books/", status_code=status.HTTP_201_CREATED)
-def add_book_to_bookshelf(
+async def add_book_to_bookshelf(
     bookshelf_id: Annotated[
         int, Path(title="The ID of the bookshelf to add a book to.")
     ],
     book_ids: BookIds,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    # Fetch the bookshelf
-    bookshelf = db.get(Bookshelf, bookshelf_id)
-    if not bookshelf:
+    # Neither the books already on the shelf nor the books being added are loaded,
+    # so this costs the same however large the shelf is
+    if not await db.get(Bookshelf, bookshelf_id):
         raise HTTPException(status_code=404, detail="Bookshelf not found")
 
-    # Fetch all the books
-    books_to_add = []
-    for book_id in book_ids.book_ids:
-        book = db.get(Book, book_id)
-        if not book:
+    # Check that all the books exist in one query
+    requested_ids = list(dict.fromkeys(book_ids.book_ids))
+    existing_ids = set((await db.exec(select(Book.id).where(Book.id.in_(requested_ids)))).all())
+    for book_id in requested_ids:
+        if book_id not in existing_ids:
             raise HTTPException(
                 status_code=404, detail=f"Book with ID {book_id} not found"
             )
 
-        books_to_add.append(book)
+    # Books already on the shelf are left as they are
+    if requested_ids:
+        await db.exec(
+            sqlite_insert(BookBookshelfLink).on_conflict_do_nothing(),
+            params=[{"bookshelf_id": bookshelf_id, "book_id": book_id} for book_id in requested_ids],
+        )
+
+    await db.commit()
+
+    return None
+
 
-    # Add all the books to the bookshelf's books list
-    bookshelf.books.extend(books_to_add)
+@router.delete("/{bookshelf_id}/books/", status_code=status.HTTP_204_NO_CONTENT)
+async def bulk_delete_books_from_bookshelf(
+    bookshelf_id: Annotated[
+        int, Path(title="The ID of the bookshelf to delete books from")
+    ],
+    book_ids: BookIds,
+    db: AsyncSession = Depends(get_async_db),
+):
+    if not await db.get(Bookshelf, bookshelf_id):
+        raise HTTPException(status_code=404, detail="Bookshelf not found")
 
-    # Commit the changes
-    db.commit()
+    # Books that are not on the shelf are ignored
+    await db.exec(
+        delete(BookBookshelfLink)
+        .where(BookBookshelfLink.bookshelf_id == bookshelf_id)
+        .where(BookBookshelfLink.book_id.in_(book_ids.book_ids))
+    )
+    await db.commit()
 
     return None
 
@@ -157,26 +244,25 @@ def add_book_to_bookshelf(
 @router.delete(
     "/{bookshelf_id}/books/{book_id}", status_code=status.HTTP_204_NO_CONTENT
 )
-def delete_book_from_bookshelf(
+async def delete_book_from_bookshelf(
     bookshelf_id: Annotated[
         int, Path(title="The ID of the bookshelf to delete a book from")
     ],
     book_id: Annotated[int, Path(title="The ID of the book to delete")],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    # Retrieve the Bookshelf instance
-    bookshelf = db.get(Bookshelf, bookshelf_id)
-    if not bookshelf:
+    if not await db.get(Bookshelf, bookshelf_id):
         raise HTTPException(status_code=404, detail="Bookshelf not found")
 
-    # Retrieve the Book instance to remove
-    book_to_remove = db.get(Book, book_id)
-    if not book_to_remove:
+    if not await db.get(Book, book_id):
         raise HTTPException(status_code=404, detail="Book not found")
 
-    # Remove the book from the bookshelf
-    if book_to_remove in bookshelf.books:
-        bookshelf.books.remove(book_to_remove)
-        db.commit()
+    # Remove the book from the bookshelf, if it is on it
+    await db.exec(
+        delete(BookBookshelfLink)
+        .where(BookBookshelfLink.bookshelf_id == bookshelf_id)
+        .where(BookBookshelfLink.book_id == book_id)
+    )
+    await db.commit()
 
     return None
@@ -1,9 +1,12 @@
+import asyncio
 from abc import ABC, abstractmethod
 
 from app.models.openlibrary import Works
 from app.models.exception import ExceptionHandler
 
 class BaseOpenLibraryHandler(ABC):
+  # Upper bound on how many calls of a batch run at once, to stay polite to Open Library
+  batch_concurrency = 8
 
   @abstractmethod
   async def search_by_title(self, title: str) -> Works | ExceptionHandler:
@@ -11,6 +14,42 @@ class BaseOpenLibraryHandler(ABC):
     pass
 
   @abstractmethod
-  async def fetch_image_from_olid(self, olid: str) -> str:
-    """To be implemented by subclass."""
-    pass
\ No newline at end of file
+  async def fetch_image_from_olid(self, olid: str) -> str | None:
+    """Store the cover for `olid`, returning the content addressed key it was stored under,
+    or None if Open Library has no cover for it. To be implemented by subclass."""
+    pass
+
+  @abstractmethod
+  async def has_cover(self, olid: str) -> bool:
+    """Whether Open Library has a real cover for `olid`, rather than its placeholder. To be implemented by subclass."""
+    pass
+
+  async def search_many(self, titles: list[str]) -> list[Works | ExceptionHandler]:
+    """Results in the same order as `titles`. Subclasses may override to batch the searches"""
+    semaphore = asyncio.Semaphore(self.batch_concurrency)
+
+    async def search(title):
+      async with semaphore:
+        return await self.search_by_title(title=title)
+
+    return await asyncio.gather(*(search(title) for title in titles))
+
+  async def fetch_images_from_olids(self, olids: list[str]) -> list[str | None | Exception]:
+    """Image names in the same order as `olids`, None for those without a cover, or the exception raised fetching each one"""
+    semaphore = asyncio.Semaphore(self.batch_concurrency)
+
+    async def fetch(olid):
+      async with semaphore:
+        return await self.fetch_image_from_olid(olid=olid)
+
+    return await asyncio.gather(*(fetch(olid) for olid in olids), return_exceptions=True)
+
+  async def has_covers(self, olids: list[str]) -> list[bool | Exception]:
+    """Whether each of `olids` has a real cover, in order, or the exception raised checking it"""
+    semaphore = asyncio.Semaphore(self.batch_concurrency)
+
+    async def check(olid):
+      async with semaphore:
+        return await self.has_cover(olid=olid)
+
+    return await asyncio.gather(*(check(olid) for olid in olids), return_exceptions=True)
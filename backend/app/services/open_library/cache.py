@@ -0,0 +1,315 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.db.sqlite import get_async_engine
+from app.services.open_library.base import BaseOpenLibraryHandler
+from app.models.openlibrary import Works
+from app.models.exception import ExceptionHandler
+from app.models.search_cache import SearchCache
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SearchCacheStats:
+  hits: int = 0
+  misses: int = 0
+  # Lookups that were failures cached from a previous search
+  negative_hits: int = 0
+  # Memory misses found in the persistent store
+  persistent_hits: int = 0
+  # Lookups that joined an identical search already in flight
+  coalesced: int = 0
+  evictions: int = 0
+
+
+def utcnow() -> datetime:
+  # SQLite has no time zones, so expiry times are stored as naive UTC
+  return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class SqliteSearchCacheStore:
+  """Search results persisted in the `search_cache` table.
+
+  Unlike the in-memory cache this survives process recycling, such as Lambda
+  cold starts. Only successful searches are stored. Every write deletes expired
+  rows, which the index on `expires_at` keeps cheap. The table is trimmed to
+  `max_rows`, soonest to expire first, on a process's first write and then at
+  most every `eviction_interval` seconds, so short-lived processes still trim it.
+  """
+
+  def __init__(self, engine, max_rows: int = 10000, eviction_interval: float = 60, now=utcnow):
+    self.engine = engine
+    self.max_rows = max_rows
+    self.eviction_interval = timedelta(seconds=eviction_interval)
+    self.now = now
+    self._trimmed_at: datetime | None = None
+
+  async def get(self, key: str) -> tuple[float, Works] | None:
+    """The stored result for `key` and its remaining lifetime in seconds, if it has not expired"""
+    async with AsyncSession(self.engine) as session:
+      entry = await session.get(SearchCache, key)
+
+    if entry is None:
+      return None
+
+    remaining = (entry.expires_at - self.now()).total_seconds()
+    if remaining <= 0:
+      return None
+
+    return remaining, Works.from_dump(entry.works)
+
+  async def set(self, key: str, works: Works, ttl: float):
+    now = self.now()
+    values = {"query": key, "works": works.model_dump(), "expires_at": now + timedelta(seconds=ttl)}
+    statement = insert(SearchCache).values(**values)
+    statement = statement.on_conflict_do_update(
+      index_elements=[SearchCache.query],
+      set_={"works": statement.excluded.works, "expires_at": statement.excluded.expires_at},
+    )
+
+    async with AsyncSession(self.engine) as session:
+      await session.exec(statement)
+      await session.exec(delete(SearchCache).where(SearchCache.expires_at <= now))
+      if self._trimmed_at is None or now - self._trimmed_at >= self.eviction_interval:
+        self._trimmed_at = now
+        await self._trim(session)
+      await session.commit()
+
+  async def _trim(self, session: AsyncSession):
+    count = (await session.exec(select(func.count()).select_from(SearchCache))).one()
+    if count > self.max_rows:
+      soonest_to_expire = select(SearchCache.query).order_by(SearchCache.expires_at).limit(count - self.max_rows)
+      await session.exec(delete(SearchCache).where(SearchCache.query.in_(soonest_to_expire)))
+
+
+class CachedOpenLibraryHandler(BaseOpenLibraryHandler):
+  """Caches title searches from another handler.
+
+  The frontend searches as the user types, so the same titles come in repeatedly.
+  Results are kept for `ttl` seconds and failures for `negative_ttl` seconds, in an
+  LRU of at most `max_size` titles. Identical searches made while one is already
+  in flight wait on that search instead of making their own.
+
+  If a `store` is given, memory misses are looked up there before going to the
+  network, and successful searches are written to it.
+
+  Cover fetches are not cached, as callers reuse covers already in storage, see
+  `CoalescedCoverHandler` for sharing concurrent ones. Whether an OLID has a real
+  cover is kept for `cover_ttl` seconds, as editions rarely gain or lose one, in an
+  LRU of its own of at most `cover_max_size` OLIDs.
+  """
+
+  def __init__(self, handler: BaseOpenLibraryHandler, ttl: float = 300, negative_ttl: float = 30, max_size: int = 1024, clock=time.monotonic, store: SqliteSearchCacheStore | None = None, cover_ttl: float = 86400, cover_max_size: int = 10000):
+    self.handler = handler
+    self.store = store
+    self.ttl = ttl
+    self.negative_ttl = negative_ttl
+    self.max_size = max_size
+    self.clock = clock
+    self.cover_ttl = cover_ttl
+    self.cover_max_size = cover_max_size
+    self.stats = SearchCacheStats()
+    # Normalized title => (expiry, result), least recently used first
+    self._entries: OrderedDict[str, tuple[float, Works | ExceptionHandler]] = OrderedDict()
+    self._in_flight: dict[str, asyncio.Task] = {}
+    # OLID => (expiry, whether it has a real cover), least recently used first
+    self._covers: OrderedDict[str, tuple[float, bool]] = OrderedDict()
+
+  @staticmethod
+  def normalize_title(title: str) -> str:
+    return " ".join(title.split()).casefold()
+
+  async def search_by_title(self, title: str) -> Works | ExceptionHandler:
+    key = self.normalize_title(title)
+
+    result = self._recall(key)
+    if result is not None:
+      return result
+
+    task = self._in_flight.get(key)
+    if task is not None:
+      self.stats.coalesced += 1
+    else:
+      self.stats.misses += 1
+      task = asyncio.ensure_future(self._search(key, " ".join(title.split())))
+      self._in_flight[key] = task
+
+    # Shielded so a client disconnecting does not cancel the search for everyone else waiting on it
+    return await asyncio.shield(task)
+
+  async def _search(self, key: str, title: str) -> Works | ExceptionHandler:
+    try:
+      stored = await self._get_stored(key)
+      if stored is not None:
+        remaining, result = stored
+        self.stats.persistent_hits += 1
+        self._remember(key, result, min(self.ttl, remaining))
+        return result
+
+      result = await self.handler.search_by_title(title=title)
+
+      if isinstance(result, ExceptionHandler):
+        self._remember(key, result, self.negative_ttl)
+      else:
+        self._remember(key, result, self.ttl)
+        await self._store(key, result)
+    finally:
+      del self._in_flight[key]
+
+    return result
+
+  async def search_many(self, titles: list[str]) -> list[Works | ExceptionHandler]:
+    # Titles missing from both caches go to the wrapped handler together, so a remote handler can batch them.
+    # Unlike `search_by_title`, these do not join or register in-flight searches
+    keys = [self.normalize_title(title) for title in titles]
+    results = {}
+    misses = {}
+
+    for key, title in zip(keys, titles):
+      if key in results or key in misses:
+        continue
+      result = self._recall(key)
+      if result is not None:
+        results[key] = result
+      else:
+        self.stats.misses += 1
+        misses[key] = " ".join(title.split())
+
+    for key in list(misses):
+      stored = await self._get_stored(key)
+      if stored is not None:
+        remaining, result = stored
+        self.stats.persistent_hits += 1
+        self._remember(key, result, min(self.ttl, remaining))
+        results[key] = result
+        del misses[key]
+
+    if misses:
+      for key, result in zip(misses, await self.handler.search_many(list(misses.values()))):
+        if isinstance(result, ExceptionHandler):
+          self._remember(key, result, self.negative_ttl)
+        else:
+          self._remember(key, result, self.ttl)
+          await self._store(key, result)
+        results[key] = result
+
+    return [results[key] for key in keys]
+
+  def _recall(self, key: str) -> Works | ExceptionHandler | None:
+    entry = self._entries.get(key)
+    if entry is None:
+      return None
+
+    expires_at, result = entry
+    if expires_at <= self.clock():
+      del self._entries[key]
+      return None
+
+    self._entries.move_to_end(key)
+    if isinstance(result, ExceptionHandler):
+      self.stats.negative_hits += 1
+    else:
+      self.stats.hits += 1
+    return result
+
+  # The persistent store is an optimization. If it cannot be read or written, searches carry on without it
+  async def _get_stored(self, key: str) -> tuple[float, Works] | None:
+    if self.store is None:
+      return None
+    try:
+      return await self.store.get(key)
+    except SQLAlchemyError:
+      logger.exception("Unable to read search cache")
+      return None
+
+  async def _store(self, key: str, result: Works):
+    if self.store is None:
+      return
+    try:
+      await self.store.set(key, result, self.ttl)
+    except SQLAlchemyError:
+      logger.exception("Unable to write search cache")
+
+  def _remember(self, key: str, result: Works | ExceptionHandler, ttl: float):
+    self._entries[key] = (self.clock() + ttl, result)
+    self._entries.move_to_end(key)
+    while len(self._entries) > self.max_size:
+      self._entries.popitem(last=False)
+      self.stats.evictions += 1
+
+  async def fetch_image_from_olid(self, olid: str) -> str | None:
+    return await self.handler.fetch_image_from_olid(olid=olid)
+
+  async def fetch_images_from_olids(self, olids: list[str]) -> list[str | None | Exception]:
+    return await self.handler.fetch_images_from_olids(olids=olids)
+
+  async def has_cover(self, olid: str) -> bool:
+    result = (await self.has_covers([olid]))[0]
+    if isinstance(result, Exception):
+      raise result
+    return result
+
+  async def has_covers(self, olids: list[str]) -> list[bool | Exception]:
+    # OLIDs not already known go to the wrapped handler together, so a remote handler can batch them
+    results = {}
+    now = self.clock()
+    for olid in olids:
+      entry = self._covers.get(olid)
+      if entry is not None and entry[0] > now:
+        self._covers.move_to_end(olid)
+        results[olid] = entry[1]
+
+    misses = list(dict.fromkeys(olid for olid in olids if olid not in results))
+    if misses:
+      for olid, result in zip(misses, await self.handler.has_covers(misses)):
+        # Failed checks are not remembered, so they are tried again next time
+        if not isinstance(result, Exception):
+          self._covers[olid] = (self.clock() + self.cover_ttl, result)
+          self._covers.move_to_end(olid)
+        results[olid] = result
+      while len(self._covers) > self.cover_max_size:
+        self._covers.popitem(last=False)
+
+    return [results[olid] for olid in olids]
+
+  def get_stats(self) -> dict:
+    return {**asdict(self.stats), "size": len(self._entries), "max_size": self.max_size, "in_flight": len(self._in_flight)}
+
+  def clear(self):
+    self._entries.clear()
+
+
+def cached_from_env(handler: BaseOpenLibraryHandler) -> BaseOpenLibraryHandler:
+  max_size = int(os.getenv('OPEN_LIBRARY_SEARCH_CACHE_SIZE', 1024))
+  persistent_size = int(os.getenv('OPEN_LIBRARY_SEARCH_CACHE_PERSISTENT_SIZE', 10000))
+  cover_max_size = int(os.getenv('OPEN_LIBRARY_COVER_CACHE_SIZE', 10000))
+
+  # Sizes of 0 turn each cache off
+  if max_size <= 0 and persistent_size <= 0 and cover_max_size <= 0:
+    return handler
+
+  store = None
+  if persistent_size > 0:
+    store = SqliteSearchCacheStore(get_async_engine(), max_rows=persistent_size)
+
+  return CachedOpenLibraryHandler(
+    handler,
+    ttl=float(os.getenv('OPEN_LIBRARY_SEARCH_CACHE_TTL', 300)),
+    negative_ttl=float(os.getenv('OPEN_LIBRARY_SEARCH_CACHE_NEGATIVE_TTL', 30)),
+    max_size=max(max_size, 0),
+    store=store,
+    cover_ttl=float(os.getenv('OPEN_LIBRARY_COVER_CACHE_TTL', 86400)),
+    cover_max_size=max(cover_max_size, 0),
+  )
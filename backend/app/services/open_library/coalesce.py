@@ -0,0 +1,63 @@
+import asyncio
+
+from app.services.open_library.base import BaseOpenLibraryHandler
+from app.models.openlibrary import Works
+from app.models.exception import ExceptionHandler
+
+
+class CoalescedCoverHandler(BaseOpenLibraryHandler):
+  """Shares one download between concurrent fetches of the same cover from another handler.
+
+  Single creates, updates and bulk imports all fetch through here, so an OLID being
+  fetched by any of them is joined rather than downloaded again. Bulk fetches send the
+  OLIDs not already in flight to the wrapped handler together, so a remote handler can
+  batch them. Covers are not kept once fetched, as callers reuse covers already in storage.
+  """
+
+  def __init__(self, handler: BaseOpenLibraryHandler):
+    self.handler = handler
+    # OLID => its cover fetch
+    self._in_flight: dict[str, asyncio.Future] = {}
+
+  async def search_by_title(self, title: str) -> Works | ExceptionHandler:
+    return await self.handler.search_by_title(title=title)
+
+  async def search_many(self, titles: list[str]) -> list[Works | ExceptionHandler]:
+    return await self.handler.search_many(titles=titles)
+
+  async def has_cover(self, olid: str) -> bool:
+    return await self.handler.has_cover(olid=olid)
+
+  async def has_covers(self, olids: list[str]) -> list[bool | Exception]:
+    return await self.handler.has_covers(olids=olids)
+
+  async def fetch_image_from_olid(self, olid: str) -> str | None:
+    task = self._in_flight.get(olid)
+    if task is None:
+      task = self._track(olid, asyncio.ensure_future(self.handler.fetch_image_from_olid(olid=olid)))
+
+    # Shielded so a client disconnecting does not cancel the fetch for everyone else waiting on it
+    return await asyncio.shield(task)
+
+  async def fetch_images_from_olids(self, olids: list[str]) -> list[str | None | Exception]:
+    tasks = {olid: self._in_flight[olid] for olid in olids if olid in self._in_flight}
+
+    misses = list(dict.fromkeys(olid for olid in olids if olid not in tasks))
+    if misses:
+      batch = asyncio.ensure_future(self.handler.fetch_images_from_olids(olids=misses))
+      for index, olid in enumerate(misses):
+        tasks[olid] = self._track(olid, asyncio.ensure_future(self._from_batch(batch, index)))
+
+    return await asyncio.gather(*(asyncio.shield(tasks[olid]) for olid in olids), return_exceptions=True)
+
+  def _track(self, olid: str, task: asyncio.Future) -> asyncio.Future:
+    self._in_flight[olid] = task
+    task.add_done_callback(lambda _: self._in_flight.pop(olid, None))
+    return task
+
+  @staticmethod
+  async def _from_batch(batch: asyncio.Future, index: int) -> str | None:
+    result = (await batch)[index]
+    if isinstance(result, Exception):
+      raise result
+    return result
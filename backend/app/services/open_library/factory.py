@@ -1,15 +1,21 @@
+import functools
 import os
 
+from app.services.open_library.cache import cached_from_env
+from app.services.open_library.coalesce import CoalescedCoverHandler
 from app.services.open_library.local import LocalOpenLibraryHandler
 from app.services.open_library.remote import RemoteOpenLibraryHandler
 
+# One handler, and so one search cache and one set of cover fetches in flight, is shared by every request
+# Cover fetches are coalesced whether or not searches are cached
+@functools.cache
 def get_open_library():
     
     is_running_in_lambda = os.getenv('AWS_EXECUTION_ENV') is not None
     
     if is_running_in_lambda:
         # We need our remote handler to escape our VPC for internet access
-        return RemoteOpenLibraryHandler()
+        return cached_from_env(CoalescedCoverHandler(RemoteOpenLibraryHandler()))
     
     # We are not constrained by a VPC and so can access the internet
-    return LocalOpenLibraryHandler()
\ No newline at end of file
+    return cached_from_env(CoalescedCoverHandler(LocalOpenLibraryHandler()))
\ No newline at end of file
@@ -4,7 +4,10 @@ import urllib
 from app.services.open_library.base import BaseOpenLibraryHandler
 from app.models.openlibrary import Work, Works
 from app.models.exception import ExceptionHandler
+from app.utils.images.content import save_content_addressed
 from app.utils.images.factory import get_image_handler
+from app.utils.http_client import get_http_client
+from app.utils.images.stream import ImageTooLargeError, limit_stream
 
 
 class LocalOpenLibraryHandler(BaseOpenLibraryHandler):
@@ -23,55 +26,88 @@ class LocalOpenLibraryHandler(BaseOpenLibraryHandler):
     self.cover_image_url = "https://covers.openlibrary.org/b/olid/{olid}-{size}.{extension}"
     self.cover_image_size = "L"
     self.cover_image_extension = "jpg"
+    self.cover_timeout = 10 # seconds
+    self.cover_max_size = 5 * 1024 * 1024 # 5MB
+    # Editions without a cover are a 404, rather than a placeholder image
+    self.cover_image_params = {"default": "false"}
 
     # Use Image utility to help with image fetching and determining cover URI
     self.image_handler = get_image_handler()
 
   async def search_by_title(self, title: str) -> Works | ExceptionHandler:
-    async with httpx.AsyncClient() as client:
-      try:
-        url = self._build_search_url(title=title)
-        response = await client.get(url, timeout=self.search_timeout)
-        response.raise_for_status()
-      except httpx.TimeoutException:
-        return ExceptionHandler(status_code=ExceptionHandler.get_timeout_status_code(), message=f"Open Library's API has timed out after {self.search_timeout} seconds.")
-      except Exception as e:
-        return ExceptionHandler(status_code=ExceptionHandler.get_timeout_status_code(), message=str(e))
-
-      try:
-        response_json = response.json()
-
-        if "docs" not in response_json or len(response_json["docs"]) == 0:
-
-          return ExceptionHandler(status_code=ExceptionHandler.get_no_results_status_code(), message="No results found. Please try a different search.")
-
-        works = []
-        for doc in response_json["docs"]:
-          try:
-            Work.model_validate(doc)
-            works.append(Work(**doc))
-          except ValidationError as exc:
-            print(repr(exc.errors()[0]["type"]))
-
-        return Works(**{"works": works})
-
-      except Exception as e:
-        return ExceptionHandler(status_code=ExceptionHandler.get_no_results_status_code(), message=str(e))
-
-  async def fetch_image_from_olid(self, olid: str) -> str:
+    # The shared client keeps connections to Open Library alive between searches
+    client = get_http_client()
+    try:
+      url = self._build_search_url(title=title)
+      response = await client.get(url, timeout=self.search_timeout)
+      response.raise_for_status()
+    except httpx.TimeoutException:
+      return ExceptionHandler(status_code=ExceptionHandler.get_timeout_status_code(), message=f"Open Library's API has timed out after {self.search_timeout} seconds.")
+    except Exception as e:
+      return ExceptionHandler(status_code=ExceptionHandler.get_timeout_status_code(), message=str(e))
+
+    try:
+      response_json = response.json()
+
+      if "docs" not in response_json or len(response_json["docs"]) == 0:
+
+        return ExceptionHandler(status_code=ExceptionHandler.get_no_results_status_code(), message="No results found. Please try a different search.")
+
+      works = []
+      for doc in response_json["docs"]:
+        try:
+          Work.model_validate(doc)
+          works.append(Work(**doc))
+        except ValidationError as exc:
+          print(repr(exc.errors()[0]["type"]))
+
+      return Works(**{"works": works})
+
+    except Exception as e:
+      return ExceptionHandler(status_code=ExceptionHandler.get_no_results_status_code(), message=str(e))
+
+  async def fetch_image_from_olid(self, olid: str) -> str | None:
       # URL where we can find the cover image we want using OLID
       open_library_url = self._build_image_url_from_olid(olid=olid)
 
-      # Download image from Open Library
-      image_path = self.image_handler.download_image(open_library_url, olid + "." + self.cover_image_extension)
+      # Stream the image from Open Library into storage, keyed by the hash of its contents
+      # Raises `httpx.HTTPError` if the download fails, or `ImageTooLargeError` past the size cap
+      client = get_http_client()
+      async with client.stream("GET", open_library_url, params=self.cover_image_params, timeout=self.cover_timeout) as response:
+          # Editions without a cover are a 404 rather than a placeholder, so no separate check is needed
+          if response.status_code == 404:
+              return None
+          response.raise_for_status()
+
+          content_length = response.headers.get("Content-Length")
+          if content_length is not None and int(content_length) > self.cover_max_size:
+              raise ImageTooLargeError(f"Image exceeds the maximum size of {self.cover_max_size} bytes")
+
+          digest = await save_content_addressed(
+              self.image_handler, limit_stream(response.aiter_bytes(), self.cover_max_size), "." + self.cover_image_extension
+          )
 
-      # Read image contents to bytes
-      with open(image_path, "rb") as image_file:
-          image_content = image_file.read()
+      return digest + "." + self.cover_image_extension
+
+  async def has_cover(self, olid: str) -> bool:
+      # Real covers redirect to archive.org, which need not be followed to know one exists
+      client = get_http_client()
+      async with client.stream(
+          "GET",
+          self._build_image_url_from_olid(olid=olid),
+          params=self.cover_image_params,
+          timeout=self.cover_timeout,
+          follow_redirects=False,
+      ) as response:
+          if response.status_code == 404:
+              return False
+          # `is_redirect` holds for any 3xx, e.g. a 304, so only an actual redirect counts
+          if response.has_redirect_location or response.is_success:
+              return True
+          response.raise_for_status()
+          # Any other status that raise_for_status lets through says nothing of a cover
+          return False
 
-      # Store the image in its final location
-      self.image_handler.save_image(olid + "." + self.cover_image_extension, image_content)
-      
   def _build_search_url(self, title) -> str:
       params = {
           self.search_fields_key: self.search_fields_separator.join(
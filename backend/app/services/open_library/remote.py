@@ -1,20 +1,65 @@
+import asyncio
+import functools
 import json
 import os
 import boto3
 import inspect
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
 from app.services.open_library.base import BaseOpenLibraryHandler
 from app.models.exception import ExceptionHandler
-from app.models.openlibrary import Works, Work
+from app.models.openlibrary import Works
+
+
+class LambdaInvocationError(Exception):
+  pass
+
+
+# boto3 is blocking, so invocations run on their own threads. There is one thread per
+# pooled connection, so concurrent invocations neither queue for a connection nor
+# occupy the thread pool that serves the rest of the app
+LAMBDA_MAX_POOL_CONNECTIONS = int(os.getenv('LAMBDA_MAX_POOL_CONNECTIONS', 32))
+
+
+@functools.cache
+def get_lambda_client():
+  config = Config(
+    max_pool_connections=LAMBDA_MAX_POOL_CONNECTIONS,
+    connect_timeout=float(os.getenv('LAMBDA_CONNECT_TIMEOUT', 2)), # seconds
+    # Nothing is read until the function returns, so this must cover a whole batch.
+    # Callers bound their own waits with `invoke_timeout` and `batch_invoke_timeout`
+    read_timeout=float(os.getenv('LAMBDA_READ_TIMEOUT', 120)), # seconds
+    retries={
+      "mode": "standard",
+      "total_max_attempts": int(os.getenv('LAMBDA_MAX_ATTEMPTS', 2)),
+    },
+    tcp_keepalive=True,
+  )
+  # The endpoint can be pointed elsewhere, e.g. at a local stand-in for Lambda
+  return boto3.client('lambda', config=config, endpoint_url=os.getenv('LAMBDA_ENDPOINT_URL'))
+
+
+@functools.cache
+def get_lambda_executor() -> ThreadPoolExecutor:
+  return ThreadPoolExecutor(max_workers=LAMBDA_MAX_POOL_CONNECTIONS, thread_name_prefix="lambda-invoke")
 
 
 class RemoteOpenLibraryHandler(BaseOpenLibraryHandler):
 
-  def __init__(self):
+  def __init__(self, lambda_client=None, executor: ThreadPoolExecutor | None = None):
     self.openlibrary_lambda_function = os.getenv('NON_VPC_LAMBDA_FUNCTION_NAME')
-    self.lambda_client = boto3.client('lambda')
+    self.lambda_client = lambda_client or get_lambda_client()
+    self.executor = executor or get_lambda_executor()
+    # Budget for a whole invocation, including botocore's retries
+    self.invoke_timeout = float(os.getenv('LAMBDA_INVOKE_TIMEOUT', 30)) # seconds
+    # Most calls sent in one batch invocation. Synchronous invocations cap responses at 6MB
+    self.batch_size = int(os.getenv('LAMBDA_BATCH_SIZE', 50))
+    # The function works through a batch a few calls at a time, each with its own 10 second Open Library timeout
+    self.batch_invoke_timeout = float(os.getenv('LAMBDA_BATCH_INVOKE_TIMEOUT', 120)) # seconds
 
   async def search_by_title(self, title: str) -> Works | ExceptionHandler:
-    
+
     event_payload = {
       "method": inspect.currentframe().f_code.co_name,
       "arguments": {
@@ -22,28 +67,21 @@ class RemoteOpenLibraryHandler(BaseOpenLibraryHandler):
       }
     }
 
-    remote_response = await self._invoke_lambda(event_payload=event_payload)
+    try:
+      remote_response = await self._invoke_lambda(event_payload=event_payload)
+    except asyncio.TimeoutError:
+      return ExceptionHandler(status_code=ExceptionHandler.get_timeout_status_code(), message=f"Open Library search has timed out after {self.invoke_timeout} seconds.")
+    except (LambdaInvocationError, BotoCoreError, ClientError) as e:
+      return ExceptionHandler(status_code=ExceptionHandler.get_generic_status_code(), message=str(e))
+
+    # Our function serializes its `ExceptionHandler` responses as well
+    if isinstance(remote_response, dict) and "status_code" in remote_response:
+      return ExceptionHandler(**remote_response)
 
     # We need to transform this back into a format we'd expect from Open Library's API to handle it gracefully
-    remote_response_transformed = []
-    for doc in remote_response:
-      transformed_doc = doc
-      # Convert author back to list
-      transformed_doc["author_name"] = [doc["author_name"]]
-      # Split OLIDs back into original keys
-      transformed_doc["cover_edition_key"] = doc["olids"][0]
-      transformed_doc["edition_key"] = doc["olids"]
-      # Remove olids key
-      del transformed_doc["olids"]
-      remote_response_transformed.append(transformed_doc)
-
-    works = []
-    for doc in remote_response_transformed:
-      works.append(Work(**doc))
-      
-    return Works(**{"works": works})
-
-  async def fetch_image_from_olid(self, olid: str) -> str:
+    return Works.from_dump(remote_response)
+
+  async def fetch_image_from_olid(self, olid: str) -> str | None:
 
     event_payload = {
       "method": inspect.currentframe().f_code.co_name,
@@ -53,14 +91,85 @@ class RemoteOpenLibraryHandler(BaseOpenLibraryHandler):
     }
 
     return await self._invoke_lambda(event_payload=event_payload)
-  
-  async def _invoke_lambda(self, event_payload: dict):
-
-    response = self.lambda_client.invoke(
-      FunctionName=self.openlibrary_lambda_function,
-      InvocationType="RequestResponse",
-      Payload=json.dumps(event_payload)
-    )
-    payload = response["Payload"].read()
-    
-    return json.loads(payload)
\ No newline at end of file
+
+  async def has_cover(self, olid: str) -> bool:
+
+    event_payload = {
+      "method": inspect.currentframe().f_code.co_name,
+      "arguments": {
+        "olid": olid
+      }
+    }
+
+    return await self._invoke_lambda(event_payload=event_payload)
+
+  async def search_many(self, titles: list[str]) -> list[Works | ExceptionHandler]:
+    calls = [{"method": "search_by_title", "arguments": {"title": title}} for title in titles]
+
+    results = []
+    for outcome in await self._invoke_lambda_batch(calls):
+      if isinstance(outcome, asyncio.TimeoutError):
+        results.append(ExceptionHandler(status_code=ExceptionHandler.get_timeout_status_code(), message=str(outcome)))
+      elif isinstance(outcome, Exception):
+        results.append(ExceptionHandler(status_code=ExceptionHandler.get_generic_status_code(), message=str(outcome)))
+      elif isinstance(outcome, dict) and "status_code" in outcome:
+        results.append(ExceptionHandler(**outcome))
+      else:
+        results.append(Works.from_dump(outcome))
+    return results
+
+  async def fetch_images_from_olids(self, olids: list[str]) -> list[str | None | Exception]:
+    calls = [{"method": "fetch_image_from_olid", "arguments": {"olid": olid}} for olid in olids]
+
+    return await self._invoke_lambda_batch(calls)
+
+  async def has_covers(self, olids: list[str]) -> list[bool | Exception]:
+    calls = [{"method": "has_cover", "arguments": {"olid": olid}} for olid in olids]
+
+    return await self._invoke_lambda_batch(calls)
+
+  async def _invoke_lambda_batch(self, calls: list[dict]) -> list:
+    """Run `calls` in as few invocations as `batch_size` allows.
+
+    Returns each call's result in order, or an exception if it, or the invocation carrying it, failed.
+    """
+    batches = [calls[i:i + self.batch_size] for i in range(0, len(calls), self.batch_size)]
+
+    async def invoke_batch(batch):
+      try:
+        response = await self._invoke_lambda(event_payload={"calls": batch}, timeout=self.batch_invoke_timeout)
+      except asyncio.TimeoutError:
+        return [asyncio.TimeoutError(f"Open Library batch has timed out after {self.batch_invoke_timeout} seconds.")] * len(batch)
+      except (LambdaInvocationError, BotoCoreError, ClientError) as e:
+        return [e] * len(batch)
+
+      return [
+        LambdaInvocationError(result["error"]) if "error" in result else result["result"]
+        for result in response["results"]
+      ]
+
+    results = []
+    for batch_results in await asyncio.gather(*(invoke_batch(batch) for batch in batches)):
+      results.extend(batch_results)
+    return results
+
+  async def _invoke_lambda(self, event_payload: dict, timeout: float | None = None):
+    """Raises `asyncio.TimeoutError` past `timeout` (by default `invoke_timeout`), or `LambdaInvocationError` if our function failed"""
+    loop = asyncio.get_running_loop()
+
+    def invoke():
+      response = self.lambda_client.invoke(
+        FunctionName=self.openlibrary_lambda_function,
+        InvocationType="RequestResponse",
+        Payload=json.dumps(event_payload)
+      )
+      # The payload is a stream still being read from the network, so it is read here too, off the event loop
+      return response, json.loads(response["Payload"].read())
+
+    response, payload = await asyncio.wait_for(loop.run_in_executor(self.executor, invoke), timeout=timeout or self.invoke_timeout)
+
+    # An unhandled error in our function still comes back as a 200, with the error as the payload
+    if "FunctionError" in response:
+      raise LambdaInvocationError(payload.get("errorMessage", response["FunctionError"]))
+
+    return payload
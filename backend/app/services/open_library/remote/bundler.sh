@@ -22,12 +22,15 @@ cp ../../../utils/images/factory.py lambda_package/app/utils/images/factory.py
 cp ../../../utils/images/base.py lambda_package/app/utils/images/base.py
 cp ../../../utils/images/s3.py lambda_package/app/utils/images/s3.py
 cp ../../../utils/images/local.py lambda_package/app/utils/images/local.py
+cp ../../../utils/images/content.py lambda_package/app/utils/images/content.py
+cp ../../../utils/images/stream.py lambda_package/app/utils/images/stream.py
+cp ../../../utils/http_client.py lambda_package/app/utils/http_client.py
 
 # Install FastAPI and Pydantic
 # TODO may need to peg these to versions from requirements.txt?
 pip install --target ./lambda_package pydantic
 pip install --target ./lambda_package fastapi
-pip install --target ./lambda_package httpx
+pip install --target ./lambda_package "httpx[http2]"
 
 # Zip contents
 cd lambda_package
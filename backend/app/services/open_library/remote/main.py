@@ -4,6 +4,13 @@ from app.services.open_library.local import LocalOpenLibraryHandler
 
 def handler(event, context):
 
+    # A batch is a list of individual calls, run concurrently in this one invocation
+    calls = event.get('calls')
+    if calls is not None:
+        loop = asyncio.get_event_loop()
+
+        return loop.run_until_complete(batch_handler(calls))
+
     method = event.get('method')
     arguments = event.get('arguments')
     
@@ -32,4 +39,28 @@ async def async_handler(method, arguments):
         # We need to serialize the response
         return response.model_dump()
     
-    return response
\ No newline at end of file
+    return response
+
+
+async def batch_handler(calls):
+    # Each result is either {"result": ...} or {"error": ...}, in the order of `calls`
+    semaphore = asyncio.Semaphore(LocalOpenLibraryHandler.batch_concurrency)
+
+    async def run_call(call):
+        method = call.get('method')
+        arguments = call.get('arguments')
+
+        if method is None or arguments is None:
+            return {"error": "Each call needs a method and arguments"}
+
+        # Only the single-call methods can be batched
+        if method not in ("search_by_title", "fetch_image_from_olid", "has_cover"):
+            return {"error": f"We did not recognize the method {method}"}
+
+        async with semaphore:
+            try:
+                return {"result": await async_handler(method, arguments)}
+            except Exception as e:
+                return {"error": str(e) or type(e).__name__}
+
+    return {"results": await asyncio.gather(*(run_call(call) for call in calls))}
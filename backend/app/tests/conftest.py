@@ -1,20 +1,37 @@
 import os
 import pytest
 
+from contextlib import contextmanager
+from sqlalchemy import event
+
 from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.utils.book_cover import get_book_cover_handler
-from app.db.sqlite import get_db
-from sqlmodel.pool import StaticPool
+from app.utils.images.factory import get_image_handler
+from app.utils.images.deletion import ImageDeletionQueue, get_image_deletion_queue
+from app.utils.images.variants import get_cover_variant_renderer
+from app.db.sqlite import get_async_db, apply_sqlite_pragmas, SQLITE_PROFILES
+from app.db.query_plan import ALLOWED_FULL_SCANS, audit, record_statements
 from app.models.book import BookCreate, BookUpdate
 from app.models.openlibrary import Work, Works
+from app.services.open_library.base import BaseOpenLibraryHandler
 from app.services.open_library.factory import get_open_library  
 from app.models.exception import ExceptionHandler
 
-class OpenLibrary:
+class OpenLibrary(BaseOpenLibraryHandler):
+    def __init__(self):
+        # OLIDs of editions without a cover
+        self.coverless = set()
+
     async def fetch_image_from_olid(self, olid: str) -> bool:
         return True
+
+    async def has_cover(self, olid: str) -> bool:
+        return olid not in self.coverless
     
     async def search_by_title(self, title: str) -> Works:
 
@@ -31,10 +48,42 @@ class OpenLibrary:
         return Works(**{"works": [Work(**work_doc)]})
 
 
-async def book_cover_handler_mock(book_create_or_update: BookCreate | BookUpdate) -> None:
+async def book_cover_handler_mock(book_create_or_update: BookCreate | BookUpdate, upload=None, db=None) -> None:
     return None
 
 
+# Records deletions rather than touching storage
+class DeletedImages:
+    def __init__(self):
+        self.keys = []
+
+    def delete_images(self, keys):
+        self.keys.extend(keys)
+        return []
+
+
+# Stands in for storage when checking whether a cover is already stored
+class StoredImages:
+    def __init__(self):
+        self.keys = set()
+
+    def has_image(self, key):
+        return key in self.keys
+
+
+# Records which covers had variants rendered rather than reading and resizing them
+class CoverVariants:
+    def __init__(self):
+        self.rendered = []
+
+    async def create(self, stem, extension):
+        self.rendered.append(stem + extension)
+        return ["thumbnail"]
+
+    async def create_many(self, images):
+        return [await self.create(stem, extension) for stem, extension in images]
+
+
 # Using S3 in mocks. Fewer bits to mock
 os.environ["STORAGE_BACKEND"] = "s3"
 os.environ["LOCAL_IMAGE_DIRECTORY"] = "../../../images"
@@ -44,14 +93,79 @@ os.environ["API_IMAGE_MOUNT_PATH"] = "images"
 # We need to set environment variables prior to this line to be picked up in main.py
 from main import app # noqa
 
+# Tests seed data through a sync session while the app reads and writes through
+# an async one, so both engines share a temporary database file
+@pytest.fixture(name="database_url", scope="function")
+def database_url_fixture(tmp_path):
+    yield f"sqlite:///{tmp_path / 'alexandria.db'}"
+
+
 @pytest.fixture(name="session", scope="function")
-def session_fixture():
-    engine = create_engine(
-        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
-    )
+def session_fixture(database_url: str):
+    engine = create_engine(database_url, connect_args={"check_same_thread": False})
+    apply_sqlite_pragmas(engine, SQLITE_PROFILES["production"]["pragmas"])
     SQLModel.metadata.create_all(engine)
-    with Session(engine) as session:
+    # Seeded objects keep their values after commit, so tests can compare against them
+    with Session(engine, expire_on_commit=False) as session:
         yield session
+    engine.dispose()
+
+
+@pytest.fixture(name="async_engine", scope="function")
+def async_engine_fixture(database_url: str, session: Session):
+    # TestClient may run each request on a fresh event loop, so connections are never pooled
+    engine = create_async_engine(
+        database_url.replace("sqlite://", "sqlite+aiosqlite://", 1), poolclass=NullPool
+    )
+    apply_sqlite_pragmas(engine.sync_engine, SQLITE_PROFILES["production"]["pragmas"])
+    yield engine
+
+
+@pytest.fixture(name="assert_max_queries", scope="function")
+def assert_max_queries_fixture(async_engine):
+    """Assert that the wrapped block issues at most `budget` SQL statements through the app's engine."""
+    @contextmanager
+    def assert_max_queries(budget: int):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            # PRAGMAs are issued by the connect event on every fresh connection
+            if not statement.startswith("PRAGMA"):
+                statements.append(statement)
+
+        engine = async_engine.sync_engine
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+        assert len(statements) <= budget, (
+            f"Expected at most {budget} queries, got {len(statements)}:\n" + "\n".join(statements)
+        )
+
+    yield assert_max_queries
+
+
+@pytest.fixture(name="query_plan_audit", scope="function")
+def query_plan_audit_fixture(request, async_engine, session: Session):
+    """Fail the test if any statement the app ran reads a whole table without an index.
+
+    Plans are taken once the test is done, against the same database, so they see its final schema.
+    Known exceptions are marked on the test with `@pytest.mark.allow_full_scans("table", ...)`.
+    """
+    allowed = set(ALLOWED_FULL_SCANS)
+    marker = request.node.get_closest_marker("allow_full_scans")
+    if marker is not None:
+        allowed.update(marker.args)
+
+    with record_statements(async_engine.sync_engine) as statements:
+        yield statements
+
+    with session.get_bind().connect() as connection:
+        scans = audit(connection, statements, allowed)
+
+    assert not scans, "\n\n".join(str(scan) for scan in scans)
 
 
 @pytest.fixture(name="open_library", scope="function")
@@ -64,14 +178,34 @@ def book_cover_handler_fixture():
     yield book_cover_handler_mock
 
 
+@pytest.fixture(name="deleted_images", scope="function")
+def deleted_images_fixture():
+    yield DeletedImages()
+
+
+@pytest.fixture(name="cover_variants", scope="function")
+def cover_variants_fixture():
+    yield CoverVariants()
+
+
+@pytest.fixture(name="stored_images", scope="function")
+def stored_images_fixture():
+    yield StoredImages()
+
+
 @pytest.fixture(name="client", scope="function")  
 def client_fixture(
-    session: Session,
+    async_engine,
     book_cover_handler: book_cover_handler_mock,
-    open_library: OpenLibrary
+    open_library: OpenLibrary,
+    deleted_images: DeletedImages,
+    cover_variants: CoverVariants,
+    stored_images: StoredImages,
+    query_plan_audit,
 ):  
-    def get_session_override():  
-        return session
+    async def get_async_session_override():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
     
     def get_book_cover_handler_override():
         return book_cover_handler
@@ -79,9 +213,13 @@ def client_fixture(
     def get_open_library_override():
         return open_library
 
-    app.dependency_overrides[get_db] = get_session_override  
+    app.dependency_overrides[get_async_db] = get_async_session_override
     app.dependency_overrides[get_book_cover_handler] = get_book_cover_handler_override
     app.dependency_overrides[get_open_library] = get_open_library_override
+    image_deletion_queue = ImageDeletionQueue(deleted_images, async_engine)
+    app.dependency_overrides[get_image_deletion_queue] = lambda: image_deletion_queue
+    app.dependency_overrides[get_cover_variant_renderer] = lambda: cover_variants
+    app.dependency_overrides[get_image_handler] = lambda: stored_images
 
     client = TestClient(app)  
     yield client  
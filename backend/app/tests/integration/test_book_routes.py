@@ -1,11 +1,25 @@
 from io import BytesIO
+import hashlib
 import pytest
 import random
 from unittest.mock import patch
 from fastapi.testclient import TestClient
-from sqlmodel import Session
+from sqlmodel import Session, select, text
 from app.models.book import Book, ReadStatus
+from app.models.book_bookshelf import BookBookshelfLink
+from app.models.bookshelf import Bookshelf, SortDirection, SortKey
 from app.models.image import Image, ImageSource
+from app.services.open_library.base import BaseOpenLibraryHandler
+from app.services.open_library.cache import CachedOpenLibraryHandler
+from app.services.open_library.factory import get_open_library
+from app.utils import book_cover
+from app.utils.book_cover import get_book_cover_handler
+from app.utils.images.variants import variant_key, variant_keys
+
+
+def content_hash_of(content: str) -> str:
+    return hashlib.sha256(content.encode()).hexdigest()
+
 
 @pytest.fixture(scope="function")
 def create_book():
@@ -44,13 +58,14 @@ def seed_image(session: Session, create_image):
 def test_get_books_empty(client: TestClient):
     response = client.get("/books")
     assert response.status_code == 200
-    assert response.json() == []
+    assert response.json() == {"books": [], "next_cursor": None}
 
 
 def test_get_books_populated(client: TestClient, seed_book, seed_image, create_book, create_image):
     with patch("app.models.image.image_handler") as mock_image_handler:
         mock_s3_uri = "https://mock-s3-bucket.s3.amazonaws.com/abcde.jpg"
         mock_image_handler.get_image_uri.return_value = mock_s3_uri
+        mock_image_handler.get_image_uris.side_effect = lambda keys: {key: mock_s3_uri for key in keys}
         response = client.get("/books")
         assert response.status_code == 200
         image = {
@@ -58,15 +73,84 @@ def test_get_books_populated(client: TestClient, seed_book, seed_image, create_b
             "source": ImageSource.open_library,
             "source_id": "abcde",
             "extension": ".jpg",
-            "uri": mock_s3_uri
+            "uri": mock_s3_uri,
+            "variant_uris": {},
         }
-        assert response.json() == [create_book.model_dump() | {"image": image}]
+        assert response.json() == {
+            "books": [create_book.model_dump() | {"image": image}],
+            "next_cursor": None
+        }
+
+
+@pytest.fixture(scope="function")
+def seed_books(session: Session):
+    books = [
+        Book(title="Emma", author="Jane Austen", year=1815, rating=4, read_status=ReadStatus.read),
+        Book(title="Persuasion", author="Jane Austen", year=1817, rating=None, read_status=ReadStatus.not_read),
+        Book(title="Dracula", author="Bram Stoker", year=1897, rating=5, read_status=ReadStatus.read),
+        Book(title="Ulysses", author="James Joyce", year=1922, rating=None, read_status=ReadStatus.reading),
+        Book(title="Beloved", author="Toni Morrison", year=1987, rating=4, read_status=ReadStatus.read),
+    ]
+    session.add_all(books)
+    session.commit()
+    yield books
+
+
+def fetch_all_pages(client: TestClient, params: dict) -> list[str]:
+    titles = []
+    cursor = None
+    while True:
+        response = client.get("/books", params=params | ({"cursor": cursor} if cursor else {}))
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page["books"]) <= params["limit"]
+        titles.extend(book["title"] for book in page["books"])
+        if (cursor := page["next_cursor"]) is None:
+            return titles
+
+
+@pytest.mark.parametrize("sort_key,sort_direction,expected", [
+    ("id", "ascending", ["Emma", "Persuasion", "Dracula", "Ulysses", "Beloved"]),
+    ("title", "descending", ["Ulysses", "Persuasion", "Emma", "Dracula", "Beloved"]),
+    ("year", "ascending", ["Emma", "Persuasion", "Dracula", "Ulysses", "Beloved"]),
+    # NULL ratings sort first ascending and last descending, ties broken by id
+    ("rating", "ascending", ["Persuasion", "Ulysses", "Emma", "Beloved", "Dracula"]),
+    ("rating", "descending", ["Dracula", "Beloved", "Emma", "Ulysses", "Persuasion"]),
+])
+def test_get_books_paginated(client: TestClient, seed_books, sort_key, sort_direction, expected):
+    for limit in (1, 2, 5):
+        params = {"sort_key": sort_key, "sort_direction": sort_direction, "limit": limit}
+        assert fetch_all_pages(client, params) == expected
+
+
+# Substring matches on author cannot use an index, so pages scan books in ID order until they fill
+@pytest.mark.allow_full_scans("book")
+def test_get_books_filtered(client: TestClient, seed_books):
+    params = {"author": "austen", "limit": 1}
+    assert fetch_all_pages(client, params) == ["Emma", "Persuasion"]
+
+    params = {"read_status": "read", "rating": 4, "limit": 10}
+    assert fetch_all_pages(client, params) == ["Emma", "Beloved"]
+
+    params = {"year": 1897, "limit": 10}
+    assert fetch_all_pages(client, params) == ["Dracula"]
+
+
+def test_get_books_invalid_cursor(client: TestClient, seed_books):
+    response = client.get("/books", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+    # Cursors cannot be reused across sort keys
+    next_cursor = client.get("/books", params={"limit": 1}).json()["next_cursor"]
+    response = client.get("/books", params={"cursor": next_cursor, "sort_key": "title"})
+    assert response.status_code == 400
 
 
 def test_get_book_exists(client: TestClient, seed_book, seed_image, create_book, create_image):
     with patch("app.models.image.image_handler") as mock_image_handler:
         mock_s3_uri = "https://mock-s3-bucket.s3.amazonaws.com/abcde.jpg"
         mock_image_handler.get_image_uri.return_value = mock_s3_uri
+        mock_image_handler.get_image_uris.side_effect = lambda keys: {key: mock_s3_uri for key in keys}
         response = client.get(f"/books/{create_book.id}")
         assert response.status_code == 200
         image = {
@@ -74,7 +158,8 @@ def test_get_book_exists(client: TestClient, seed_book, seed_image, create_book,
             "source": ImageSource.open_library,
             "source_id": "abcde",
             "extension": ".jpg",
-            "uri": mock_s3_uri
+            "uri": mock_s3_uri,
+            "variant_uris": {},
         }
         assert response.json() == create_book.model_dump() | {"bookshelves": []} | {"image": image}
 
@@ -97,6 +182,57 @@ def test_create_book_correct_olid(client: TestClient):
     assert response.json() is None
 
 
+class CountingOpenLibrary:
+    def __init__(self):
+        self.fetched = []
+
+    async def has_covers(self, olids):
+        return [True] * len(olids)
+
+    async def fetch_image_from_olid(self, olid):
+        self.fetched.append(olid)
+        return content_hash_of(olid) + ".jpg"
+
+
+def test_create_book_reuses_stored_cover(client: TestClient, session: Session, seed_book, create_book, cover_variants, stored_images, monkeypatch):
+    open_library = CountingOpenLibrary()
+    monkeypatch.setattr(book_cover, "open_library", open_library)
+    monkeypatch.setattr(book_cover, "image_handler", stored_images)
+    monkeypatch.setattr(book_cover, "get_cover_variant_renderer", lambda: cover_variants)
+    client.app.dependency_overrides[get_book_cover_handler] = lambda: book_cover.book_cover_handler
+    session.add(Image(book_id=create_book.id, source=ImageSource.open_library, source_id="OL1M", content_hash=content_hash_of("OL1M"), extension=".jpg", variants=["medium"]))
+    session.commit()
+    stored_images.keys.add(content_hash_of("OL1M") + ".jpg")
+
+    body = {"title": "Book Title", "author": "Book Author", "year": 2000, "read_status": "read", "olid": "OL1M"}
+    assert client.post("/books", json=body).status_code == 201
+
+    # Neither downloaded nor resized again
+    assert open_library.fetched == []
+    assert cover_variants.rendered == []
+    images = session.exec(select(Image).where(Image.source_id == "OL1M")).all()
+    assert [(image.content_hash, image.variants) for image in images] == [(content_hash_of("OL1M"), ["medium"])] * 2
+
+    # Once the stored cover is gone, it is fetched again
+    stored_images.keys.clear()
+    assert client.post("/books", json=body).status_code == 201
+    assert open_library.fetched == ["OL1M"]
+
+
+def test_get_book_covers_lists_editions_with_a_cover(client: TestClient, session: Session, open_library):
+    session.add(Book(id=1, title="Emma", author="Jane Austen", year=1815, read_status=ReadStatus.read, olids='["OL1M", "OL2M", "OL3M"]'))
+    session.add(Book(id=2, title="Persuasion", author="Jane Austen", year=1817, read_status=ReadStatus.read))
+    session.commit()
+    open_library.coverless = {"OL1M"}
+
+    response = client.get("/books/1/covers")
+    assert response.status_code == 200
+    assert response.json() == {"olids": ["OL2M", "OL3M"]}
+
+    assert client.get("/books/2/covers").json() == {"olids": []}
+    assert client.get("/books/3/covers").status_code == 404
+
+
 def test_create_book_correct_upload_image_file(client: TestClient):
     form_data = {
         "title": "Book Title",
@@ -170,6 +306,7 @@ def test_patch_book_exists(client: TestClient, seed_book, seed_image, create_boo
     with patch("app.models.image.image_handler") as mock_image_handler:
         mock_s3_uri = "https://mock-s3-bucket.s3.amazonaws.com/abcde.jpg"
         mock_image_handler.get_image_uri.return_value = mock_s3_uri
+        mock_image_handler.get_image_uris.side_effect = lambda keys: {key: mock_s3_uri for key in keys}
         body = {"title": "The Worst American Novel", "year": 2024}
         response = client.patch(f"/books/{create_book.id}", json=body)
         assert response.status_code == 204
@@ -181,7 +318,8 @@ def test_patch_book_exists(client: TestClient, seed_book, seed_image, create_boo
             "source": ImageSource.open_library,
             "source_id": "abcde",
             "extension": ".jpg",
-            "uri": mock_s3_uri
+            "uri": mock_s3_uri,
+            "variant_uris": {},
         }
         assert response.json() == create_book.model_dump() | body | {"bookshelves": []} | {"image": image}
 
@@ -196,6 +334,7 @@ def test_patch_book_with_image_file(client: TestClient, seed_book, seed_image, c
     with patch("app.models.image.image_handler") as mock_image_handler:
         mock_s3_uri = "https://mock-s3-bucket.s3.amazonaws.com/abcde.jpg"
         mock_image_handler.get_image_uri.return_value = mock_s3_uri
+        mock_image_handler.get_image_uris.side_effect = lambda keys: {key: mock_s3_uri for key in keys}
 
         # Simulate an image file upload
         image_file = ("cover.jpg", BytesIO(b"fake image content"), "image/jpeg")
@@ -238,4 +377,436 @@ def test_search_book_by_title_not_exists(client: TestClient):
     expected = {"detail": "No results found. Please try a different search."}
     response = client.get(f"/books/search/{title}")
     assert response.status_code == 404
-    assert response.json() == expected
\ No newline at end of file
+    assert response.json() == expected
+
+
+def test_search_cache_stats(client: TestClient, open_library):
+    cached = CachedOpenLibraryHandler(open_library)
+    client.app.dependency_overrides[get_open_library] = lambda: cached
+
+    client.get("/books/search/The+Grapes+Of+Wrath")
+    client.get("/books/search/The+Grapes+Of+Wrath")
+    client.get("/books/search/Nonexistent+Book+Title")
+    client.get("/books/search/Nonexistent+Book+Title")
+
+    response = client.get("/books/search/cache/stats")
+    assert response.status_code == 200
+    stats = response.json()
+    assert stats["hits"] == 1
+    assert stats["negative_hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["size"] == 2
+
+
+def test_search_cache_stats_when_disabled(client: TestClient):
+    response = client.get("/books/search/cache/stats")
+    assert response.status_code == 404
+
+@pytest.fixture(scope="function")
+def seed_books_with_images(session: Session):
+    books = [
+        Book(title=f"Book {i}", author="Author", year=2000 + i, read_status=ReadStatus.read)
+        for i in range(10)
+    ]
+    session.add_all(books)
+    session.commit()
+    session.add_all([
+        Image(book_id=book.id, source=ImageSource.open_library, source_id=f"OL{book.id}M", extension=".jpg")
+        for book in books
+    ])
+    session.commit()
+    yield books
+
+
+def test_get_books_query_budget(client: TestClient, seed_books_with_images, assert_max_queries):
+    with patch("app.models.image.image_handler") as mock_image_handler:
+        mock_image_handler.get_image_uri.return_value = "https://mock-s3-bucket.s3.amazonaws.com/abcde.jpg"
+        mock_image_handler.get_image_uris.side_effect = lambda keys: {key: "https://mock-s3-bucket.s3.amazonaws.com/abcde.jpg" for key in keys}
+        # One query for the page of books and one for all of their images
+        with assert_max_queries(2):
+            response = client.get("/books", params={"limit": 10})
+        assert response.status_code == 200
+        assert len(response.json()["books"]) == 10
+
+
+def test_get_book_query_budget(client: TestClient, seed_books_with_images, assert_max_queries):
+    book_id = seed_books_with_images[0].id
+    with patch("app.models.image.image_handler") as mock_image_handler:
+        mock_image_handler.get_image_uri.return_value = "https://mock-s3-bucket.s3.amazonaws.com/abcde.jpg"
+        mock_image_handler.get_image_uris.side_effect = lambda keys: {key: "https://mock-s3-bucket.s3.amazonaws.com/abcde.jpg" for key in keys}
+        with assert_max_queries(3):
+            response = client.get(f"/books/{book_id}")
+        assert response.status_code == 200
+
+
+def test_create_book_upload_is_not_reencoded(client: TestClient):
+    received = {}
+
+    async def capturing_book_cover_handler(book_create_or_update, upload=None, db=None):
+        received["file"] = book_create_or_update.file
+        received["upload"] = await upload.read()
+        return None
+
+    client.app.dependency_overrides[get_book_cover_handler] = lambda: capturing_book_cover_handler
+    form_data = {
+        "title": "Book Title",
+        "author": "Book Author",
+        "year": 2000,
+        "read_status": random.choice([e.value for e in ReadStatus])
+    }
+    image_file = ("cover.jpg", BytesIO(b"fake image content"), "image/jpeg")
+
+    response = client.post("/books", files={"file": image_file}, data=form_data)
+
+    assert response.status_code == 201
+    # The file arrives untouched as an upload rather than base64 inside the JSON body
+    assert received == {"file": None, "upload": b"fake image content"}
+
+
+@pytest.fixture(scope="function")
+def seed_searchable_books(session: Session):
+    books = [
+        Book(title="Pride and Prejudice", author="Jane Austen", year=1813, read_status=ReadStatus.read,
+             review="A sharp comedy of manners"),
+        Book(title="Persuasion", author="Jane Austen", year=1817, read_status=ReadStatus.read),
+        Book(title="Dracula", author="Bram Stoker", year=1897, read_status=ReadStatus.read,
+             review="Better than Pride and Prejudice, though not by much"),
+        Book(title="Ulysses", author="James Joyce", year=1922, read_status=ReadStatus.not_read),
+    ]
+    session.add_all(books)
+    session.commit()
+    yield books
+
+
+def test_search_local_ranks_and_highlights(client: TestClient, seed_searchable_books):
+    response = client.get("/books/search/local", params={"q": "prejudice"})
+    assert response.status_code == 200
+    page = response.json()
+    # A match in the title outranks a match in the review
+    assert [book["title"] for book in page["books"]] == ["Pride and Prejudice", "Dracula"]
+    assert page["books"][0]["title_highlight"] == "Pride and <mark>Prejudice</mark>"
+    assert page["books"][0]["review_snippet"] is None
+    assert "<mark>Prejudice</mark>" in page["books"][1]["review_snippet"]
+    assert page["next_cursor"] is None
+
+
+def test_search_local_escapes_stored_markup(client: TestClient, session: Session):
+    session.add(Book(title="<b>Frankenstein</b>", author="Mary Shelley", year=1818, read_status=ReadStatus.read,
+                     review='Monstrous <img src=x onerror="alert(1)"> & grim'))
+    session.commit()
+
+    response = client.get("/books/search/local", params={"q": "frankenstein monstrous"})
+    book = response.json()["books"][0]
+    assert book["title_highlight"] == "&lt;b&gt;<mark>Frankenstein</mark>&lt;/b&gt;"
+    assert book["review_snippet"] == "<mark>Monstrous</mark> &lt;img src=x onerror=&quot;alert(1)&quot;&gt; &amp; grim"
+    assert book["author_highlight"] == "Mary Shelley"
+
+
+def test_search_local_prefix_and_all_words(client: TestClient, seed_searchable_books):
+    response = client.get("/books/search/local", params={"q": "jane pers"})
+    assert [book["title"] for book in response.json()["books"]] == ["Persuasion"]
+    assert response.json()["books"][0]["author_highlight"] == "<mark>Jane</mark> Austen"
+
+
+def test_search_local_ignores_query_syntax(client: TestClient, seed_searchable_books):
+    response = client.get("/books/search/local", params={"q": 'austen"*) ^'})
+    assert response.status_code == 200
+    assert len(response.json()["books"]) == 2
+
+    response = client.get("/books/search/local", params={"q": "!!!"})
+    assert response.status_code == 422
+
+
+def test_search_local_paginates(client: TestClient, seed_searchable_books):
+    first = client.get("/books/search/local", params={"q": "austen", "limit": 1}).json()
+    assert len(first["books"]) == 1
+    second = client.get("/books/search/local", params={"q": "austen", "limit": 1, "cursor": first["next_cursor"]}).json()
+    assert len(second["books"]) == 1
+    assert second["next_cursor"] is None
+    assert {first["books"][0]["title"], second["books"][0]["title"]} == {"Pride and Prejudice", "Persuasion"}
+
+
+def test_search_local_follows_updates_and_deletes(client: TestClient, seed_searchable_books):
+    dracula_id = seed_searchable_books[2].id
+    response = client.patch(f"/books/{dracula_id}", json={"title": "Nosferatu"})
+    assert response.status_code == 204
+    assert [book["title"] for book in client.get("/books/search/local", params={"q": "nosferatu"}).json()["books"]] == ["Nosferatu"]
+    assert client.get("/books/search/local", params={"q": "dracula"}).json()["books"] == []
+
+    response = client.delete(f"/books/{dracula_id}")
+    assert response.status_code == 204
+    assert client.get("/books/search/local", params={"q": "nosferatu"}).json()["books"] == []
+
+
+class BulkOpenLibrary(BaseOpenLibraryHandler):
+    def __init__(self):
+        self.fetched = []
+
+    async def search_by_title(self, title):
+        return None
+
+    async def fetch_image_from_olid(self, olid):
+        self.fetched.append(olid)
+        if olid == "OLMISSINGM":
+            raise ValueError("503 Service Unavailable")
+        if olid == "OLCOVERLESSM":
+            return None
+        return content_hash_of(olid) + ".jpg"
+
+    async def has_cover(self, olid):
+        return True
+
+
+@pytest.fixture(scope="function")
+def bulk_open_library(client: TestClient):
+    open_library = BulkOpenLibrary()
+    client.app.dependency_overrides[get_open_library] = lambda: open_library
+    yield open_library
+
+
+def test_bulk_create_books_json(client: TestClient, session: Session, bulk_open_library, cover_variants):
+    rows = [
+        {"title": "Emma", "author": "Jane Austen", "year": 1815, "read_status": "read", "olid": "OL1M"},
+        {"title": "Untitled", "read_status": "read"},
+        {"title": "Persuasion", "author": "Jane Austen", "year": 1817, "read_status": "not_read", "olid": "OLMISSINGM"},
+        {"title": "Sanditon", "author": "Jane Austen", "year": 1817, "read_status": "not_read"},
+        "not a book",
+        {"title": "Emma (again)", "author": "Jane Austen", "year": 1815, "read_status": "read", "olid": "OL1M"},
+    ]
+
+    response = client.post("/books/bulk", json=rows)
+    assert response.status_code == 200
+    report = response.json()
+
+    assert report["created"] == 4
+    assert report["failed"] == 2
+    assert [result["status"] for result in report["results"]] == [
+        "created", "invalid", "created_without_cover", "created", "invalid", "created"
+    ]
+    assert "author" in report["results"][1]["error"]
+    # Each distinct cover is fetched once
+    assert sorted(bulk_open_library.fetched) == ["OL1M", "OLMISSINGM"]
+
+    books = {book.id: book for book in session.exec(select(Book)).all()}
+    assert [books[result["book_id"]].title for result in report["results"] if result["book_id"]] == [
+        "Emma", "Persuasion", "Sanditon", "Emma (again)"
+    ]
+    images = session.exec(select(Image)).all()
+    assert sorted((books[image.book_id].title, image.source_id) for image in images) == [
+        ("Emma", "OL1M"), ("Emma (again)", "OL1M")
+    ]
+    assert {image.content_hash for image in images} == {content_hash_of("OL1M")}
+    # Variants are rendered once per stored cover
+    assert cover_variants.rendered == [content_hash_of("OL1M") + ".jpg"]
+    assert [image.variants for image in images] == [["thumbnail"], ["thumbnail"]]
+
+
+def test_bulk_create_books_without_a_cover(client: TestClient, session: Session, bulk_open_library):
+    rows = [{"title": "Sanditon", "author": "Jane Austen", "year": 1817, "read_status": "read", "olid": "OLCOVERLESSM"}]
+
+    result = client.post("/books/bulk", json=rows).json()["results"][0]
+
+    assert result["status"] == "created_without_cover"
+    assert result["error"] == "Open Library has no cover image for this edition"
+    assert session.exec(select(Image)).all() == []
+
+
+def test_bulk_create_books_reuses_stored_covers(client: TestClient, session: Session, bulk_open_library, cover_variants, stored_images):
+    # A cover another book already stored, and one whose blob has since gone missing
+    session.add_all([Book(id=id, title="Stored", author="Author", year=2000, read_status=ReadStatus.read) for id in (1, 2)])
+    session.commit()
+    session.add_all([
+        Image(book_id=1, source=ImageSource.open_library, source_id="OL1M", content_hash=content_hash_of("OL1M"), extension=".jpg", variants=["medium"]),
+        Image(book_id=2, source=ImageSource.open_library, source_id="OL2M", content_hash=content_hash_of("OL2M"), extension=".jpg"),
+    ])
+    session.commit()
+    stored_images.keys.add(content_hash_of("OL1M") + ".jpg")
+
+    rows = [
+        {"title": f"Book {olid}", "author": "Author", "year": 2000, "read_status": "read", "olid": olid}
+        for olid in ("OL1M", "OL2M", "OL3M")
+    ]
+    response = client.post("/books/bulk", json=rows)
+    assert response.json()["created"] == 3
+
+    assert sorted(bulk_open_library.fetched) == ["OL2M", "OL3M"]
+    assert sorted(cover_variants.rendered) == sorted([content_hash_of("OL2M") + ".jpg", content_hash_of("OL3M") + ".jpg"])
+    reused = session.exec(select(Image).where(Image.source_id == "OL1M", Image.book_id != 1)).one()
+    assert (reused.content_hash, reused.variants) == (content_hash_of("OL1M"), ["medium"])
+
+
+def test_bulk_create_books_ndjson(client: TestClient, bulk_open_library):
+    body = "\n".join([
+        '{"title": "Emma", "author": "Jane Austen", "year": 1815, "read_status": "read"}',
+        "",
+        "{not json",
+        '{"title": "Persuasion", "author": "Jane Austen", "year": 1817, "read_status": "read"}',
+    ])
+
+    response = client.post("/books/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert [result["status"] for result in response.json()["results"]] == ["created", "invalid", "created"]
+
+
+def test_bulk_create_books_csv(client: TestClient, session: Session, bulk_open_library):
+    body = (
+        "title,author,year,read_status,rating,olid\r\n"
+        '"Pride and Prejudice, Annotated",Jane Austen,1813,read,5,OL2M\r\n'
+        "Emma,Jane Austen,1815,reading,,\r\n"
+        "Bad,Jane Austen,not a year,read,,\r\n"
+    )
+
+    response = client.post("/books/bulk", content=body, headers={"Content-Type": "text/csv"})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["status"] for result in results] == ["created", "created", "invalid"]
+
+    first = session.get(Book, results[0]["book_id"])
+    assert first.title == "Pride and Prejudice, Annotated"
+    assert first.rating == 5
+    assert session.get(Book, results[1]["book_id"]).rating is None
+
+
+def test_bulk_create_books_csv_quoted_newlines(client: TestClient, session: Session, bulk_open_library):
+    body = (
+        "title,author,year,read_status,review\r\n"
+        '"Emma","Jane Austen",1815,read,"Handsome, clever\r\nand ""rich"""\r\n'
+        "Persuasion,Jane Austen,1817,read,\r\n"
+    )
+
+    response = client.post("/books/bulk", content=body, headers={"Content-Type": "text/csv"})
+    results = response.json()["results"]
+    assert [result["status"] for result in results] == ["created", "created"]
+    assert session.get(Book, results[0]["book_id"]).review == 'Handsome, clever\r\nand "rich"'
+
+
+def test_bulk_create_books_rejects_invalid_utf8(client: TestClient):
+    for content_type in ("application/x-ndjson", "text/csv"):
+        response = client.post("/books/bulk", content=b'{"title":"\xff"}', headers={"Content-Type": content_type})
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Line 1 is not valid UTF-8"
+
+
+def test_bulk_create_books_deletes_covers_of_chunks_that_fail(client: TestClient, session: Session, bulk_open_library, deleted_images, monkeypatch):
+    monkeypatch.setattr("app.routers.books.BULK_IMPORT_CHUNK_SIZE", 1)
+    session.exec(text(
+        "CREATE TRIGGER reject_book BEFORE INSERT ON book WHEN NEW.title = 'Rejected' BEGIN SELECT RAISE(ABORT, 'rejected'); END"
+    ))
+    session.commit()
+    rows = [
+        {"title": title, "author": "Author", "year": 2000, "read_status": "read", "olid": olid}
+        for title, olid in (("Emma", "OL1M"), ("Rejected", "OL1M"), ("Rejected", "OL2M"))
+    ]
+
+    response = client.post("/books/bulk", json=rows)
+    assert [result["status"] for result in response.json()["results"]] == ["created", "failed", "failed"]
+
+    # The cover another chunk stored a book with is kept
+    assert sorted(deleted_images.keys) == sorted([content_hash_of("OL2M") + ".jpg", variant_key(content_hash_of("OL2M"), "thumbnail")])
+
+
+def test_bulk_create_books_query_budget(client: TestClient, bulk_open_library, assert_max_queries, monkeypatch):
+    monkeypatch.setattr("app.routers.books.BULK_IMPORT_CHUNK_SIZE", 50)
+    rows = [
+        {"title": f"Book {i}", "author": "Author", "year": 2000, "read_status": "read", "olid": f"OL{i}M"}
+        for i in range(100)
+    ]
+
+    # One lookup of covers already stored, then per chunk of 50: one insert of books and one of images
+    with assert_max_queries(5):
+        response = client.post("/books/bulk", json=rows)
+    assert response.json()["created"] == 100
+
+
+def test_bulk_create_books_rejects_unknown_content_type(client: TestClient):
+    response = client.post("/books/bulk", content="<books/>", headers={"Content-Type": "application/xml"})
+    assert response.status_code == 415
+
+
+def test_bulk_create_books_rejects_too_many_rows(client: TestClient, monkeypatch):
+    monkeypatch.setattr("app.utils.bulk_import.MAX_BULK_IMPORT_ROWS", 2)
+    rows = [{"title": "Emma", "author": "Jane Austen", "year": 1815, "read_status": "read"}] * 3
+
+    assert client.post("/books/bulk", json=rows).status_code == 413
+
+
+def test_bulk_delete_books_cleans_up_orphaned_images(client: TestClient, session: Session, seed_books_with_images, deleted_images, assert_max_queries):
+    books = seed_books_with_images
+    bookshelf = Bookshelf(title="Shelf", description="Description", sort_key=SortKey.id, sort_direction=SortDirection.ascending)
+    session.add(bookshelf)
+    session.commit()
+    session.add_all([BookBookshelfLink(book_id=book.id, bookshelf_id=bookshelf.id) for book in books])
+    # A book being kept shares its cover with one being deleted
+    session.add(Book(id=100, title="Shared", author="Author", year=2000, read_status=ReadStatus.read))
+    session.commit()
+    session.add(Image(book_id=100, source=ImageSource.open_library, source_id=f"OL{books[0].id}M", extension=".jpg"))
+    session.commit()
+
+    # Links, images and books are each one statement, plus the check for images still in use,
+    # and the background flush checking them again before deleting from storage
+    with assert_max_queries(5):
+        response = client.request("DELETE", "/books/bulk", json={"book_ids": [book.id for book in books[:3]]})
+    assert response.status_code == 204
+
+    assert sorted(deleted_images.keys) == sorted(
+        [f"OL{books[1].id}M.jpg", f"OL{books[2].id}M.jpg"] + variant_keys(f"OL{books[1].id}M") + variant_keys(f"OL{books[2].id}M")
+    )
+    session.expire_all()
+    assert len(session.exec(select(Book)).all()) == 8
+    assert len(session.exec(select(Image)).all()) == 8
+    assert len(session.exec(select(BookBookshelfLink)).all()) == 7
+
+
+def test_bulk_delete_books_not_exists(client: TestClient, deleted_images):
+    response = client.request("DELETE", "/books/bulk", json={"book_ids": [12345]})
+    assert response.status_code == 404
+    assert deleted_images.keys == []
+
+
+def test_delete_book_cleans_up_image(client: TestClient, seed_book, seed_image, create_book, deleted_images):
+    response = client.delete(f"/books/{create_book.id}")
+    assert response.status_code == 204
+    assert sorted(deleted_images.keys) == sorted(["abcde.jpg"] + variant_keys("abcde"))
+
+
+def test_patch_book_cleans_up_replaced_image(client: TestClient, session: Session, seed_book, seed_image, create_book, deleted_images):
+    async def new_cover_handler(book_create_or_update, upload=None, db=None):
+        return Image(source=ImageSource.open_library, source_id="fghij", extension=".jpg")
+
+    client.app.dependency_overrides[get_book_cover_handler] = lambda: new_cover_handler
+
+    response = client.patch(f"/books/{create_book.id}", json={"olid": "fghij"})
+    assert response.status_code == 204
+
+    assert sorted(deleted_images.keys) == sorted(["abcde.jpg"] + variant_keys("abcde"))
+    session.expire_all()
+    assert [image.source_id for image in session.exec(select(Image)).all()] == ["fghij"]
+
+
+def test_delete_book_keeps_cover_shared_by_content(client: TestClient, session: Session, deleted_images):
+    # Two uploads of the same file share one stored blob, despite their different source IDs
+    shared = content_hash_of("cover")
+    session.add_all([Book(id=id, title="Shared", author="Author", year=2000, read_status=ReadStatus.read) for id in (1, 2)])
+    session.commit()
+    session.add_all([
+        Image(book_id=id, source=ImageSource.direct_upload, source_id=source_id, content_hash=shared, extension=".png")
+        for id, source_id in ((1, "abcde"), (2, "fghij"))
+    ])
+    session.commit()
+
+    assert client.delete("/books/1").status_code == 204
+    assert deleted_images.keys == []
+
+    assert client.delete("/books/2").status_code == 204
+    assert sorted(deleted_images.keys) == sorted([shared + ".png"] + variant_keys(shared))
+
+
+def test_patch_book_keeps_image_reselected(client: TestClient, seed_book, seed_image, create_book, deleted_images):
+    async def same_cover_handler(book_create_or_update, upload=None, db=None):
+        return Image(source=ImageSource.open_library, source_id="abcde", extension=".jpg")
+
+    client.app.dependency_overrides[get_book_cover_handler] = lambda: same_cover_handler
+
+    response = client.patch(f"/books/{create_book.id}", json={"olid": "abcde"})
+    assert response.status_code == 204
+    assert deleted_images.keys == []
@@ -2,7 +2,7 @@ import pytest
 import random
 from unittest.mock import patch
 from fastapi.testclient import TestClient
-from sqlmodel import Session
+from sqlmodel import Session, select
 from app.models.bookshelf import Bookshelf, SortKey # noqa: F401
 from app.models.book import Book, ReadStatus # noqa: F401
 from app.models.book_bookshelf import BookBookshelfLink
@@ -81,7 +81,7 @@ def test_get_bookshelves_populated(client: TestClient, seed_bookshelf, create_bo
 def test_get_bookshelf_exists(client: TestClient, seed_bookshelf, create_bookshelf):
     response = client.get(f"/bookshelves/{create_bookshelf.id}")
     assert response.status_code == 200
-    assert response.json() == create_bookshelf.model_dump() | {"books": []}
+    assert response.json() == create_bookshelf.model_dump() | {"next_cursor": None, "books": []}
 
 
 def test_get_bookshelf_not_exists(client: TestClient):
@@ -104,7 +104,7 @@ def test_create_bookshelf_correct(client: TestClient):
     created_bookshelf_id = 1
     response = client.get(f"/bookshelves/{created_bookshelf_id}")
     assert response.status_code == 200
-    assert response.json() == body | {"id": created_bookshelf_id, "books": []}
+    assert response.json() == body | {"id": created_bookshelf_id, "books": [], "next_cursor": None}
 
 
 def test_create_bookshelf_incorrect(client: TestClient):
@@ -124,7 +124,7 @@ def test_patch_bookshelf_exists(client: TestClient, seed_bookshelf, create_books
 
     response = client.get(f"/bookshelves/{create_bookshelf.id}")
     assert response.status_code == 200
-    assert response.json() == create_bookshelf.model_dump() | body | {"books": []}
+    assert response.json() == create_bookshelf.model_dump() | body | {"next_cursor": None, "books": []}
 
 
 def test_patch_bookshelf_not_exists(client: TestClient, seed_bookshelf, create_bookshelf):
@@ -153,6 +153,7 @@ def test_add_book_to_bookshelf(client: TestClient, seed_bookshelf, seed_book, se
     with patch("app.models.image.image_handler") as mock_image_handler:
         mock_s3_uri = "https://mock-s3-bucket.s3.amazonaws.com/abcde.jpg"
         mock_image_handler.get_image_uri.return_value = mock_s3_uri
+        mock_image_handler.get_image_uris.side_effect = lambda keys: {key: mock_s3_uri for key in keys}
 
         body = {"book_ids": [create_book.id]}
         response = client.post(f"/bookshelves/{create_bookshelf.id}/books", json=body)
@@ -166,9 +167,10 @@ def test_add_book_to_bookshelf(client: TestClient, seed_bookshelf, seed_book, se
             "source": ImageSource.open_library,
             "source_id": "abcde",
             "extension": ".jpg",
-            "uri": mock_s3_uri
+            "uri": mock_s3_uri,
+            "variant_uris": {},
         }
-        assert response.json() == create_bookshelf.model_dump() | {"books": [create_book.model_dump() | {"image": image}]}
+        assert response.json() == create_bookshelf.model_dump() | {"next_cursor": None, "books": [create_book.model_dump() | {"image": image}]}
 
 
 def test_add_book_to_bookshelf_bookshelf_not_exists(client: TestClient, seed_bookshelf, seed_book, create_bookshelf, create_book):
@@ -189,7 +191,7 @@ def test_remove_book_from_bookshelf(client: TestClient, seed_bookshelf_book, cre
 
     response = client.get(f"/bookshelves/{create_bookshelf.id}")
     assert response.status_code == 200
-    assert response.json() == create_bookshelf.model_dump() | {"books": []}
+    assert response.json() == create_bookshelf.model_dump() | {"next_cursor": None, "books": []}
 
 
 def test_remove_book_from_bookshelf_bookshelf_not_exists(client: TestClient, seed_bookshelf, seed_book, create_bookshelf, create_book):
@@ -210,13 +212,17 @@ def test_delete_book_cascade(client: TestClient, seed_bookshelf_book, create_boo
     # Deletion should have cascaded to delete book from bookshelf
     response = client.get(f"/bookshelves/{create_bookshelf.id}")
     assert response.status_code == 200
-    assert response.json() == create_bookshelf.model_dump() | {"books": []}
+    assert response.json() == create_bookshelf.model_dump() | {"next_cursor": None, "books": []}
 
 
+# Books not on a shelf are found by scanning books in page order and skipping shelved ones,
+# which reads every book when most are shelved
+@pytest.mark.allow_full_scans("book")
 def test_get_books_not_on_bookshelf(client: TestClient, seed_bookshelf, seed_book, seed_image, create_book, create_bookshelf, create_image):
     with patch("app.models.image.image_handler") as mock_image_handler:
         mock_s3_uri = "https://mock-s3-bucket.s3.amazonaws.com/abcde.jpg"
         mock_image_handler.get_image_uri.return_value = mock_s3_uri
+        mock_image_handler.get_image_uris.side_effect = lambda keys: {key: mock_s3_uri for key in keys}
     
         response = client.get(f"/bookshelves/{create_bookshelf.id}/books/exclude/")
         assert response.status_code == 200
@@ -225,6 +231,254 @@ def test_get_books_not_on_bookshelf(client: TestClient, seed_bookshelf, seed_boo
             "source": ImageSource.open_library,
             "source_id": "abcde",
             "extension": ".jpg",
-            "uri": mock_s3_uri
+            "uri": mock_s3_uri,
+            "variant_uris": {},
         }
-        assert response.json() == [create_book.model_dump() | {"image": image}]
+        assert response.json() == {"books": [create_book.model_dump() | {"image": image}], "next_cursor": None}
+
+
+@pytest.fixture(scope="function")
+def seed_shelved_books_with_images(session: Session, seed_bookshelf, create_bookshelf):
+    books = [
+        Book(title=f"Book {i}", author="Author", year=2000 + i, read_status=ReadStatus.read)
+        for i in range(10)
+    ]
+    session.add_all(books)
+    session.commit()
+    session.add_all([
+        Image(book_id=book.id, source=ImageSource.open_library, source_id=f"OL{book.id}M", extension=".jpg")
+        for book in books
+    ])
+    # Shelve half of the books so both listings have several rows
+    session.add_all([
+        BookBookshelfLink(book_id=book.id, bookshelf_id=create_bookshelf.id)
+        for book in books[:5]
+    ])
+    session.commit()
+    yield books
+
+
+def test_get_bookshelf_query_budget(client: TestClient, seed_shelved_books_with_images, create_bookshelf, assert_max_queries):
+    bookshelf_id = create_bookshelf.id
+    with patch("app.models.image.image_handler") as mock_image_handler:
+        mock_image_handler.get_image_uri.return_value = "https://mock-s3-bucket.s3.amazonaws.com/abcde.jpg"
+        mock_image_handler.get_image_uris.side_effect = lambda keys: {key: "https://mock-s3-bucket.s3.amazonaws.com/abcde.jpg" for key in keys}
+        # The bookshelf, its books and their images
+        with assert_max_queries(3):
+            response = client.get(f"/bookshelves/{bookshelf_id}")
+        assert response.status_code == 200
+        assert len(response.json()["books"]) == 5
+
+
+
+def test_delete_bookshelf_loads_none_of_its_books(client: TestClient, session: Session, seed_shelved_books_with_images, create_bookshelf, assert_max_queries):
+    bookshelf_id = create_bookshelf.id
+    # The shelf's links, then the shelf itself
+    with assert_max_queries(2) as statements:
+        response = client.delete(f"/bookshelves/{bookshelf_id}")
+    assert response.status_code == 204
+    assert not any(statement.lstrip().upper().startswith("SELECT") for statement in statements)
+
+    session.expire_all()
+    assert session.get(Bookshelf, bookshelf_id) is None
+    assert session.exec(select(BookBookshelfLink).where(BookBookshelfLink.bookshelf_id == bookshelf_id)).all() == []
+    # The books themselves stay
+    assert len(session.exec(select(Book)).all()) == 10
+
+# Books not on a shelf are found by scanning books in page order and skipping shelved ones,
+# which reads every book when most are shelved
+@pytest.mark.allow_full_scans("book")
+def test_get_books_not_on_bookshelf_query_budget(client: TestClient, seed_shelved_books_with_images, create_bookshelf, assert_max_queries):
+    bookshelf_id = create_bookshelf.id
+    with patch("app.models.image.image_handler") as mock_image_handler:
+        mock_image_handler.get_image_uri.return_value = "https://mock-s3-bucket.s3.amazonaws.com/abcde.jpg"
+        mock_image_handler.get_image_uris.side_effect = lambda keys: {key: "https://mock-s3-bucket.s3.amazonaws.com/abcde.jpg" for key in keys}
+        with assert_max_queries(2):
+            response = client.get(f"/bookshelves/{bookshelf_id}/books/exclude/")
+        assert response.status_code == 200
+        assert len(response.json()["books"]) == 5
+
+        # The summary joins in covers, so it is a single query
+        with assert_max_queries(1):
+            response = client.get(f"/bookshelves/{bookshelf_id}/books/exclude/?summary=true")
+        assert response.status_code == 200
+        assert len(response.json()["books"]) == 5
+
+
+# Books not on a shelf are found by scanning books in page order and skipping shelved ones,
+# which reads every book when most are shelved
+@pytest.mark.allow_full_scans("book")
+def test_get_books_not_on_bookshelf_summary(client: TestClient, session: Session, seed_shelved_books_with_images, create_bookshelf):
+    unshelved = seed_shelved_books_with_images[5:]
+    # A book without a cover has no thumbnail
+    book_without_image = Book(title="Book 10", author="Author", year=2010, read_status=ReadStatus.read)
+    session.add(book_without_image)
+    # Covers with a thumbnail variant use it, the rest fall back to the original
+    image_with_variants = session.exec(select(Image).where(Image.book_id == unshelved[0].id)).one()
+    image_with_variants.variants = ["large", "medium", "thumbnail"]
+    session.add(image_with_variants)
+    session.commit()
+
+    with patch("app.models.image.image_handler") as mock_image_handler:
+        mock_image_handler.get_image_uris.side_effect = lambda keys: {key: f"https://mock-s3-bucket.s3.amazonaws.com/{key}" for key in keys}
+        response = client.get(f"/bookshelves/{create_bookshelf.id}/books/exclude/?summary=true")
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "books": [
+            {
+                "id": book.id,
+                "title": book.title,
+                "author": book.author,
+                "thumbnail_uri": f"https://mock-s3-bucket.s3.amazonaws.com/OL{book.id}M-thumbnail.webp",
+            }
+            for book in unshelved[:1]
+        ] + [
+            {
+                "id": book.id,
+                "title": book.title,
+                "author": book.author,
+                "thumbnail_uri": f"https://mock-s3-bucket.s3.amazonaws.com/OL{book.id}M.jpg",
+            }
+            for book in unshelved[1:]
+        ] + [
+            {"id": book_without_image.id, "title": "Book 10", "author": "Author", "thumbnail_uri": None}
+        ],
+        "next_cursor": None,
+    }
+
+
+@pytest.mark.parametrize("summary", [False, True])
+def test_get_books_not_on_bookshelf_pages(client: TestClient, seed_shelved_books_with_images, create_bookshelf, summary):
+    unshelved = seed_shelved_books_with_images[5:]
+
+    titles = []
+    cursor = None
+    with patch("app.models.image.image_handler") as mock_image_handler:
+        mock_image_handler.get_image_uris.side_effect = lambda keys: {key: key for key in keys}
+        while True:
+            params = {"sort_key": "year", "sort_direction": "descending", "limit": 2, "summary": summary}
+            if cursor is not None:
+                params["cursor"] = cursor
+            response = client.get(f"/bookshelves/{create_bookshelf.id}/books/exclude/", params=params)
+            assert response.status_code == 200
+            page = response.json()
+            assert len(page["books"]) <= 2
+            titles.extend(book["title"] for book in page["books"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+
+    assert titles == [book.title for book in reversed(unshelved)]
+
+
+def shelved_book_ids(session: Session, bookshelf_id: int) -> set[int]:
+    return set(session.exec(
+        select(BookBookshelfLink.book_id).where(BookBookshelfLink.bookshelf_id == bookshelf_id)
+    ).all())
+
+
+def test_add_books_to_bookshelf_is_idempotent(client: TestClient, session: Session, seed_shelved_books_with_images, create_bookshelf, assert_max_queries):
+    book_ids = [book.id for book in seed_shelved_books_with_images]
+
+    # The bookshelf, the existence check for every book and the insert, however many books there are
+    with assert_max_queries(3):
+        response = client.post(f"/bookshelves/{create_bookshelf.id}/books/", json={"book_ids": book_ids[3:] + book_ids[3:]})
+    assert response.status_code == 201
+
+    assert shelved_book_ids(session, create_bookshelf.id) == set(book_ids)
+
+
+def test_add_books_to_bookshelf_with_missing_book_adds_none(client: TestClient, session: Session, seed_shelved_books_with_images, create_bookshelf):
+    book_ids = [book.id for book in seed_shelved_books_with_images]
+
+    response = client.post(f"/bookshelves/{create_bookshelf.id}/books/", json={"book_ids": [book_ids[9], 12345]})
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Book with ID 12345 not found"}
+
+    assert shelved_book_ids(session, create_bookshelf.id) == set(book_ids[:5])
+
+
+def test_bulk_remove_books_from_bookshelf(client: TestClient, session: Session, seed_shelved_books_with_images, create_bookshelf, assert_max_queries):
+    book_ids = [book.id for book in seed_shelved_books_with_images]
+
+    # Books that are not on the shelf, or do not exist, are ignored
+    with assert_max_queries(2):
+        response = client.request(
+            "DELETE",
+            f"/bookshelves/{create_bookshelf.id}/books/",
+            json={"book_ids": book_ids[:3] + [book_ids[9], 12345]},
+        )
+    assert response.status_code == 204
+
+    assert shelved_book_ids(session, create_bookshelf.id) == set(book_ids[3:5])
+    # The books themselves are untouched
+    assert session.get(Book, book_ids[0]) is not None
+
+
+def test_bulk_remove_books_from_bookshelf_not_exists(client: TestClient):
+    response = client.request("DELETE", "/bookshelves/12345/books/", json={"book_ids": [1]})
+    assert response.status_code == 404
+
+
+@pytest.fixture(scope="function")
+def seed_shelved_books(session: Session):
+    books = [
+        Book(title="Emma", author="Jane Austen", year=1815, rating=4, read_status=ReadStatus.read),
+        Book(title="Persuasion", author="Jane Austen", year=1817, rating=None, read_status=ReadStatus.not_read),
+        Book(title="Dracula", author="Bram Stoker", year=1897, rating=5, read_status=ReadStatus.read),
+        Book(title="Ulysses", author="James Joyce", year=1922, rating=None, read_status=ReadStatus.reading),
+        Book(title="Beloved", author="Toni Morrison", year=1987, rating=4, read_status=ReadStatus.read),
+        # Not on the bookshelf
+        Book(title="Anna Karenina", author="Leo Tolstoy", year=1878, rating=5, read_status=ReadStatus.read),
+    ]
+    bookshelf = Bookshelf(title="Classics", description="Old books", sort_key=SortKey.id, sort_direction="ascending")
+    session.add_all(books + [bookshelf])
+    session.commit()
+    session.add_all([BookBookshelfLink(book_id=book.id, bookshelf_id=bookshelf.id) for book in books[:5]])
+    session.commit()
+    yield bookshelf
+
+
+def fetch_all_shelf_pages(client: TestClient, bookshelf_id: int, limit: int) -> list[str]:
+    titles = []
+    cursor = None
+    while True:
+        params = {"limit": limit} | ({"cursor": cursor} if cursor else {})
+        response = client.get(f"/bookshelves/{bookshelf_id}", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page["books"]) <= limit
+        titles.extend(book["title"] for book in page["books"])
+        if (cursor := page["next_cursor"]) is None:
+            return titles
+
+
+@pytest.mark.parametrize("sort_key,sort_direction,expected", [
+    ("id", "ascending", ["Emma", "Persuasion", "Dracula", "Ulysses", "Beloved"]),
+    ("title", "descending", ["Ulysses", "Persuasion", "Emma", "Dracula", "Beloved"]),
+    ("author", "ascending", ["Dracula", "Ulysses", "Emma", "Persuasion", "Beloved"]),
+    # NULL ratings sort first ascending and last descending, ties broken by id
+    ("rating", "ascending", ["Persuasion", "Ulysses", "Emma", "Beloved", "Dracula"]),
+    ("rating", "descending", ["Dracula", "Beloved", "Emma", "Ulysses", "Persuasion"]),
+])
+def test_get_bookshelf_sorted_and_paginated(client: TestClient, session: Session, seed_shelved_books, sort_key, sort_direction, expected):
+    seed_shelved_books.sort_key = sort_key
+    seed_shelved_books.sort_direction = sort_direction
+    session.add(seed_shelved_books)
+    session.commit()
+
+    for limit in (1, 2, 5, 50):
+        assert fetch_all_shelf_pages(client, seed_shelved_books.id, limit) == expected
+
+
+def test_get_bookshelf_cursor_from_other_sort_key(client: TestClient, session: Session, seed_shelved_books):
+    page = client.get(f"/bookshelves/{seed_shelved_books.id}", params={"limit": 2}).json()
+
+    # Re-sorting the shelf invalidates cursors issued under the old ordering
+    seed_shelved_books.sort_key = SortKey.title
+    session.add(seed_shelved_books)
+    session.commit()
+
+    response = client.get(f"/bookshelves/{seed_shelved_books.id}", params={"limit": 2, "cursor": page["next_cursor"]})
+    assert response.status_code == 400
@@ -0,0 +1,201 @@
+import asyncio
+import hashlib
+import httpx
+import pytest
+from io import BytesIO
+from fastapi import HTTPException, UploadFile
+from app.models.book import BookCreate
+from app.models.image import ImageSource
+from app.services.open_library.remote import LambdaInvocationError
+from app.utils import book_cover
+from app.utils.book_cover import ALLOWED_MIME_TYPES, COVER_PROBE_WINDOW, handle_olid, handle_upload, parse_olids
+from app.utils.images.stream import ImageTooLargeError
+
+# Enough of a PNG for `filetype` to recognize it from its magic bytes
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + b"\x00" * 200_000
+
+
+class ImageHandler:
+    def __init__(self):
+        self.saved = {}
+
+    async def save_image_file(self, image_name, image_file):
+        self.saved[image_name] = image_file.read()
+
+
+def upload_of(contents: bytes, size: int | None = None) -> UploadFile:
+    return UploadFile(file=BytesIO(contents), size=len(contents) if size is None else size, filename="cover")
+
+
+def run_handle_upload(upload, image_handler, max_size=5 * 1024 * 1024):
+    return asyncio.run(handle_upload(
+        upload=upload,
+        allowed_mimes=ALLOWED_MIME_TYPES,
+        max_size=max_size,
+        unique_id="abcde",
+        image_handler=image_handler,
+        chunk_size=64 * 1024,
+    ))
+
+
+def test_handle_upload_streams_in_chunks():
+    image_handler = ImageHandler()
+
+    image = run_handle_upload(upload_of(PNG_BYTES), image_handler)
+
+    assert image.source == ImageSource.direct_upload
+    assert image.source_id == "abcde"
+    assert image.extension == ".png"
+    assert image.content_hash == hashlib.sha256(PNG_BYTES).hexdigest()
+    assert image_handler.saved == {image.content_hash + ".png": PNG_BYTES}
+
+
+def test_handle_upload_stores_identical_covers_once():
+    image_handler = ImageHandler()
+
+    first = run_handle_upload(upload_of(PNG_BYTES), image_handler)
+    second = run_handle_upload(upload_of(PNG_BYTES), image_handler)
+
+    assert first.key == second.key
+    assert list(image_handler.saved) == [first.key]
+
+
+def test_handle_upload_rejects_invalid_type():
+    image_handler = ImageHandler()
+
+    with pytest.raises(HTTPException) as exc:
+        run_handle_upload(upload_of(b"fake image content"), image_handler)
+
+    assert exc.value.status_code == 400
+    assert image_handler.saved == {}
+
+
+def test_handle_upload_rejects_declared_size_before_reading():
+    image_handler = ImageHandler()
+
+    with pytest.raises(HTTPException) as exc:
+        run_handle_upload(upload_of(PNG_BYTES), image_handler, max_size=1024)
+
+    assert exc.value.status_code == 400
+    assert image_handler.saved == {}
+
+
+def test_handle_upload_rejects_undeclared_oversize_while_streaming():
+    image_handler = ImageHandler()
+
+    with pytest.raises(HTTPException) as exc:
+        run_handle_upload(upload_of(PNG_BYTES, size=0), image_handler, max_size=100_000)
+
+    assert exc.value.status_code == 400
+    # Nothing reaches storage, as the key is only known once the whole upload is read
+    assert image_handler.saved == {}
+
+
+class CoveredOpenLibrary:
+    """Every edition has a cover, apart from those listed"""
+    def __init__(self, coverless=()):
+        self.coverless = set(coverless)
+        self.probed = []
+
+    async def has_covers(self, olids):
+        self.probed.append(olids)
+        return [olid not in self.coverless for olid in olids]
+
+
+class FailingOpenLibrary(CoveredOpenLibrary):
+    def __init__(self, exception):
+        super().__init__()
+        self.exception = exception
+
+    async def fetch_image_from_olid(self, olid):
+        raise self.exception
+
+
+@pytest.mark.parametrize("exception, status_code", [
+    (httpx.ConnectTimeout("timed out"), 504),
+    (httpx.ConnectError("refused"), 502),
+    (ImageTooLargeError("too large"), 502),
+    (asyncio.TimeoutError(), 504),
+    (LambdaInvocationError("Unhandled"), 502),
+])
+def test_handle_olid_maps_fetch_failures(exception, status_code):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(handle_olid(olid="ABCDE", open_library=FailingOpenLibrary(exception)))
+
+    assert error.value.status_code == status_code
+
+
+CONTENT_HASH = hashlib.sha256(b"cover").hexdigest()
+
+
+class FetchingOpenLibrary(CoveredOpenLibrary):
+    def __init__(self, coverless=()):
+        super().__init__(coverless)
+        self.fetched = []
+
+    async def fetch_image_from_olid(self, olid):
+        self.fetched.append(olid)
+        return None if olid in self.coverless else CONTENT_HASH + ".jpg"
+
+
+class CoverVariants:
+    async def create(self, stem, extension):
+        return ["medium", "thumbnail"] if (stem, extension) == (CONTENT_HASH, ".jpg") else []
+
+
+def test_book_cover_handler_records_rendered_variants(monkeypatch):
+    monkeypatch.setattr(book_cover, "open_library", FetchingOpenLibrary())
+    monkeypatch.setattr(book_cover, "get_cover_variant_renderer", CoverVariants)
+
+    image = asyncio.run(book_cover.book_cover_handler(BookCreate(title="Emma", author="Jane Austen", year=1815, read_status="read", olid="OL1M")))
+
+    assert image.source_id == "OL1M"
+    assert image.key == CONTENT_HASH + ".jpg"
+    assert image.variants == ["medium", "thumbnail"]
+
+
+def test_handle_olid_fetches_a_requested_cover_without_probing():
+    olids = [f"OL{i}M" for i in range(3)]
+    open_library = FetchingOpenLibrary()
+
+    image = asyncio.run(handle_olid(olid="OL0M", open_library=open_library, alternates=olids))
+
+    assert image.source_id == "OL0M"
+    assert (open_library.fetched, open_library.probed) == (["OL0M"], [])
+
+
+def test_handle_olid_falls_back_to_the_first_edition_with_a_cover():
+    olids = [f"OL{i}M" for i in range(10)]
+    open_library = FetchingOpenLibrary(coverless=olids[:5])
+
+    image = asyncio.run(handle_olid(olid="OL0M", open_library=open_library, alternates=olids))
+
+    assert image.source_id == "OL5M"
+    assert open_library.fetched == ["OL0M", "OL5M"]
+    # Only once the requested edition has no cover are the others probed, a window at a time,
+    # stopping at the window with a cover
+    assert open_library.probed == [olids[1:1 + COVER_PROBE_WINDOW], olids[1 + COVER_PROBE_WINDOW:1 + 2 * COVER_PROBE_WINDOW]]
+
+
+def test_handle_olid_leaves_books_without_any_cover_uncovered():
+    olids = [f"OL{i}M" for i in range(3)]
+    open_library = FetchingOpenLibrary(coverless=olids)
+
+    assert asyncio.run(handle_olid(olid="OL0M", open_library=open_library, alternates=olids)) is None
+    assert open_library.fetched == ["OL0M"]
+
+
+def test_handle_olid_fetches_when_probes_fail():
+    open_library = FetchingOpenLibrary(coverless=["OL0M"])
+    open_library.has_covers = lambda olids: asyncio.sleep(0, [httpx.ConnectError("refused")] * len(olids))
+
+    image = asyncio.run(handle_olid(olid="OL0M", open_library=open_library, alternates=["OL1M"]))
+
+    assert image.source_id == "OL1M"
+
+
+def test_parse_olids_ignores_malformed_lists():
+    assert parse_olids('["OL1M", "OL2M"]') == ["OL1M", "OL2M"]
+    assert parse_olids(None) == []
+    assert parse_olids("not json") == []
+    assert parse_olids('{"olid": "OL1M"}') == []
@@ -0,0 +1,40 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from app.utils.bulk_import import iter_lines, validate_row
+
+
+def collect_lines(chunks):
+    async def stream():
+        for chunk in chunks:
+            yield chunk
+
+    async def run():
+        return [line async for line in iter_lines(stream())]
+
+    return asyncio.run(run())
+
+
+def test_iter_lines_joins_lines_split_across_chunks():
+    assert collect_lines([b"first li", b"ne\r\nsecond\n", b"thi", b"rd"]) == ["first line", "second", "third"]
+
+
+def test_iter_lines_does_not_split_multibyte_characters():
+    encoded = "Brontë\n".encode("utf-8")
+    assert collect_lines([encoded[:5], encoded[5:]]) == ["Brontë"]
+
+
+def test_iter_lines_reports_invalid_utf8():
+    with pytest.raises(HTTPException) as e:
+        collect_lines([b"first\n", b"sec\xffond\n"])
+    assert e.value.status_code == 400
+    assert e.value.detail == "Line 2 is not valid UTF-8"
+
+
+def test_validate_row_rejects_file_uploads():
+    book_create, error = validate_row({
+        "title": "Emma", "author": "Jane Austen", "year": 1815, "read_status": "read", "file": "aGVsbG8="
+    })
+
+    assert book_create is None
+    assert error.startswith("file:")
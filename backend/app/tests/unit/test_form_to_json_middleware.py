@@ -0,0 +1,50 @@
+import asyncio
+from main import FormToJSONMiddleware
+
+
+def run_middleware(headers: list[tuple[bytes, bytes]], body: bytes):
+    received = {}
+
+    async def app(scope, receive, send):
+        received["scope"] = scope
+        received["message"] = await receive()
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        pass
+
+    scope = {"type": "http", "method": "POST", "path": "/books/", "headers": headers, "query_string": b""}
+    asyncio.run(FormToJSONMiddleware(app)(scope, receive, send))
+    return scope, received
+
+
+def test_non_multipart_requests_pass_through_untouched():
+    headers = [(b"content-type", b"application/json")]
+    scope, received = run_middleware(headers, b'{"title": "title"}')
+
+    assert received["scope"] is scope
+    assert received["message"]["body"] == b'{"title": "title"}'
+
+
+def test_multipart_fields_become_json_and_files_are_set_aside():
+    boundary = b"boundary"
+    body = (
+        b"--boundary\r\n"
+        b'Content-Disposition: form-data; name="title"\r\n\r\n'
+        b"Book Title\r\n"
+        b"--boundary\r\n"
+        b'Content-Disposition: form-data; name="file"; filename="cover.jpg"\r\n'
+        b"Content-Type: image/jpeg\r\n\r\n"
+        b"fake image content\r\n"
+        b"--boundary--\r\n"
+    )
+    headers = [(b"content-type", b"multipart/form-data; boundary=" + boundary), (b"content-length", str(len(body)).encode())]
+    _, received = run_middleware(headers, body)
+
+    scope_headers = dict(received["scope"]["headers"])
+    assert scope_headers[b"content-type"] == b"application/json"
+    assert scope_headers[b"content-length"] == b"23"
+    assert received["message"]["body"] == b'{"title": "Book Title"}'
+    assert received["scope"]["state"]["uploads"]["file"].filename == "cover.jpg"
@@ -0,0 +1,34 @@
+import asyncio
+from app.utils import http_client
+
+
+def test_get_http_client_is_shared_until_closed(monkeypatch):
+    monkeypatch.setattr(http_client, "_http_client", None)
+
+    async def scenario():
+        client = http_client.get_http_client()
+        assert http_client.get_http_client() is client
+
+        await http_client.close_http_client()
+        assert client.is_closed
+
+        reopened = http_client.get_http_client()
+        assert reopened is not client
+        await http_client.close_http_client()
+
+    asyncio.run(scenario())
+
+
+def test_create_http_client_limits_from_environment(monkeypatch):
+    monkeypatch.setenv("HTTP_MAX_CONNECTIONS", "7")
+    monkeypatch.setenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "3")
+    monkeypatch.setenv("HTTP2_ENABLED", "false")
+
+    client = http_client.create_http_client()
+    pool = client._transport._pool
+
+    assert pool._max_connections == 7
+    assert pool._max_keepalive_connections == 3
+    assert pool._http2 is False
+    assert client.follow_redirects is True
+    asyncio.run(client.aclose())
@@ -0,0 +1,163 @@
+import asyncio
+from sqlmodel import Session
+from app.models.book import Book, ReadStatus
+from app.models.image import Image, ImageSource
+from app.utils.images.deletion import ImageDeletionQueue
+from app.utils.images.local import LocalImageHandler
+from app.utils.images.variants import variant_key
+
+CONTENT_HASH = "a" * 64
+
+
+class FlakyImageHandler:
+    def __init__(self, failing):
+        self.failing = set(failing)
+        self.calls = []
+
+    def delete_images(self, keys):
+        self.calls.append(keys)
+        failed = [key for key in keys if key in self.failing]
+        self.failing.clear()
+        return failed
+
+
+def store_image(session: Session, content_hash, source_id, extension=".jpg"):
+    book = Book(title="Book Title", author="Book Author", year=2000, read_status=ReadStatus.read)
+    session.add(book)
+    session.flush()
+    session.add(Image(book_id=book.id, source=ImageSource.open_library, source_id=source_id,
+                      content_hash=content_hash, extension=extension))
+    session.commit()
+
+
+def test_flush_deletes_queued_keys_in_one_batch(async_engine):
+    handler = FlakyImageHandler(failing=[])
+    queue = ImageDeletionQueue(handler, async_engine)
+    queue.enqueue(["b.jpg", "a.jpg"])
+    queue.enqueue(["a.jpg"])
+
+    asyncio.run(queue.flush())
+
+    assert handler.calls == [["a.jpg", "b.jpg"]]
+    assert len(queue) == 0
+
+
+def test_failed_keys_are_retried_on_next_flush(async_engine):
+    handler = FlakyImageHandler(failing=["b.jpg"])
+    queue = ImageDeletionQueue(handler, async_engine)
+    queue.enqueue(["a.jpg", "b.jpg"])
+
+    asyncio.run(queue.flush())
+    assert len(queue) == 1
+
+    asyncio.run(queue.flush())
+    assert handler.calls == [["a.jpg", "b.jpg"], ["b.jpg"]]
+    assert len(queue) == 0
+
+
+def test_flush_keeps_keys_stored_again_since_they_were_queued(async_engine, session: Session):
+    queue = ImageDeletionQueue(FlakyImageHandler(failing=[]), async_engine)
+    queue.enqueue([CONTENT_HASH + ".jpg", variant_key(CONTENT_HASH, "thumbnail"), "OL1M.jpg", "OL2M.jpg"])
+    # Another book picks the same cover, and an older cover keyed by source ID, before the flush
+    store_image(session, CONTENT_HASH, "OL3M")
+    store_image(session, None, "OL1M")
+
+    asyncio.run(queue.flush())
+
+    assert queue.image_handler.calls == [["OL2M.jpg"]]
+    assert len(queue) == 0
+
+
+def test_failed_keys_stored_again_are_not_retried(async_engine, session: Session):
+    handler = FlakyImageHandler(failing=[CONTENT_HASH + ".jpg"])
+    queue = ImageDeletionQueue(handler, async_engine)
+    queue.enqueue([CONTENT_HASH + ".jpg"])
+
+    asyncio.run(queue.flush())
+    assert len(queue) == 1
+
+    store_image(session, CONTENT_HASH, "OL1M")
+    asyncio.run(queue.flush())
+
+    assert handler.calls == [[CONTENT_HASH + ".jpg"]]
+    assert len(queue) == 0
+
+
+def test_local_delete_images_ignores_missing_files(tmp_path):
+    (tmp_path / "a.jpg").write_bytes(b"image")
+    handler = LocalImageHandler(local_directory=str(tmp_path), api_url="http://localhost:8000", image_mount_path="images")
+
+    assert handler.delete_images(["a.jpg", "missing.jpg"]) == []
+    assert not (tmp_path / "a.jpg").exists()
+
+
+def test_flush_is_deferred_while_a_request_is_storing(async_engine):
+    handler = FlakyImageHandler(failing=[])
+    queue = ImageDeletionQueue(handler, async_engine)
+    queue.enqueue(["a.jpg"])
+
+    async def store_then_flush():
+        async with queue.storing():
+            # The request may be about to commit a row using the queued key
+            await queue.flush()
+            assert handler.calls == []
+        await queue.flush()
+
+    asyncio.run(store_then_flush())
+
+    assert handler.calls == [["a.jpg"]]
+    assert len(queue) == 0
+
+
+def test_keys_stored_by_a_failed_request_are_queued(async_engine):
+    queue = ImageDeletionQueue(FlakyImageHandler(failing=[]), async_engine)
+
+    async def fail_to_commit():
+        async with queue.storing() as stored_keys:
+            stored_keys.update(["a.jpg", "a-thumbnail.webp"])
+            raise RuntimeError("Commit failed")
+
+    try:
+        asyncio.run(fail_to_commit())
+    except RuntimeError:
+        pass
+
+    assert len(queue) == 2
+    asyncio.run(queue.flush())
+    assert queue.image_handler.calls == [["a-thumbnail.webp", "a.jpg"]]
+
+
+def test_requests_wait_for_a_flush_under_way(async_engine):
+    events = []
+
+    class RecordingImageHandler:
+        def delete_images(self, keys):
+            events.append("deleted")
+            return []
+
+    queue = ImageDeletionQueue(RecordingImageHandler(), async_engine)
+    queue.enqueue(["a.jpg"])
+
+    async def store():
+        async with queue.storing():
+            events.append("storing")
+
+    async def flush_and_store():
+        flush = asyncio.create_task(queue.flush())
+        # Let the flush start checking the database before the request tries to store
+        await asyncio.sleep(0)
+        await asyncio.gather(flush, store())
+
+    asyncio.run(flush_and_store())
+
+    assert events == ["deleted", "storing"]
+
+
+def test_deleted_keys_are_no_longer_known_to_be_stored(tmp_path):
+    (tmp_path / "a.jpg").write_bytes(b"image")
+    handler = LocalImageHandler(local_directory=str(tmp_path), api_url="http://localhost:8000", image_mount_path="images")
+    assert handler.has_image("a.jpg")
+
+    handler.delete_images(["a.jpg"])
+
+    assert not handler.has_image("a.jpg")
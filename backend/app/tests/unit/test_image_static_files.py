@@ -0,0 +1,69 @@
+import hashlib
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.utils.images.content import IMMUTABLE_CACHE_CONTROL, SOURCE_ID_CACHE_CONTROL
+from app.utils.images.local import LocalImageHandler
+from app.utils.images.static import ImageStaticFiles
+
+CONTENT_HASH = hashlib.sha256(b"cover").hexdigest()
+
+
+@pytest.fixture(scope="function")
+def image_handler(tmp_path):
+    yield LocalImageHandler(local_directory=str(tmp_path), api_url="http://testserver", image_mount_path="images")
+
+
+@pytest.fixture(scope="function")
+def client(tmp_path):
+    app = FastAPI()
+    app.mount("/images", ImageStaticFiles(directory=str(tmp_path)), name="images")
+    with TestClient(app) as client:
+        yield client
+
+
+def test_content_addressed_images_are_immutable(image_handler, client):
+    key = CONTENT_HASH + ".jpg"
+    image_handler.save_image(key, b"cover")
+
+    response = client.get(image_handler.get_image_uri(key))
+
+    assert response.status_code == 200
+    assert response.content == b"cover"
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert response.headers["etag"] == f'"{CONTENT_HASH}"'
+
+
+def test_revalidation_with_the_etag_is_not_modified(image_handler, client):
+    key = CONTENT_HASH + ".jpg"
+    image_handler.save_image(key, b"cover")
+
+    response = client.get(image_handler.get_image_uri(key), headers={"If-None-Match": f'"{CONTENT_HASH}"'})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+
+
+def test_range_requests_are_served(image_handler, client):
+    key = CONTENT_HASH + ".jpg"
+    image_handler.save_image(key, b"cover")
+
+    response = client.get(
+        image_handler.get_image_uri(key), headers={"Range": "bytes=1-3", "If-Range": f'"{CONTENT_HASH}"'}
+    )
+
+    assert response.status_code == 206
+    assert response.content == b"ove"
+
+
+def test_images_stored_by_source_id_are_revalidated(image_handler, client):
+    image_handler.save_image("OL1M.jpg", b"cover")
+
+    response = client.get(image_handler.get_image_uri("OL1M.jpg"))
+
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == SOURCE_ID_CACHE_CONTROL
+    assert client.get(
+        image_handler.get_image_uri("OL1M.jpg"), headers={"If-None-Match": response.headers["etag"]}
+    ).status_code == 304
@@ -0,0 +1,116 @@
+import asyncio
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+from unittest.mock import patch
+from PIL import Image as PILImage
+from app.models.image import ImagePublic, ImageSource, resolve_image_uris
+from app.utils.images.local import LocalImageHandler
+from app.utils.images.variants import CoverVariantRenderer, render_variants, variant_key, variant_keys
+
+
+def encode(image: PILImage.Image, format: str, **kwargs) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **kwargs)
+    return buffer.getvalue()
+
+
+def decode(content: bytes) -> PILImage.Image:
+    return PILImage.open(io.BytesIO(content))
+
+
+@pytest.fixture(scope="function")
+def image_handler(tmp_path):
+    yield LocalImageHandler(local_directory=str(tmp_path), api_url="http://localhost:8000", image_mount_path="images")
+
+
+def test_render_variants_fits_each_size_as_webp():
+    variants = render_variants(encode(PILImage.new("RGB", (1000, 1500), "red"), "JPEG"))
+
+    assert {name: decode(content).size for name, content in variants.items()} == {
+        "large": (640, 960),
+        "medium": (320, 480),
+        "thumbnail": (160, 240),
+    }
+    assert {decode(content).format for content in variants.values()} == {"WEBP"}
+
+
+def test_render_variants_never_enlarges():
+    variants = render_variants(encode(PILImage.new("RGB", (200, 300), "red"), "PNG"))
+
+    assert decode(variants["large"]).size == (200, 300)
+    assert decode(variants["thumbnail"]).size == (160, 240)
+
+
+def test_render_variants_keeps_transparency():
+    variants = render_variants(encode(PILImage.new("RGBA", (100, 150), (0, 0, 0, 0)), "PNG"))
+
+    assert decode(variants["thumbnail"]).mode == "RGBA"
+
+
+def test_render_variants_applies_exif_orientation():
+    # Stored on its side, with an orientation saying to rotate it upright
+    exif = PILImage.Exif()
+    exif[0x0112] = 6
+    content = encode(PILImage.new("RGB", (1500, 1000), "red"), "JPEG", exif=exif)
+
+    assert decode(render_variants(content)["large"]).size == (640, 960)
+
+
+def test_render_variants_uses_first_frame_of_animated_gif():
+    frames = [PILImage.new("P", (300, 450), color) for color in (1, 2)]
+    content = encode(frames[0], "GIF", save_all=True, append_images=frames[1:])
+
+    assert decode(render_variants(content)["medium"]).size == (300, 450)
+
+
+def test_render_variants_rejects_non_images():
+    with pytest.raises(OSError):
+        render_variants(b"not an image")
+
+
+def test_create_stores_variants_alongside_the_original(image_handler, tmp_path):
+    (tmp_path / "OL1M.jpg").write_bytes(encode(PILImage.new("RGB", (1000, 1500), "red"), "JPEG"))
+
+    stored = asyncio.run(CoverVariantRenderer(image_handler).create("OL1M", ".jpg"))
+
+    assert stored == ["large", "medium", "thumbnail"]
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(["OL1M.jpg"] + variant_keys("OL1M"))
+
+
+def test_create_leaves_undecodable_covers_without_variants(image_handler, tmp_path):
+    (tmp_path / "OL1M.jpg").write_bytes(b"not an image")
+
+    assert asyncio.run(CoverVariantRenderer(image_handler).create("OL1M", ".jpg")) == []
+    assert asyncio.run(CoverVariantRenderer(image_handler).create("OL2M", ".jpg")) == []
+    assert [path.name for path in tmp_path.iterdir()] == ["OL1M.jpg"]
+
+
+def test_create_many_renders_in_worker_processes(image_handler, tmp_path):
+    for source_id in ("OL1M", "OL2M"):
+        (tmp_path / f"{source_id}.jpg").write_bytes(encode(PILImage.new("RGB", (400, 600), "red"), "JPEG"))
+
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        renderer = CoverVariantRenderer(image_handler, executor)
+        stored = asyncio.run(renderer.create_many([("OL1M", ".jpg"), ("OL2M", ".jpg")]))
+
+    assert stored == [["large", "medium", "thumbnail"]] * 2
+    assert decode((tmp_path / "OL2M-thumbnail.webp").read_bytes()).size == (160, 240)
+
+
+def test_resolve_image_uris_includes_variants():
+    images = [
+        ImagePublic(id=1, source=ImageSource.open_library, source_id="OL1M", extension=".jpg", variants=["thumbnail"]),
+        ImagePublic(id=2, source=ImageSource.open_library, source_id="OL2M", extension=".jpg"),
+    ]
+
+    with patch("app.models.image.image_handler") as mock_image_handler:
+        mock_image_handler.get_image_uris.side_effect = lambda keys: {key: f"https://signed/{key}" for key in keys}
+        resolve_image_uris(images)
+
+    # One bulk call covers originals and variants
+    assert mock_image_handler.get_image_uris.call_count == 1
+    assert images[0].model_dump()["variant_uris"] == {"thumbnail": f"https://signed/{variant_key('OL1M', 'thumbnail')}"}
+    assert "variants" not in images[0].model_dump()
+    assert images[1].model_dump()["variant_uris"] == {}
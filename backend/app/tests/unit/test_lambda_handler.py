@@ -0,0 +1,70 @@
+import asyncio
+import importlib.util
+from pathlib import Path
+import pytest
+from app.models.exception import ExceptionHandler
+from app.models.openlibrary import Work, Works
+from app.services.open_library.local import LocalOpenLibraryHandler
+
+# `remote/main.py` is bundled as the Lambda's own `app.main`, and `remote` is shadowed here by `remote.py`
+spec = importlib.util.spec_from_file_location(
+    "open_library_lambda",
+    Path(__file__).parents[2] / "services" / "open_library" / "remote" / "main.py",
+)
+open_library_lambda = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(open_library_lambda)
+
+
+@pytest.fixture(scope="function", autouse=True)
+def stub_open_library(monkeypatch):
+    async def search_by_title(self, title):
+        if title == "Nonexistent":
+            return ExceptionHandler(status_code=404, message="No results found. Please try a different search.")
+        return Works(works=[Work(title=title, author_name=["author"], first_publish_year=2000)])
+
+    async def fetch_image_from_olid(self, olid):
+        if olid == "missing":
+            raise ValueError("404 Not Found")
+        return olid + ".jpg"
+
+    monkeypatch.setattr(LocalOpenLibraryHandler, "search_by_title", search_by_title)
+    monkeypatch.setattr(LocalOpenLibraryHandler, "fetch_image_from_olid", fetch_image_from_olid)
+
+
+def test_batch_handler_returns_results_and_errors_in_order():
+    results = asyncio.run(open_library_lambda.batch_handler([
+        {"method": "search_by_title", "arguments": {"title": "Emma"}},
+        {"method": "search_by_title", "arguments": {"title": "Nonexistent"}},
+        {"method": "fetch_image_from_olid", "arguments": {"olid": "abcde"}},
+        {"method": "fetch_image_from_olid", "arguments": {"olid": "missing"}},
+        {"method": "search_many", "arguments": {"titles": []}},
+        {"method": "search_by_title"},
+    ]))["results"]
+
+    assert results[0] == {"result": [{"title": "Emma", "author_name": "author", "first_publish_year": 2000, "olids": []}]}
+    assert results[1] == {"result": {"status_code": 404, "message": "No results found. Please try a different search."}}
+    assert results[2] == {"result": "abcde.jpg"}
+    assert results[3] == {"error": "404 Not Found"}
+    assert "error" in results[4]
+    assert "error" in results[5]
+
+
+def test_batch_handler_runs_calls_concurrently(monkeypatch):
+    running = 0
+    most_running = 0
+
+    async def fetch_image_from_olid(self, olid):
+        nonlocal running, most_running
+        running += 1
+        most_running = max(most_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return olid + ".jpg"
+
+    monkeypatch.setattr(LocalOpenLibraryHandler, "fetch_image_from_olid", fetch_image_from_olid)
+
+    calls = [{"method": "fetch_image_from_olid", "arguments": {"olid": f"OL{i}M"}} for i in range(20)]
+    results = asyncio.run(open_library_lambda.batch_handler(calls))["results"]
+
+    assert len(results) == 20
+    assert most_running == LocalOpenLibraryHandler.batch_concurrency
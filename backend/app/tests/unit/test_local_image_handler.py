@@ -0,0 +1,72 @@
+import asyncio
+import hashlib
+import pytest
+from app.utils.images.content import save_content_addressed
+from app.utils.images.local import LocalImageHandler
+from app.utils.images.variants import variant_key
+
+CONTENT_HASH = hashlib.sha256(b"cover").hexdigest()
+
+
+@pytest.fixture(scope="function")
+def image_handler(tmp_path):
+    yield LocalImageHandler(local_directory=str(tmp_path), api_url="http://localhost:8000", image_mount_path="images")
+
+
+async def chunks_of(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def test_content_addressed_images_are_sharded(image_handler, tmp_path):
+    key = asyncio.run(save_content_addressed(image_handler, chunks_of(b"co", b"ver"), ".jpg")) + ".jpg"
+
+    assert key == CONTENT_HASH + ".jpg"
+    path = tmp_path / CONTENT_HASH[:2] / CONTENT_HASH[2:4] / key
+    assert path.read_bytes() == b"cover"
+    assert image_handler.load_image(key) == b"cover"
+    assert image_handler.get_image_uri(key) == f"http://localhost:8000/images/{CONTENT_HASH[:2]}/{CONTENT_HASH[2:4]}/{key}"
+
+
+def test_variants_are_sharded_with_their_original(image_handler, tmp_path):
+    key = variant_key(CONTENT_HASH, "thumbnail")
+    image_handler.save_image(key, b"variant")
+
+    assert (tmp_path / CONTENT_HASH[:2] / CONTENT_HASH[2:4] / key).read_bytes() == b"variant"
+    assert image_handler.delete_images([key]) == []
+    assert not (tmp_path / CONTENT_HASH[:2] / CONTENT_HASH[2:4] / key).exists()
+
+
+def test_images_stored_by_source_id_stay_where_they_were(image_handler, tmp_path):
+    (tmp_path / "OL1M.jpg").write_bytes(b"cover")
+
+    assert image_handler.load_image("OL1M.jpg") == b"cover"
+    assert image_handler.get_image_uri("OL1M.jpg") == "http://localhost:8000/images/OL1M.jpg"
+
+
+def test_failed_saves_leave_nothing_behind(image_handler, tmp_path):
+    class FailingFile:
+        def __init__(self):
+            self.reads = 0
+
+        def read(self, size=-1):
+            self.reads += 1
+            if self.reads > 1:
+                raise ValueError("Disk error")
+            return b"partial"
+
+    with pytest.raises(ValueError):
+        asyncio.run(image_handler.save_image_file(CONTENT_HASH + ".jpg", FailingFile()))
+
+    assert [path for path in tmp_path.rglob("*") if path.is_file()] == []
+
+
+def test_has_image_follows_saves_and_deletes(image_handler, tmp_path):
+    key = CONTENT_HASH + ".jpg"
+    assert not image_handler.has_image(key)
+
+    image_handler.save_image(key, b"cover")
+    assert image_handler.has_image(key)
+
+    image_handler.delete_images([key])
+    assert not image_handler.has_image(key)
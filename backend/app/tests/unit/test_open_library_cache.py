@@ -0,0 +1,355 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.models.exception import ExceptionHandler
+from app.models.openlibrary import Work, Works
+from app.models.search_cache import SearchCache
+from app.services.open_library.cache import CachedOpenLibraryHandler, SqliteSearchCacheStore, cached_from_env
+
+
+class CountingOpenLibrary:
+    def __init__(self, result=None, delay=0):
+        self.result = result
+        self.delay = delay
+        self.titles = []
+        self.probed = []
+
+    async def search_by_title(self, title):
+        self.titles.append(title)
+        await asyncio.sleep(self.delay)
+        if self.result is not None:
+            return self.result
+        return Works(works=[Work(title=title, author_name=["Author"], first_publish_year=2000)])
+
+    async def has_covers(self, olids):
+        self.probed.extend(olids)
+        return [ValueError("Unavailable") if olid == "OLDOWNM" else olid != "OLNONEM" for olid in olids]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_repeated_search_is_served_from_cache():
+    inner = CountingOpenLibrary()
+    cache = CachedOpenLibraryHandler(inner)
+
+    async def run():
+        first = await cache.search_by_title("The Hobbit")
+        second = await cache.search_by_title("  the   HOBBIT ")
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert first is second
+    assert inner.titles == ["The Hobbit"]
+    assert cache.get_stats()["hits"] == 1
+    assert cache.get_stats()["misses"] == 1
+
+
+def test_entries_expire_after_ttl():
+    inner = CountingOpenLibrary()
+    clock = FakeClock()
+    cache = CachedOpenLibraryHandler(inner, ttl=60, clock=clock)
+
+    async def run():
+        await cache.search_by_title("Dune")
+        clock.now = 59
+        await cache.search_by_title("Dune")
+        clock.now = 61
+        await cache.search_by_title("Dune")
+
+    asyncio.run(run())
+
+    assert inner.titles == ["Dune", "Dune"]
+
+
+def test_failures_are_cached_briefly():
+    inner = CountingOpenLibrary(result=ExceptionHandler(status_code=504, message="Timed out"))
+    clock = FakeClock()
+    cache = CachedOpenLibraryHandler(inner, ttl=300, negative_ttl=10, clock=clock)
+
+    async def run():
+        await cache.search_by_title("Dune")
+        clock.now = 5
+        cached = await cache.search_by_title("Dune")
+        clock.now = 11
+        await cache.search_by_title("Dune")
+        return cached
+
+    cached = asyncio.run(run())
+
+    assert isinstance(cached, ExceptionHandler)
+    assert len(inner.titles) == 2
+    assert cache.get_stats()["negative_hits"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    inner = CountingOpenLibrary()
+    cache = CachedOpenLibraryHandler(inner, max_size=2)
+
+    async def run():
+        await cache.search_by_title("A")
+        await cache.search_by_title("B")
+        # Touch A so that B is the least recently used
+        await cache.search_by_title("A")
+        await cache.search_by_title("C")
+        await cache.search_by_title("A")
+        await cache.search_by_title("B")
+
+    asyncio.run(run())
+
+    assert inner.titles == ["A", "B", "C", "B"]
+    assert cache.get_stats()["evictions"] == 2
+
+
+def test_concurrent_identical_searches_share_one_request():
+    inner = CountingOpenLibrary(delay=0.05)
+    cache = CachedOpenLibraryHandler(inner)
+
+    async def run():
+        return await asyncio.gather(*(cache.search_by_title("Emma") for _ in range(10)))
+
+    results = asyncio.run(run())
+
+    assert inner.titles == ["Emma"]
+    assert all(result is results[0] for result in results)
+    stats = cache.get_stats()
+    assert stats["misses"] == 1
+    assert stats["coalesced"] == 9
+    assert stats["in_flight"] == 0
+
+
+def test_cancelled_waiter_does_not_cancel_shared_search():
+    inner = CountingOpenLibrary(delay=0.05)
+    cache = CachedOpenLibraryHandler(inner)
+
+    async def run():
+        first = asyncio.ensure_future(cache.search_by_title("Emma"))
+        second = asyncio.ensure_future(cache.search_by_title("Emma"))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    result = asyncio.run(run())
+
+    assert result.works[0].title == "Emma"
+    assert inner.titles == ["Emma"]
+
+
+def test_cover_probes_are_remembered_unless_they_fail():
+    inner = CountingOpenLibrary()
+    clock = FakeClock()
+    cache = CachedOpenLibraryHandler(inner, clock=clock, cover_ttl=60)
+
+    assert asyncio.run(cache.has_covers(["OL1M", "OLNONEM", "OLDOWNM"]))[:2] == [True, False]
+    assert asyncio.run(cache.has_cover("OLNONEM")) is False
+    assert asyncio.run(cache.has_covers(["OL1M", "OLDOWNM"]))[0] is True
+    assert inner.probed == ["OL1M", "OLNONEM", "OLDOWNM", "OLDOWNM"]
+
+    clock.now += 61
+    asyncio.run(cache.has_covers(["OLNONEM"]))
+    assert inner.probed[-1] == "OLNONEM"
+
+
+
+def test_cover_probes_have_their_own_size_limit():
+    inner = CountingOpenLibrary()
+    # No titles are kept in memory, which must not evict every probe as soon as it is made
+    cache = CachedOpenLibraryHandler(inner, max_size=0, cover_max_size=2)
+
+    asyncio.run(cache.has_covers(["OL1M", "OL2M"]))
+    asyncio.run(cache.has_covers(["OL1M", "OL2M"]))
+    assert inner.probed == ["OL1M", "OL2M"]
+
+    asyncio.run(cache.has_covers(["OL3M"]))
+    asyncio.run(cache.has_covers(["OL1M", "OL3M"]))
+    assert inner.probed == ["OL1M", "OL2M", "OL3M", "OL1M"]
+
+
+def test_cover_probes_are_cached_with_search_caches_off(monkeypatch):
+    monkeypatch.setenv("OPEN_LIBRARY_SEARCH_CACHE_SIZE", "0")
+    monkeypatch.setenv("OPEN_LIBRARY_SEARCH_CACHE_PERSISTENT_SIZE", "0")
+    inner = CountingOpenLibrary()
+
+    cache = cached_from_env(inner)
+    asyncio.run(cache.has_covers(["OL1M"]))
+    asyncio.run(cache.has_covers(["OL1M"]))
+    assert inner.probed == ["OL1M"]
+
+    monkeypatch.setenv("OPEN_LIBRARY_COVER_CACHE_SIZE", "0")
+    assert cached_from_env(inner) is inner
+
+@pytest.fixture(scope="function")
+def store_engine(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'cache.db'}")
+
+    async def create():
+        async with engine.begin() as connection:
+            await connection.run_sync(SQLModel.metadata.create_all, tables=[SearchCache.__table__])
+
+    asyncio.run(create())
+    yield engine
+    asyncio.run(engine.dispose())
+
+
+class FakeWallClock:
+    def __init__(self):
+        self.now = datetime(2026, 1, 1)
+
+    def __call__(self):
+        return self.now
+
+
+def test_persisted_search_survives_a_new_process(store_engine):
+    inner = CountingOpenLibrary()
+
+    async def run():
+        first = CachedOpenLibraryHandler(inner, store=SqliteSearchCacheStore(store_engine))
+        await first.search_by_title("Middlemarch")
+        # A fresh handler stands in for a recycled process with an empty memory cache
+        second = CachedOpenLibraryHandler(inner, store=SqliteSearchCacheStore(store_engine))
+        result = await second.search_by_title("middlemarch")
+        await second.search_by_title("middlemarch")
+        return second, result
+
+    second, result = asyncio.run(run())
+
+    assert inner.titles == ["Middlemarch"]
+    assert result.model_dump()[0]["title"] == "Middlemarch"
+    assert second.get_stats()["persistent_hits"] == 1
+    assert second.get_stats()["hits"] == 1
+
+
+def test_failures_are_not_persisted(store_engine):
+    inner = CountingOpenLibrary(result=ExceptionHandler(status_code=404, message="No results"))
+
+    async def run():
+        await CachedOpenLibraryHandler(inner, store=SqliteSearchCacheStore(store_engine)).search_by_title("Nothing")
+        await CachedOpenLibraryHandler(inner, store=SqliteSearchCacheStore(store_engine)).search_by_title("Nothing")
+
+    asyncio.run(run())
+
+    assert len(inner.titles) == 2
+
+
+def test_expired_rows_are_ignored(store_engine):
+    clock = FakeWallClock()
+    store = SqliteSearchCacheStore(store_engine, now=clock)
+    works = Works(works=[Work(title="Emma", author_name=["Jane Austen"], first_publish_year=1815)])
+
+    async def run():
+        await store.set("emma", works, ttl=60)
+        fresh = await store.get("emma")
+        clock.now += timedelta(seconds=61)
+        return fresh, await store.get("emma")
+
+    fresh, expired = asyncio.run(run())
+
+    assert fresh[0] == 60
+    assert expired is None
+
+
+def stored_queries(engine):
+    async def run():
+        async with AsyncSession(engine) as session:
+            return set((await session.exec(select(SearchCache.query))).all())
+
+    return asyncio.run(run())
+
+
+def test_every_write_deletes_expired_rows(store_engine):
+    clock = FakeWallClock()
+    store = SqliteSearchCacheStore(store_engine, now=clock)
+    works = Works(works=[])
+
+    async def run():
+        await store.set("expired", works, ttl=1)
+        clock.now += timedelta(seconds=2)
+        await store.set("fresh", works, ttl=10)
+
+    asyncio.run(run())
+
+    assert stored_queries(store_engine) == {"fresh"}
+
+
+def test_size_is_trimmed_on_first_write_then_periodically(store_engine):
+    clock = FakeWallClock()
+    store = SqliteSearchCacheStore(store_engine, max_rows=2, eviction_interval=60, now=clock)
+    works = Works(works=[])
+
+    async def run():
+        for query, ttl in (("soonest", 1000), ("sooner", 2000), ("later", 3000)):
+            await store.set(query, works, ttl=ttl)
+
+    asyncio.run(run())
+    # Trimmed on the first write only, until the interval passes
+    assert stored_queries(store_engine) == {"soonest", "sooner", "later"}
+
+    clock.now += timedelta(seconds=61)
+    asyncio.run(store.set("latest", works, ttl=4000))
+    assert stored_queries(store_engine) == {"later", "latest"}
+
+
+def test_a_new_process_trims_on_its_first_write(store_engine):
+    clock = FakeWallClock()
+    works = Works(works=[])
+
+    async def run():
+        first = SqliteSearchCacheStore(store_engine, max_rows=2, now=clock)
+        for query, ttl in (("soonest", 1000), ("sooner", 2000), ("later", 3000)):
+            await first.set(query, works, ttl=ttl)
+        # Such as a Lambda cold start, which may never make many writes
+        await SqliteSearchCacheStore(store_engine, max_rows=2, now=clock).set("latest", works, ttl=4000)
+
+    asyncio.run(run())
+
+    assert stored_queries(store_engine) == {"later", "latest"}
+
+
+def test_unreadable_store_falls_back_to_network(tmp_path):
+    # No search_cache table has been created
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'empty.db'}")
+    inner = CountingOpenLibrary()
+
+    async def run():
+        cache = CachedOpenLibraryHandler(inner, store=SqliteSearchCacheStore(engine))
+        result = await cache.search_by_title("Emma")
+        await engine.dispose()
+        return result
+
+    assert asyncio.run(run()).works[0].title == "Emma"
+    assert inner.titles == ["Emma"]
+
+
+class BatchingOpenLibrary(CountingOpenLibrary):
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    async def search_many(self, titles):
+        self.batches.append(titles)
+        return [await self.search_by_title(title) for title in titles]
+
+
+def test_search_many_sends_only_misses_in_one_batch():
+    inner = BatchingOpenLibrary()
+    cache = CachedOpenLibraryHandler(inner)
+
+    async def run():
+        await cache.search_by_title("Emma")
+        return await cache.search_many(["emma", "Dune", "Persuasion", "DUNE"])
+
+    results = asyncio.run(run())
+
+    assert inner.batches == [["Dune", "Persuasion"]]
+    assert [result.works[0].title for result in results] == ["Emma", "Dune", "Persuasion", "Dune"]
+    assert results[1] is results[3]
+    assert cache.get_stats()["hits"] == 1
@@ -0,0 +1,74 @@
+import asyncio
+from app.services.open_library.coalesce import CoalescedCoverHandler
+
+
+class CountingOpenLibrary:
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.olids = []
+        self.batches = []
+
+    async def fetch_image_from_olid(self, olid):
+        self.olids.append(olid)
+        await asyncio.sleep(self.delay)
+        return olid + ".jpg"
+
+    async def fetch_images_from_olids(self, olids):
+        self.batches.append(olids)
+        await asyncio.sleep(self.delay)
+        return [ValueError("Unavailable") if olid == "OLDOWNM" else None if olid == "OLNONEM" else olid + ".jpg" for olid in olids]
+
+
+def test_concurrent_fetches_of_one_cover_share_one_download():
+    inner = CountingOpenLibrary(delay=0.05)
+    covers = CoalescedCoverHandler(inner)
+
+    async def run():
+        return await asyncio.gather(*(covers.fetch_image_from_olid(olid) for olid in ["OL1M"] * 5 + ["OL2M"]))
+
+    assert asyncio.run(run()) == ["OL1M.jpg"] * 5 + ["OL2M.jpg"]
+    assert inner.olids == ["OL1M", "OL2M"]
+
+    # Covers are not kept once fetched, as the stored cover is reused by the caller instead
+    asyncio.run(covers.fetch_image_from_olid("OL1M"))
+    assert inner.olids == ["OL1M", "OL2M", "OL1M"]
+
+
+def test_bulk_fetches_join_fetches_in_flight_and_batch_the_rest():
+    inner = CountingOpenLibrary(delay=0.05)
+    covers = CoalescedCoverHandler(inner)
+
+    async def run():
+        single = asyncio.ensure_future(covers.fetch_image_from_olid("OL1M"))
+        await asyncio.sleep(0)
+        bulk = await covers.fetch_images_from_olids(["OL1M", "OL2M", "OLNONEM", "OLDOWNM", "OL2M"])
+        return await single, bulk
+
+    single, bulk = asyncio.run(run())
+
+    assert single == "OL1M.jpg"
+    assert bulk[:3] == ["OL1M.jpg", "OL2M.jpg", None]
+    assert isinstance(bulk[3], ValueError)
+    assert bulk[4] == "OL2M.jpg"
+    assert inner.olids == ["OL1M"]
+    assert inner.batches == [["OL2M", "OLNONEM", "OLDOWNM"]]
+
+
+def test_single_fetches_join_bulk_fetches_in_flight():
+    inner = CountingOpenLibrary(delay=0.05)
+    covers = CoalescedCoverHandler(inner)
+
+    async def run():
+        bulk = asyncio.ensure_future(covers.fetch_images_from_olids(["OL1M", "OLDOWNM"]))
+        await asyncio.sleep(0)
+        single, failed = await asyncio.gather(
+            covers.fetch_image_from_olid("OL1M"), covers.fetch_image_from_olid("OLDOWNM"), return_exceptions=True
+        )
+        return single, failed, await bulk
+
+    single, failed, bulk = asyncio.run(run())
+
+    assert single == "OL1M.jpg"
+    assert bulk == ["OL1M.jpg", failed]
+    assert inner.olids == []
+    assert inner.batches == [["OL1M", "OLDOWNM"]]
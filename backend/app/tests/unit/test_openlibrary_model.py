@@ -35,4 +35,14 @@ def test_works_model_dump(works):
             "first_publish_year": 2000,
             "olids": ["ABCDE", "FGHIJ"]
         }
-    ]
\ No newline at end of file
+    ]
+def test_works_from_dump_round_trips(works):
+
+    assert Works.from_dump(works.model_dump()).model_dump() == works.model_dump()
+
+def test_works_from_dump_without_olids():
+
+    works = Works.from_dump([{"title": "title", "author_name": "author", "first_publish_year": 2000, "olids": []}])
+
+    assert works.works[0].cover_edition_key is None
+    assert works.works[0].edition_key == []
@@ -1,11 +1,13 @@
+import asyncio
+import hashlib
+import httpx
 import pytest
-from app.services.open_library.factory import get_open_library
-
-openlibrary = get_open_library()
+from app.services.open_library.local import LocalOpenLibraryHandler
+from app.utils.images.stream import ImageTooLargeError
 
 @pytest.fixture(scope="function")
 def open_library():
-    return openlibrary
+    return LocalOpenLibraryHandler()
 
 def test_build_search_url(open_library):
 
@@ -20,4 +22,100 @@ def test_build_image_url_from_olid(open_library):
 
     result = open_library._build_image_url_from_olid("ABCDE")
 
-    assert result == "https://covers.openlibrary.org/b/olid/ABCDE-L.jpg"
\ No newline at end of file
+    assert result == "https://covers.openlibrary.org/b/olid/ABCDE-L.jpg"
+
+class RecordingImageHandler:
+    def __init__(self):
+        self.saved = {}
+
+    async def save_image_file(self, image_name, image_file):
+        self.saved[image_name] = image_file.read()
+
+
+def fetch_with_transport(handler, monkeypatch, olid="ABCDE"):
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            monkeypatch.setattr("app.services.open_library.local.get_http_client", lambda: client)
+            local = LocalOpenLibraryHandler()
+            local.image_handler = RecordingImageHandler()
+            local.cover_max_size = 1024
+            return local, await local.fetch_image_from_olid(olid)
+
+    return asyncio.run(run())
+
+
+def test_fetch_image_from_olid_streams_into_image_handler(monkeypatch):
+    contents = b"\xff\xd8\xff" + b"x" * 500
+
+    def handler(request):
+        # Editions without a cover are a 404 rather than a placeholder
+        assert str(request.url) == "https://covers.openlibrary.org/b/olid/ABCDE-L.jpg?default=false"
+        return httpx.Response(200, content=contents)
+
+    local, image_name = fetch_with_transport(handler, monkeypatch)
+
+    # Stored under the hash of its contents, so the same artwork on another edition is stored once
+    assert image_name == hashlib.sha256(contents).hexdigest() + ".jpg"
+    assert local.image_handler.saved == {image_name: contents}
+
+
+def test_fetch_image_from_olid_returns_none_without_a_cover(monkeypatch):
+    local, image_name = fetch_with_transport(lambda request: httpx.Response(404), monkeypatch)
+
+    assert image_name is None
+    assert local.image_handler.saved == {}
+
+
+def test_fetch_image_from_olid_raises_on_error_status(monkeypatch):
+    with pytest.raises(httpx.HTTPStatusError):
+        fetch_with_transport(lambda request: httpx.Response(503), monkeypatch)
+
+
+def test_fetch_image_from_olid_rejects_declared_oversize(monkeypatch):
+    with pytest.raises(ImageTooLargeError):
+        fetch_with_transport(lambda request: httpx.Response(200, content=b"x" * 2048), monkeypatch)
+
+
+def test_fetch_image_from_olid_rejects_undeclared_oversize(monkeypatch):
+    async def body():
+        for _ in range(4):
+            yield b"x" * 512
+
+    with pytest.raises(ImageTooLargeError):
+        fetch_with_transport(lambda request: httpx.Response(200, content=body()), monkeypatch)
+
+
+def has_cover_with_transport(handler, monkeypatch, olid="ABCDE"):
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler), follow_redirects=True) as client:
+            monkeypatch.setattr("app.services.open_library.local.get_http_client", lambda: client)
+            return await LocalOpenLibraryHandler().has_cover(olid)
+
+    return asyncio.run(run())
+
+
+def test_has_cover_does_not_follow_the_redirect_to_the_image(monkeypatch):
+    requests = []
+
+    def handler(request):
+        requests.append(str(request.url))
+        return httpx.Response(302, headers={"Location": "https://archive.org/download/ABCDE-L.jpg"})
+
+    assert has_cover_with_transport(handler, monkeypatch)
+    assert requests == ["https://covers.openlibrary.org/b/olid/ABCDE-L.jpg?default=false"]
+
+
+def test_has_cover_is_false_for_editions_without_one(monkeypatch):
+    assert not has_cover_with_transport(lambda request: httpx.Response(404), monkeypatch)
+
+
+def test_has_cover_raises_on_other_errors(monkeypatch):
+    with pytest.raises(httpx.HTTPStatusError):
+        has_cover_with_transport(lambda request: httpx.Response(503), monkeypatch)
+
+
+def test_has_cover_is_false_for_statuses_raise_for_status_lets_through(monkeypatch):
+    # Older httpx releases only raise for 4xx and 5xx
+    monkeypatch.setattr(httpx.Response, "raise_for_status", lambda self: self)
+
+    assert has_cover_with_transport(lambda request: httpx.Response(304), monkeypatch) is False
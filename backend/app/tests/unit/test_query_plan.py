@@ -0,0 +1,113 @@
+import pytest
+from sqlalchemy import delete
+from sqlmodel import SQLModel, create_engine, select
+from app.db.query_plan import audit, explain_query_plan, full_scans, record_statements
+from app.models.book import Book
+from app.models.book_bookshelf import BookBookshelfLink
+from app.models.bookshelf import SortDirection, SortKey
+from app.models.image import Image
+from app.utils.pagination import paginate
+
+
+@pytest.fixture(scope="function")
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'plans.db'}")
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def test_full_scans_flags_tables_read_without_an_index():
+    plan = ["SCAN book", "SCAN TABLE image", "SCAN bookshelf"]
+
+    scans = full_scans("SELECT ...", plan, allowed={"bookshelf"})
+
+    assert [scan.table for scan in scans] == ["book", "image"]
+
+
+def test_full_scans_ignores_index_and_virtual_table_scans():
+    plan = [
+        "SCAN book USING INDEX ix_book_title_id",
+        "SCAN bookbookshelflink USING COVERING INDEX ix_bookbookshelflink_bookshelf_id_book_id",
+        "SCAN book_fts VIRTUAL TABLE INDEX 0:M1",
+        "SEARCH image USING INDEX ix_image_source_id (source_id=?)",
+    ]
+
+    assert full_scans("SELECT ...", plan) == []
+
+
+def test_full_scans_allows_ordered_scans_stopped_by_a_limit():
+    assert full_scans("SELECT book.id FROM book ORDER BY book.id LIMIT ?", ["SCAN book"]) == []
+    # A keyset cursor only filters on the columns the page is ordered by
+    keyset = "SELECT book.id FROM book WHERE book.id > ? OR book.id = ? AND book.id > ? ORDER BY book.id LIMIT ?"
+    assert full_scans(keyset, ["SCAN book"]) == []
+
+    sorted_first = ["SCAN book", "USE TEMP B-TREE FOR ORDER BY"]
+    assert [scan.table for scan in full_scans("SELECT book.id FROM book ORDER BY book.review LIMIT ?", sorted_first)] == ["book"]
+
+
+def test_full_scans_flags_filtered_scans_despite_a_limit():
+    # Either may read every book before a page fills
+    filtered = "SELECT book.id FROM book WHERE lower(book.author) LIKE ? ORDER BY book.id LIMIT ?"
+    anti_join = (
+        "SELECT book.id FROM book WHERE NOT (EXISTS (SELECT link.book_id FROM link WHERE link.book_id = book.id)) "
+        "ORDER BY book.id LIMIT ?"
+    )
+    assert [scan.table for scan in full_scans(filtered, ["SCAN book"])] == ["book"]
+    assert [scan.table for scan in full_scans(anti_join, ["SCAN book"])] == ["book"]
+
+
+def test_full_scans_flags_tables_only_a_subquery_limits():
+    statement = (
+        "DELETE FROM search_cache WHERE search_cache.query IN "
+        "(SELECT search_cache.query FROM search_cache ORDER BY search_cache.expires_at LIMIT ?)"
+    )
+    assert [scan.table for scan in full_scans(statement, ["SCAN search_cache"])] == ["search_cache"]
+
+    # Nor is a table the page is not ordered by
+    joined = "SELECT book.id FROM book JOIN image ON image.book_id = book.id ORDER BY book.id LIMIT ?"
+    assert [scan.table for scan in full_scans(joined, ["SCAN book", "SCAN image"])] == ["image"]
+
+
+@pytest.mark.parametrize("sort_key", list(SortKey))
+@pytest.mark.parametrize("sort_direction", list(SortDirection))
+def test_book_pages_are_read_in_index_order(engine, sort_key, sort_direction):
+    statement = paginate(
+        select(Book),
+        column=getattr(Book, sort_key.value),
+        id_column=Book.id,
+        sort_key=sort_key,
+        sort_direction=sort_direction,
+        cursor=None,
+        limit=50,
+    )
+    compiled = statement.compile(engine)
+
+    with engine.connect() as connection:
+        plan = explain_query_plan(connection, str(compiled), compiled.params.values())
+
+    assert not any("TEMP B-TREE" in detail for detail in plan), plan
+
+
+def test_shelf_and_image_lookups_use_indexes(engine):
+    with engine.connect() as connection, record_statements(engine) as statements:
+        connection.execute(select(BookBookshelfLink.book_id).where(BookBookshelfLink.bookshelf_id == 1))
+        connection.execute(delete(BookBookshelfLink).where(BookBookshelfLink.bookshelf_id == 1))
+        connection.execute(select(Image.source_id).where(Image.source_id.in_(["OL1M", "OL2M"])))
+        connection.execute(select(Book.id).where(Book.read_status == "read"))
+
+    assert len(statements) == 4
+
+    with engine.connect() as connection:
+        assert audit(connection, statements, allowed=set()) == []
+
+
+def test_audit_reports_unindexed_filters(engine):
+    with engine.connect() as connection, record_statements(engine) as statements:
+        connection.execute(select(Book.id).where(Book.review == "Great"))
+
+    with engine.connect() as connection:
+        scans = audit(connection, statements)
+
+    assert [scan.table for scan in scans] == ["book"]
+    assert "SCAN book" in str(scans[0])
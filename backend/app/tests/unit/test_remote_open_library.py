@@ -0,0 +1,218 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import pytest
+from app.models.exception import ExceptionHandler
+from app.services.open_library.remote import LambdaInvocationError, RemoteOpenLibraryHandler
+
+
+class StubPayload(BytesIO):
+    """Stands in for botocore's StreamingBody, noting the threads it is read on"""
+
+    def __init__(self, payload, read_threads):
+        super().__init__(json.dumps(payload).encode())
+        self.read_threads = read_threads
+
+    def read(self, *args):
+        self.read_threads.add(threading.get_ident())
+        return super().read(*args)
+
+
+class StubLambdaClient:
+    """Stands in for boto3's Lambda client, answering like our Open Library function would"""
+
+    def __init__(self, delay=0.0, function_error=None, payload=None):
+        self.delay = delay
+        self.function_error = function_error
+        self.payload = payload
+        self.events = []
+        self.threads = set()
+        self.read_threads = set()
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        self.threads.add(threading.get_ident())
+        event = json.loads(Payload)
+        self.events.append(event)
+        # Blocking, like the real client
+        time.sleep(self.delay)
+
+        if self.function_error is not None:
+            return {
+                "FunctionError": self.function_error,
+                "Payload": StubPayload({"errorMessage": "Something went wrong"}, self.read_threads),
+            }
+
+        if "calls" in event:
+            payload = {"results": [self.answer(call) for call in event["calls"]]}
+        else:
+            payload = self.payload if self.payload is not None else self.answer(event)["result"]
+        return {"Payload": StubPayload(payload, self.read_threads)}
+
+    @staticmethod
+    def answer(call):
+        arguments = call["arguments"]
+        if call["method"] == "fetch_image_from_olid":
+            if arguments["olid"] == "missing":
+                return {"error": "404 Not Found"}
+            return {"result": arguments["olid"] + ".jpg"}
+        if call["method"] == "has_cover":
+            return {"result": arguments["olid"] != "coverless"}
+        if arguments["title"] == "Nonexistent":
+            return {"result": {"status_code": 404, "message": "No results found. Please try a different search."}}
+        return {"result": [{
+            "title": arguments["title"],
+            "author_name": "author",
+            "first_publish_year": 2000,
+            "olids": ["abcde", "fghij"],
+        }]}
+
+
+@pytest.fixture(scope="function")
+def executor():
+    executor = ThreadPoolExecutor(max_workers=8)
+    yield executor
+    executor.shutdown()
+
+
+def test_search_by_title_invokes_function(executor):
+    stub = StubLambdaClient()
+    remote = RemoteOpenLibraryHandler(lambda_client=stub, executor=executor)
+
+    works = asyncio.run(remote.search_by_title("Emma"))
+
+    assert stub.events == [{"method": "search_by_title", "arguments": {"title": "Emma"}}]
+    assert works.model_dump() == [{
+        "title": "Emma",
+        "author_name": "author",
+        "first_publish_year": 2000,
+        "olids": ["abcde", "fghij"],
+    }]
+
+
+def test_payload_is_read_off_the_event_loop(executor):
+    stub = StubLambdaClient()
+    remote = RemoteOpenLibraryHandler(lambda_client=stub, executor=executor)
+
+    asyncio.run(remote.search_by_title("Emma"))
+
+    assert stub.read_threads
+    assert threading.get_ident() not in stub.read_threads
+
+
+def test_concurrent_searches_do_not_serialize(executor):
+    stub = StubLambdaClient(delay=0.2)
+    remote = RemoteOpenLibraryHandler(lambda_client=stub, executor=executor)
+
+    async def run():
+        return await asyncio.gather(*(remote.search_by_title(f"title {i}") for i in range(8)))
+
+    start = time.perf_counter()
+    results = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+
+    assert len(results) == 8
+    assert len(stub.threads) > 1
+    # Serialized, these would take 1.6 seconds
+    assert elapsed < 0.8
+
+
+def test_event_loop_is_not_blocked_during_invoke(executor):
+    stub = StubLambdaClient(delay=0.2)
+    remote = RemoteOpenLibraryHandler(lambda_client=stub, executor=executor)
+    ticks = []
+
+    async def tick():
+        for _ in range(5):
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.02)
+
+    async def run():
+        await asyncio.gather(remote.search_by_title("Emma"), tick())
+
+    asyncio.run(run())
+
+    assert len(ticks) == 5
+    assert ticks[-1] - ticks[0] < 0.2
+
+
+def test_search_times_out(executor):
+    remote = RemoteOpenLibraryHandler(lambda_client=StubLambdaClient(delay=0.5), executor=executor)
+    remote.invoke_timeout = 0.05
+
+    result = asyncio.run(remote.search_by_title("Emma"))
+
+    assert isinstance(result, ExceptionHandler)
+    assert result.status_code == 504
+
+
+def test_search_function_error_is_returned(executor):
+    remote = RemoteOpenLibraryHandler(lambda_client=StubLambdaClient(function_error="Unhandled"), executor=executor)
+
+    result = asyncio.run(remote.search_by_title("Emma"))
+
+    assert isinstance(result, ExceptionHandler)
+    assert result.status_code == 502
+    assert result.message == "Something went wrong"
+
+
+def test_search_passes_through_function_exception_handler(executor):
+    stub = StubLambdaClient(payload={"status_code": 404, "message": "No results found. Please try a different search."})
+    remote = RemoteOpenLibraryHandler(lambda_client=stub, executor=executor)
+
+    result = asyncio.run(remote.search_by_title("Nonexistent"))
+
+    assert isinstance(result, ExceptionHandler)
+    assert result.status_code == 404
+
+
+def test_fetch_image_function_error_raises(executor):
+    remote = RemoteOpenLibraryHandler(lambda_client=StubLambdaClient(function_error="Unhandled"), executor=executor)
+
+    with pytest.raises(LambdaInvocationError):
+        asyncio.run(remote.fetch_image_from_olid("abcde"))
+
+
+def test_search_many_batches_invocations(executor):
+    stub = StubLambdaClient()
+    remote = RemoteOpenLibraryHandler(lambda_client=stub, executor=executor)
+    remote.batch_size = 2
+
+    results = asyncio.run(remote.search_many(["Emma", "Nonexistent", "Dune"]))
+
+    # Three searches in two invocations
+    assert [len(event["calls"]) for event in stub.events] == [2, 1]
+    assert results[0].model_dump()[0]["title"] == "Emma"
+    assert isinstance(results[1], ExceptionHandler)
+    assert results[1].status_code == 404
+    assert results[2].model_dump()[0]["title"] == "Dune"
+
+
+def test_fetch_images_from_olids_returns_per_item_errors(executor):
+    stub = StubLambdaClient()
+    remote = RemoteOpenLibraryHandler(lambda_client=stub, executor=executor)
+
+    results = asyncio.run(remote.fetch_images_from_olids(["abcde", "missing", "fghij"]))
+
+    assert len(stub.events) == 1
+    assert results[0] == "abcde.jpg"
+    assert isinstance(results[1], LambdaInvocationError)
+    assert results[2] == "fghij.jpg"
+
+
+def test_has_covers_probes_in_one_invocation(executor):
+    stub = StubLambdaClient()
+    remote = RemoteOpenLibraryHandler(lambda_client=stub, executor=executor)
+
+    assert asyncio.run(remote.has_covers(["abcde", "coverless"])) == [True, False]
+    assert [call["method"] for call in stub.events[0]["calls"]] == ["has_cover", "has_cover"]
+
+
+def test_failed_batch_invocation_fails_each_item(executor):
+    remote = RemoteOpenLibraryHandler(lambda_client=StubLambdaClient(function_error="Unhandled"), executor=executor)
+
+    results = asyncio.run(remote.search_many(["Emma", "Dune"]))
+
+    assert [result.status_code for result in results] == [502, 502]
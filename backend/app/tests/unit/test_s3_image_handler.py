@@ -0,0 +1,159 @@
+import asyncio
+import io
+import pytest
+from botocore.exceptions import ClientError
+from unittest.mock import MagicMock
+from app.utils.images import s3
+from app.utils.images.content import save_content_addressed
+from app.utils.images.s3 import S3ImageHandler
+
+
+@pytest.fixture(scope="function")
+def image_handler():
+    handler = S3ImageHandler(bucket_name="bucket")
+    handler.s3 = MagicMock()
+    handler.s3.generate_presigned_url.side_effect = lambda method, Params, ExpiresIn: f"https://signed/{Params['Key']}"
+    return handler
+
+
+@pytest.fixture(scope="function")
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(s3.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_get_image_uris_signs_each_key_once(image_handler, clock):
+    keys = [f"OL{i}M.jpg" for i in range(2000)]
+
+    first = image_handler.get_image_uris(keys)
+    second = image_handler.get_image_uris(keys)
+
+    assert first == second == {key: f"https://signed/{key}" for key in keys}
+    assert image_handler.s3.generate_presigned_url.call_count == 2000
+
+
+def test_get_image_uri_uses_cache(image_handler, clock):
+    image_handler.get_image_uris(["abcde.jpg"])
+
+    assert image_handler.get_image_uri("abcde.jpg") == "https://signed/abcde.jpg"
+    assert image_handler.s3.generate_presigned_url.call_count == 1
+
+
+def test_get_image_uris_refreshes_before_expiry(image_handler, clock):
+    image_handler.get_image_uri("abcde.jpg")
+
+    # Still comfortably inside the URL's lifetime
+    clock[0] += image_handler.presigned_url_expiry - image_handler.presigned_url_refresh_margin - 1
+    image_handler.get_image_uri("abcde.jpg")
+    assert image_handler.s3.generate_presigned_url.call_count == 1
+
+    # Within the refresh margin, so the URL is re-signed
+    clock[0] += 2
+    image_handler.get_image_uri("abcde.jpg")
+    assert image_handler.s3.generate_presigned_url.call_count == 2
+
+
+def test_get_image_uris_evicts_least_recently_used(image_handler, clock):
+    image_handler.presigned_url_cache_size = 2
+    image_handler.get_image_uris(["a.jpg", "b.jpg"])
+    image_handler.get_image_uri("a.jpg")
+    image_handler.get_image_uri("c.jpg")
+
+    # `b.jpg` was least recently used and has been evicted
+    image_handler.get_image_uris(["a.jpg", "c.jpg"])
+    assert image_handler.s3.generate_presigned_url.call_count == 3
+    image_handler.get_image_uri("b.jpg")
+    assert image_handler.s3.generate_presigned_url.call_count == 4
+
+
+def test_delete_images_batches_by_one_thousand(image_handler):
+    image_handler.s3.delete_objects.return_value = {}
+    keys = [f"OL{i}M.jpg" for i in range(2500)]
+
+    assert image_handler.delete_images(keys) == []
+
+    batches = [call.kwargs["Delete"]["Objects"] for call in image_handler.s3.delete_objects.call_args_list]
+    assert [len(batch) for batch in batches] == [1000, 1000, 500]
+    assert [item["Key"] for batch in batches for item in batch] == keys
+
+
+def test_delete_images_reports_failures_and_forgets_urls(image_handler, clock):
+    image_handler.get_image_uris(["a.jpg", "b.jpg"])
+    image_handler.s3.delete_objects.return_value = {"Errors": [{"Key": "b.jpg", "Code": "AccessDenied"}]}
+
+    assert image_handler.delete_images(["a.jpg", "b.jpg"]) == ["b.jpg"]
+
+    image_handler.get_image_uri("a.jpg")
+    assert image_handler.s3.generate_presigned_url.call_count == 3
+
+
+def test_load_image_reads_object_body(image_handler):
+    image_handler.s3.get_object.return_value = {"Body": io.BytesIO(b"cover")}
+
+    assert image_handler.load_image("abcde.jpg") == b"cover"
+    image_handler.s3.get_object.assert_called_once_with(Bucket="bucket", Key="abcde.jpg")
+
+
+def test_has_image_asks_storage_once_per_stored_key(image_handler):
+    assert image_handler.has_image("abcde.jpg")
+    assert image_handler.has_image("abcde.jpg")
+    assert image_handler.s3.head_object.call_count == 1
+
+    image_handler.save_image("fghij.jpg", b"image")
+    assert image_handler.has_image("fghij.jpg")
+    assert image_handler.s3.head_object.call_count == 1
+
+
+def test_has_image_rechecks_missing_and_deleted_keys(image_handler):
+    not_found = ClientError({"Error": {"Code": "404", "Message": "Not Found"}}, "HeadObject")
+    image_handler.s3.head_object.side_effect = not_found
+    image_handler.s3.delete_objects.return_value = {}
+
+    assert not image_handler.has_image("abcde.jpg")
+    assert not image_handler.has_image("abcde.jpg")
+    assert image_handler.s3.head_object.call_count == 2
+
+    image_handler.save_image("abcde.jpg", b"image")
+    image_handler.delete_images(["abcde.jpg"])
+    assert not image_handler.has_image("abcde.jpg")
+
+
+def test_has_image_treats_forbidden_as_missing(image_handler):
+    # Without s3:ListBucket, S3 answers 403 for missing keys
+    image_handler.s3.head_object.side_effect = ClientError({"Error": {"Code": "403", "Message": "Forbidden"}}, "HeadObject")
+
+    assert not image_handler.has_image("abcde.jpg")
+
+
+def test_has_image_raises_on_other_errors(image_handler):
+    image_handler.s3.head_object.side_effect = ClientError({"Error": {"Code": "500", "Message": "Internal Error"}}, "HeadObject")
+
+    with pytest.raises(ClientError):
+        image_handler.has_image("abcde.jpg")
+
+
+def test_saved_images_carry_their_cache_control(image_handler):
+    content_key = "a" * 64 + ".jpg"
+    image_handler.save_image(content_key, b"cover")
+
+    asyncio.run(image_handler.save_image_file("OL1M.jpg", io.BytesIO(b"cover")))
+
+    assert image_handler.s3.put_object.call_args.kwargs["CacheControl"] == "public, max-age=31536000, immutable"
+    assert image_handler.s3.upload_fileobj.call_args.kwargs["ExtraArgs"] == {"CacheControl": "public, max-age=86400"}
+
+
+def test_content_addressed_saves_upload_the_hashing_spool(image_handler):
+    uploaded = []
+    image_handler.s3.upload_fileobj.side_effect = lambda image_file, bucket, key, ExtraArgs: uploaded.append((image_file, image_file.read()))
+
+    async def chunks():
+        yield b"co"
+        yield b"ver"
+
+    digest = asyncio.run(save_content_addressed(image_handler, chunks(), ".jpg"))
+
+    # The spool the stream was hashed into is uploaded as it is, rather than copied into another
+    assert [type(image_file).__name__ for image_file, _ in uploaded] == ["SpooledTemporaryFile"]
+    assert uploaded[0][1] == b"cover"
+    assert image_handler.has_image(digest + ".jpg")
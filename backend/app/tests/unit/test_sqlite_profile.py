@@ -0,0 +1,49 @@
+import pytest
+from sqlmodel import create_engine, text
+from app.db.sqlite import SQLITE_PROFILES, apply_sqlite_pragmas
+
+
+@pytest.fixture(scope="function")
+def engine_for(tmp_path):
+    engines = []
+
+    def engine_for(profile):
+        engine = create_engine(f"sqlite:///{tmp_path / 'profile.db'}", connect_args={"check_same_thread": False})
+        apply_sqlite_pragmas(engine, SQLITE_PROFILES[profile]["pragmas"])
+        engines.append(engine)
+        return engine
+
+    yield engine_for
+    for engine in engines:
+        engine.dispose()
+
+
+def test_production_profile_keeps_the_rollback_journal(engine_for):
+    with engine_for("production").connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "delete"
+        assert connection.execute(text("PRAGMA mmap_size")).scalar() == 0
+        # FULL, the default
+        assert connection.execute(text("PRAGMA synchronous")).scalar() == 2
+        assert connection.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+        assert connection.execute(text("PRAGMA foreign_keys")).scalar() == 1
+
+
+def test_local_profile_applies_to_every_pooled_connection(engine_for):
+    engine = engine_for("local")
+    # Hold two connections open at once so the pool has to create both
+    with engine.connect() as first, engine.connect() as second:
+        for connection in (first, second):
+            assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+            # NORMAL
+            assert connection.execute(text("PRAGMA synchronous")).scalar() == 1
+            assert connection.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+            assert connection.execute(text("PRAGMA mmap_size")).scalar() == 256 * 1024 * 1024
+            assert connection.execute(text("PRAGMA cache_size")).scalar() == -64 * 1024
+            # MEMORY
+            assert connection.execute(text("PRAGMA temp_store")).scalar() == 2
+            assert connection.execute(text("PRAGMA foreign_keys")).scalar() == 1
+
+
+def test_production_and_local_profiles_disable_echo():
+    assert SQLITE_PROFILES["production"]["echo"] is False
+    assert SQLITE_PROFILES["local"]["echo"] is False
@@ -1,25 +1,165 @@
+import asyncio
 import base64
-from fastapi import HTTPException, status
+import json
+import os
+from botocore.exceptions import BotoCoreError, ClientError
+from fastapi import HTTPException, Request, UploadFile, status
 import filetype
+import httpx
 from nanoid import generate
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from app.models.book import BookCreate, BookUpdate
 from app.services.open_library.factory import get_open_library
+from app.services.open_library.remote import LambdaInvocationError
 from app.models.image import Image, ImageSource
+from app.utils.images.content import content_hash, save_content_addressed
 from app.utils.images.factory import get_image_handler
+from app.utils.images.stream import ImageTooLargeError
+from app.utils.images.variants import get_cover_variant_renderer
 
 # TODO expand this?
 ALLOWED_MIME_TYPES = {"image/png", "image/jpeg", "image/jpg", "image/gif"}
 MAX_ALLOWED_IMAGE_UPLOAD_SIZE = 5 * 1024 * 1024  # 5MB
+# Streamed uploads are read and stored this many bytes at a time
+# The first chunk must be large enough for `filetype` to sniff magic bytes (261 bytes)
+UPLOAD_CHUNK_SIZE = 64 * 1024  # 64KB
+# Works can have hundreds of editions, most without a cover, so only the first are considered
+MAX_COVER_CANDIDATES = 20
+# Candidate OLIDs are probed this many at a time, so a cover early in the list is found without probing the rest
+COVER_PROBE_WINDOW = 4
 image_handler = get_image_handler()
 open_library = get_open_library()
 
 
-async def handle_olid(olid: str, open_library) -> Image:
-    await open_library.fetch_image_from_olid(olid)
+def invalid_file_type():
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Invalid file type. Only PNG, JPEG, and GIF files are allowed."
+    )
+
+
+def file_size_exceeded():
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="File size exceeded. Maximum allowed size is 5MB."
+    )
+
+
+async def find_stored_covers(db: AsyncSession, olids: list[str], image_handler) -> dict[str, Image]:
+    """Covers already in storage for any of `olids`, so they are reused rather than downloaded again.
+
+    Books re-created, or sharing an edition, find the cover another book stored. Each is
+    confirmed in storage, which is only asked about keys this process has not seen stored.
+    """
+    if not olids:
+        return {}
+
+    rows = (await db.exec(
+        select(Image.source_id, Image.content_hash, Image.extension, Image.variants)
+        .where(
+            Image.source == ImageSource.open_library,
+            Image.source_id.in_(set(olids)),
+            Image.content_hash.is_not(None),
+        )
+    )).all()
+    # Any row will do, as every image for an OLID stores the same download
+    candidates = {
+        row.source_id: Image(
+            source=ImageSource.open_library,
+            source_id=row.source_id,
+            content_hash=row.content_hash,
+            extension=row.extension,
+            variants=list(row.variants),
+        )
+        for row in rows
+    }
+
+    stored = await asyncio.gather(*(run_in_threadpool(image_handler.has_image, image.key) for image in candidates.values()))
+    return {olid: image for (olid, image), exists in zip(candidates.items(), stored) if exists}
+
+
+def parse_olids(olids: str | None) -> list[str]:
+    """The OLIDs of a book's editions, stored as a JSON list with the cover edition first"""
+    try:
+        parsed = json.loads(olids) if olids else []
+    except ValueError:
+        return []
+    return [olid for olid in parsed if isinstance(olid, str)] if isinstance(parsed, list) else []
+
+
+async def find_covers(olids: list[str], open_library) -> list[str]:
+    """Those of `olids` with a real cover, in order, of the first `MAX_COVER_CANDIDATES`"""
+    candidates = list(dict.fromkeys(olids))[:MAX_COVER_CANDIDATES]
+    results = await open_library.has_covers(candidates)
+
+    if results and all(isinstance(result, Exception) for result in results):
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail="Unable to check for cover images with Open Library"
+        )
+    return [olid for olid, result in zip(candidates, results) if result is True]
+
+
+async def resolve_cover(olids: list[str], open_library) -> str | None:
+    """The first of `olids` with a real cover, or None if none of the first `MAX_COVER_CANDIDATES` have one.
+
+    Probes run `COVER_PROBE_WINDOW` at a time, in order, so a cover early in the list
+    is found without probing the rest.
+    """
+    candidates = list(dict.fromkeys(olids))[:MAX_COVER_CANDIDATES]
+    for start in range(0, len(candidates), COVER_PROBE_WINDOW):
+        window = candidates[start:start + COVER_PROBE_WINDOW]
+        for olid, result in zip(window, await open_library.has_covers(window)):
+            # A failed probe does not rule a cover out, so it is fetched and any error surfaces there
+            if result is True or isinstance(result, Exception):
+                return olid
+    return None
+
+
+async def handle_olid(olid: str, open_library, db: AsyncSession | None = None, alternates: list[str] | None = None) -> Image | None:
+    if db is not None and (image := (await find_stored_covers(db, [olid], image_handler)).get(olid)) is not None:
+        return image
+
+    # The fetch itself tells a real cover from a missing one, so the requested edition is not probed first
+    if (image := await fetch_olid_cover(olid=olid, open_library=open_library)) is not None:
+        return image
+
+    # Without a cover of its own, the book falls back to the cover of another of its editions, if any
+    resolved = await resolve_cover([alternate for alternate in alternates or [] if alternate != olid], open_library)
+    if resolved is None:
+        return None
+    if db is not None and (image := (await find_stored_covers(db, [resolved], image_handler)).get(resolved)) is not None:
+        return image
+
+    return await fetch_olid_cover(olid=resolved, open_library=open_library)
+
+
+async def fetch_olid_cover(olid: str, open_library) -> Image | None:
+    """The stored cover for `olid`, or None if Open Library has no cover for it"""
+    try:
+        # Returns the content addressed key the cover was stored under
+        key = await open_library.fetch_image_from_olid(olid)
+    except (httpx.TimeoutException, asyncio.TimeoutError):
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Timed out fetching cover image from Open Library"
+        )
+    # Local fetches raise httpx and size errors; fetches through our Lambda function raise the rest
+    except (httpx.HTTPError, ImageTooLargeError, LambdaInvocationError, BotoCoreError, ClientError):
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail="Unable to fetch cover image from Open Library"
+        )
+    if key is None:
+        return None
+    stem, extension = os.path.splitext(key)
     image = Image(
         source=ImageSource.open_library,
         source_id=olid,
-        extension=".jpg"
+        extension=extension,
+        content_hash=stem
     )
     return image
 
@@ -30,37 +170,99 @@ async def handle_file_upload(file, allowed_mimes, max_size, unique_id, image_han
     # Attempt to determine the file type from headers
     file_type = filetype.guess(contents)
 
-    if file_type.mime not in allowed_mimes:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid file type. Only PNG, JPEG, and GIF files are allowed."
-        )
+    if file_type is None or file_type.mime not in allowed_mimes:
+        raise invalid_file_type()
 
     if len(contents) > max_size:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="File size exceeded. Maximum allowed size is 5MB."
-        )
+        raise file_size_exceeded()
     
     extension = f".{file_type.mime.split('/')[-1]}"
 
-    image_handler.save_image(unique_id + extension, contents)
+    digest = content_hash(contents)
+    image_handler.save_image(digest + extension, contents)
+
+    image = Image(
+        source=ImageSource.direct_upload,
+        source_id=unique_id,
+        extension=extension,
+        content_hash=digest
+    )
+    return image
+
+
+async def handle_upload(upload: UploadFile, allowed_mimes, max_size, unique_id, image_handler, chunk_size=UPLOAD_CHUNK_SIZE):
+    # We are creating a book with a directly uploaded book cover image, received as multipart form data
+    # The file is streamed to storage a chunk at a time and is never held in memory in full
+    if upload.size is not None and upload.size > max_size:
+        raise file_size_exceeded()
+
+    # Magic bytes are all we need to determine the file type
+    first_chunk = await upload.read(chunk_size)
+    file_type = filetype.guess(first_chunk)
+
+    if file_type is None or file_type.mime not in allowed_mimes:
+        raise invalid_file_type()
+
+    extension = f".{file_type.mime.split('/')[-1]}"
+
+    async def chunks():
+        size = len(first_chunk)
+        chunk = first_chunk
+        while chunk:
+            # Guard against a client under-reporting the size of the upload
+            if size > max_size:
+                raise file_size_exceeded()
+            yield chunk
+            chunk = await upload.read(chunk_size)
+            size += len(chunk)
+
+    digest = await save_content_addressed(image_handler, chunks(), extension)
 
     image = Image(
         source=ImageSource.direct_upload,
         source_id=unique_id,
-        extension=extension
+        extension=extension,
+        content_hash=digest
     )
     return image
 
 
 async def book_cover_handler(
-  book_create_or_update: BookCreate | BookUpdate
+  book_create_or_update: BookCreate | BookUpdate,
+  upload: UploadFile | None = None,
+  db: AsyncSession | None = None
+) -> Image | None:
+    image = await store_book_cover(book_create_or_update=book_create_or_update, upload=upload, db=db)
+
+    # Covers reused from storage arrive with their variants
+    if image is not None and not image.variants:
+        # Resized copies for grids and lists, rendered off the event loop
+        image.variants = await get_cover_variant_renderer().create(image.stem, image.extension)
+
+    return image
+
+
+async def store_book_cover(
+  book_create_or_update: BookCreate | BookUpdate,
+  upload: UploadFile | None = None,
+  db: AsyncSession | None = None
 ) -> Image | None:
     
     if (olid := book_create_or_update.olid) is not None:
         # We are creating a book with an Open Library ID for the book cover image
-        return await handle_olid(olid=olid, open_library=open_library)
+        alternates = parse_olids(getattr(book_create_or_update, "olids", None))
+        return await handle_olid(olid=olid, open_library=open_library, db=db, alternates=alternates)
+
+    if upload is not None:
+        # Since we do not have an OLID, we generate a unique alphanumeric ID
+        unique_id = generate(size=10)
+        return await handle_upload(
+            upload=upload,
+            allowed_mimes=ALLOWED_MIME_TYPES,
+            max_size=MAX_ALLOWED_IMAGE_UPLOAD_SIZE,
+            unique_id=unique_id,
+            image_handler=image_handler
+        )
 
     if (file := book_create_or_update.file) is not None:
         # Since we do not have an OLID, we generate a unique alphanumeric ID
@@ -77,4 +279,10 @@ async def book_cover_handler(
 
 
 def get_book_cover_handler():
-    yield book_cover_handler
\ No newline at end of file
+    yield book_cover_handler
+
+
+# File parts of multipart requests are set aside by `FormToJSONMiddleware` rather
+# than being re-encoded into the JSON body, and are picked up here by name
+def get_uploaded_file(request: Request) -> UploadFile | None:
+    return getattr(request.state, "uploads", {}).get("file")
\ No newline at end of file
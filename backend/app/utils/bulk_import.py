@@ -0,0 +1,175 @@
+import csv
+import json
+from collections import deque
+from typing import AsyncIterator
+from fastapi import HTTPException, Request, status
+from pydantic import ValidationError
+from app.models.book import BookCreate
+
+# The most rows accepted by a single import
+MAX_BULK_IMPORT_ROWS = 10000
+# Rows are inserted and committed this many at a time, so a failure only loses its own chunk
+BULK_IMPORT_CHUNK_SIZE = 500
+
+
+def unsupported_media_type():
+    return HTTPException(
+        status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+        detail="Send a JSON list of books, NDJSON (application/x-ndjson) or CSV (text/csv)"
+    )
+
+
+def too_many_rows():
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"A single import may contain at most {MAX_BULK_IMPORT_ROWS} books"
+    )
+
+
+def invalid_body(detail: str):
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+
+def decode_line(line: bytes, line_number: int, keepends: bool) -> str:
+    # Lines are split on b"\n", which never occurs inside a multibyte UTF-8 character
+    try:
+        text = line.decode("utf-8")
+    except UnicodeDecodeError:
+        raise invalid_body(f"Line {line_number} is not valid UTF-8")
+    return text if keepends else text.rstrip("\r\n")
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], keepends: bool = False) -> AsyncIterator[str]:
+    # Split a byte stream into lines without holding the whole body
+    buffer = b""
+    line_number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            yield decode_line(line + b"\n", line_number, keepends)
+    if buffer:
+        yield decode_line(buffer, line_number + 1, keepends)
+
+
+class CsvRecordFeed:
+    """Lines for a single `csv.reader`, queued one whole record at a time as the body streams in.
+
+    A quoted field may span lines, so lines are held back until their quotes balance.
+    Quotes within a field are doubled, so an odd count means a field is still open.
+    """
+
+    def __init__(self):
+        self._lines = deque()
+        self._held = []
+        self._quotes = 0
+
+    def push(self, line: str) -> bool:
+        """Hold a line. Returns whether it completes a record, which is then ready to read
+
+        A quote that is literal text in an unquoted field leaves lines held until the next one,
+        the reader still parses them as separate records once they are released.
+        """
+        self._held.append(line)
+        self._quotes += line.count('"')
+        if self._quotes % 2:
+            return False
+        self.release()
+        return True
+
+    def release(self):
+        """Ready whatever is held, e.g. an unterminated field at the end of the body"""
+        self._lines.extend(self._held)
+        self._held, self._quotes = [], 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self._lines:
+            raise StopIteration
+        return self._lines.popleft()
+
+
+async def read_rows(request: Request) -> list[object]:
+    """The raw rows of a bulk import, from a JSON list, NDJSON or CSV body.
+
+    NDJSON and CSV are read line by line as the body streams in, CSV through a single
+    reader, so quoted fields may span lines.
+    """
+    content_type = request.headers.get("Content-Type", "application/json").split(";", 1)[0].strip()
+
+    if content_type == "application/json":
+        try:
+            rows = json.loads(await request.body())
+        except ValueError:
+            raise invalid_body("Body is not valid JSON")
+        if not isinstance(rows, list):
+            raise invalid_body("Body must be a JSON list of books")
+        if len(rows) > MAX_BULK_IMPORT_ROWS:
+            raise too_many_rows()
+        return rows
+
+    if content_type in ("application/x-ndjson", "application/jsonl"):
+        rows = []
+        async for line in iter_lines(request.stream()):
+            if not line.strip():
+                continue
+            if len(rows) == MAX_BULK_IMPORT_ROWS:
+                raise too_many_rows()
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                # Kept as a row, so it is reported as invalid alongside the rest
+                rows.append(line)
+        return rows
+
+    if content_type == "text/csv":
+        feed = CsvRecordFeed()
+        reader = csv.reader(feed)
+        fields = None
+        rows = []
+
+        async def records():
+            async for line in iter_lines(request.stream(), keepends=True):
+                if feed.push(line):
+                    # The reader stops once the feed runs dry, and picks up again once it is refilled
+                    for values in reader:
+                        yield values
+            feed.release()
+            for values in reader:
+                yield values
+
+        async for values in records():
+            if not any(value.strip() for value in values):
+                continue
+            if fields is None:
+                fields = values
+                continue
+            if len(rows) == MAX_BULK_IMPORT_ROWS:
+                raise too_many_rows()
+            # Empty cells are missing values, so optional fields fall back to their defaults
+            rows.append({field: value for field, value in zip(fields, values) if value != ""})
+        return rows
+
+    raise unsupported_media_type()
+
+
+def validate_row(row: object) -> tuple[BookCreate | None, str | None]:
+    """A row as a `BookCreate`, or why it is not one"""
+    if not isinstance(row, dict):
+        return None, "Row is not a book object"
+
+    try:
+        book_create = BookCreate.model_validate(row)
+    except ValidationError as e:
+        return None, "; ".join(
+            f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+        )
+
+    # Uploaded covers are too large to sensibly batch; covers come from Open Library here
+    if book_create.file is not None:
+        return None, "file: Cover uploads are not supported in bulk imports, use olid"
+
+    return book_create, None
@@ -0,0 +1,41 @@
+import os
+import httpx
+
+# A single application-scoped client, so that connections (and their TCP and TLS
+# handshakes) are pooled and kept alive across Open Library searches and cover fetches
+_http_client: httpx.AsyncClient | None = None
+
+
+def http2_available() -> bool:
+    # HTTP/2 support is an optional extra of httpx (`httpx[http2]`)
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def create_http_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", 100)),
+        max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20)),
+        keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30)),  # seconds
+    )
+    http2 = os.getenv("HTTP2_ENABLED", "true").lower() == "true" and http2_available()
+    # Cover images are served via redirects to archive.org
+    return httpx.AsyncClient(limits=limits, http2=http2, follow_redirects=True)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    # Created by the app's lifespan, or lazily where there is none (e.g. our Lambda handler)
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = create_http_client()
+    return _http_client
+
+
+async def close_http_client() -> None:
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
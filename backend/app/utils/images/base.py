@@ -1,22 +1,79 @@
 import os
+import threading
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 
 class BaseImageHandler(ABC):
-    
+    # Upper bound on the number of keys remembered as stored, least recently used are forgotten first
+    known_keys_size = 10000
+
     def __init__(self):
         self.storage_backend = os.getenv('STORAGE_BACKEND', 'local')
+        # Keys this process has stored or seen in storage, used as an OrderedDict of key => None
+        self._known_keys = OrderedDict()
+        # Sync routes are served from a thread pool, so the known keys may be shared across threads
+        self._known_keys_lock = threading.Lock()
     
     @abstractmethod
-    def download_image(self, url, image_name):
+    def save_image(self, image_name, image_content):
         """To be implemented by subclass."""
         pass
-    
+
     @abstractmethod
-    def save_image(self, image_name, image_content):
-        """To be implemented by subclass."""
+    async def save_image_file(self, image_name, image_file):
+        """Store an image from a readable binary file object, from its current position. To be implemented by subclass."""
+        pass
+
+    @abstractmethod
+    def load_image(self, key):
+        """The stored image's bytes. To be implemented by subclass."""
+        pass
+
+    @abstractmethod
+    def image_exists(self, key):
+        """Whether the image is in storage, checked with storage itself. To be implemented by subclass."""
+        pass
+
+    @abstractmethod
+    def delete_images(self, keys):
+        """Delete many images, ignoring any that do not exist. Returns the keys that could not be deleted. To be implemented by subclass."""
         pass
 
     @abstractmethod
     def get_image_uri(self, key):
         """To be implemented by subclass."""
-        pass
\ No newline at end of file
+        pass
+
+    def get_image_uris(self, keys):
+        """Resolve many keys at once. Subclasses may override with a cheaper bulk path."""
+        return {key: self.get_image_uri(key) for key in keys}
+
+    def has_image(self, key):
+        """Whether the image is in storage, without asking storage for keys known to be there.
+
+        A key's content never changes, so once stored it is known to exist until deleted
+        through this handler. Subclasses remember keys as they store them.
+        """
+        with self._known_keys_lock:
+            if key in self._known_keys:
+                self._known_keys.move_to_end(key)
+                return True
+
+        if not self.image_exists(key):
+            return False
+
+        self._remember_keys([key])
+        return True
+
+    def _remember_keys(self, keys):
+        with self._known_keys_lock:
+            for key in keys:
+                self._known_keys[key] = None
+                self._known_keys.move_to_end(key)
+            while len(self._known_keys) > self.known_keys_size:
+                self._known_keys.popitem(last=False)
+
+    def _forget_keys(self, keys):
+        with self._known_keys_lock:
+            for key in keys:
+                self._known_keys.pop(key, None)
\ No newline at end of file
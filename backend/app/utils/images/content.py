@@ -0,0 +1,56 @@
+import hashlib
+import re
+from tempfile import SpooledTemporaryFile
+from typing import AsyncIterator
+
+# Covers are stored under the SHA-256 of their bytes, so identical covers share one blob
+# e.g. two editions with the same artwork, or the same file uploaded twice
+CONTENT_KEY = re.compile(r"^[0-9a-f]{64}(?=[.-])")
+# Streams are held in memory up to this size before spilling to disk while they are hashed
+SPOOL_SIZE = 1024 * 1024  # 1MB
+# A content addressed key never names different bytes, so clients may keep it for good
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Keys by source ID may be stored again while a cover is re-fetched, so they are revalidated daily
+SOURCE_ID_CACHE_CONTROL = "public, max-age=86400"
+
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def is_content_key(key: str) -> bool:
+    """Whether `key` names a content addressed blob, or one of its variants"""
+    return CONTENT_KEY.match(key) is not None
+
+
+def cache_control(key: str) -> str:
+    """The `Cache-Control` header to serve an image under `key` with"""
+    return IMMUTABLE_CACHE_CONTROL if is_content_key(key) else SOURCE_ID_CACHE_CONTROL
+
+
+def storage_stem(content_hash: str | None, source_id: str) -> str:
+    """The key of an image's blob, less its extension.
+
+    Covers stored before content addressing are keyed by their source ID until
+    `app.db.scripts.content_address_images` rewrites them.
+    """
+    return content_hash or source_id
+
+
+async def save_content_addressed(image_handler, chunks: AsyncIterator[bytes], extension: str) -> str:
+    """Store a stream under the hash of its bytes. Returns the hash.
+
+    The key is only known once the stream ends, so it is spooled as it is hashed, and
+    the spool is handed to storage as it is. Nothing is stored if the stream raises
+    part way, e.g. for exceeding a size limit.
+    """
+    digest = hashlib.sha256()
+    with SpooledTemporaryFile(max_size=SPOOL_SIZE) as spool:
+        async for chunk in chunks:
+            digest.update(chunk)
+            spool.write(chunk)
+        spool.seek(0)
+
+        await image_handler.save_image_file(digest.hexdigest() + extension, spool)
+
+    return digest.hexdigest()
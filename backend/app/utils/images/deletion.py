@@ -0,0 +1,182 @@
+import asyncio
+import contextlib
+import functools
+import logging
+import os
+from sqlalchemy import and_, or_
+from starlette.concurrency import run_in_threadpool
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.db.sqlite import get_async_engine
+from app.models.image import Image
+from app.utils.images.content import storage_stem
+from app.utils.images.factory import get_image_handler
+from app.utils.images.variants import COVER_VARIANTS, VARIANT_EXTENSION, variant_key, variant_keys
+
+logger = logging.getLogger(__name__)
+
+
+class ImageDeletionQueue:
+    """Image keys no longer referenced by any book, waiting to be deleted from storage.
+
+    Routes enqueue keys once their transaction has committed and schedule `flush` as a
+    background task, so storage is cleaned up in batches after the response is sent.
+    Keys that fail to delete stay queued for the next flush.
+
+    A key may be stored again by another book after it was queued, e.g. the same OLID
+    picked again, so each flush checks the database again and drops keys in use.
+    """
+
+    def __init__(self, image_handler, engine):
+        self.image_handler = image_handler
+        self.engine = engine
+        self._pending: set[str] = set()
+        # Requests between storing images and committing the rows that use them
+        self._storing = 0
+        # Cleared while a flush checks and deletes keys
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def enqueue(self, keys):
+        self._pending.update(keys)
+
+    @contextlib.asynccontextmanager
+    async def storing(self):
+        """Held by a request from storing images until the rows using them are committed.
+
+        Storage is content addressed, so a request may store a queued key again, or reuse
+        it without storing it, and until its rows commit the key looks unused. Flushes
+        are deferred while any request is storing, and requests wait for a flush under
+        way to finish. Keys added to the yielded set are queued if the request fails,
+        as no row may ever use them.
+        """
+        # A flush may start between this waking and running, so the event is checked again
+        while not self._idle.is_set():
+            await self._idle.wait()
+        self._storing += 1
+        stored = set()
+        try:
+            yield stored
+        except BaseException:
+            self.enqueue(stored)
+            raise
+        finally:
+            self._storing -= 1
+
+    async def flush(self):
+        # Keys stay queued for a flush scheduled once no request is storing
+        if self._storing or not self._idle.is_set() or not self._pending:
+            return
+
+        keys, self._pending = self._pending, set()
+        self._idle.clear()
+        try:
+            await self._flush(keys)
+        finally:
+            self._idle.set()
+
+    async def _flush(self, keys):
+        try:
+            async with AsyncSession(self.engine) as session:
+                keys -= await referenced_image_keys(session, keys)
+        except Exception:
+            logger.exception("Unable to check whether images are still referenced, retrying on next flush")
+            self._pending.update(keys)
+            return
+        if not keys:
+            return
+
+        try:
+            failed = await run_in_threadpool(self.image_handler.delete_images, sorted(keys))
+        except Exception:
+            logger.exception("Unable to delete images")
+            failed = keys
+
+        if failed:
+            logger.warning("Unable to delete %d images, retrying on next flush", len(failed))
+            self._pending.update(failed)
+
+    def __len__(self):
+        return len(self._pending)
+
+
+def stored_image_keys(image: Image) -> list[str]:
+    """The keys of an image's original and of each of its variants"""
+    return [image.key] + [variant_key(image.stem, variant) for variant in image.variants or []]
+
+
+@functools.cache
+def get_image_deletion_queue() -> ImageDeletionQueue:
+    return ImageDeletionQueue(get_image_handler(), get_async_engine())
+
+
+async def orphaned_image_keys(db: AsyncSession, images: list[tuple[str | None, str, str]]) -> set[str]:
+    """Of the (content_hash, source_id, extension) of removed images, the keys no remaining image uses.
+
+    Stored images are content addressed, so books can share one, e.g. two editions with
+    the same artwork, or the same file uploaded twice. Each image row referencing a key
+    counts towards it, and a key is only orphaned once none are left. Variants go once
+    nothing with their stem is left. Every possible variant is included, as deleting one
+    that was never stored is harmless.
+    """
+    removed = {(storage_stem(content_hash, source_id), extension) for content_hash, source_id, extension in images}
+    if not removed:
+        return set()
+
+    # Covers not yet rewritten by `app.db.scripts.content_address_images` are still keyed by source ID
+    content_hashes = {content_hash for content_hash, _, _ in images if content_hash}
+    source_ids = {source_id for content_hash, source_id, _ in images if not content_hash}
+    references = []
+    if content_hashes:
+        references.append(Image.content_hash.in_(content_hashes))
+    if source_ids:
+        references.append(and_(Image.content_hash.is_(None), Image.source_id.in_(source_ids)))
+
+    remaining = {
+        (storage_stem(content_hash, source_id), extension)
+        for content_hash, source_id, extension in (await db.exec(
+            select(Image.content_hash, Image.source_id, Image.extension).where(or_(*references))
+        )).all()
+    }
+
+    remaining_stems = {stem for stem, _ in remaining}
+    keys = set()
+    for stem, extension in removed - remaining:
+        keys.add(stem + extension)
+        if stem not in remaining_stems:
+            keys.update(variant_keys(stem))
+    return keys
+
+
+async def referenced_image_keys(db: AsyncSession, keys) -> set[str]:
+    """Of stored image keys, those an image still uses, as the original or as one of its variants"""
+    # (stem, extension) of each original a key may be, and the stem of each cover a key may be a variant of
+    originals = {}
+    variants = {}
+    for key in keys:
+        originals[key] = os.path.splitext(key)
+        for variant in COVER_VARIANTS:
+            if key.endswith(f"-{variant}{VARIANT_EXTENSION}"):
+                variants[key] = key[:-len(f"-{variant}{VARIANT_EXTENSION}")]
+
+    stems = {stem for stem, _ in originals.values()} | set(variants.values())
+    if not stems:
+        return set()
+
+    # Keys are a content hash, or a source ID for covers not yet rewritten to content addressed keys
+    remaining = {
+        (storage_stem(content_hash, source_id), extension)
+        for content_hash, source_id, extension in (await db.exec(
+            select(Image.content_hash, Image.source_id, Image.extension).where(or_(
+                Image.content_hash.in_(stems),
+                and_(Image.content_hash.is_(None), Image.source_id.in_(stems)),
+            ))
+        )).all()
+    }
+    remaining_stems = {stem for stem, _ in remaining}
+
+    return {
+        key for key in keys
+        if originals[key] in remaining or variants.get(key) in remaining_stems
+    }
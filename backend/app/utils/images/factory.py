@@ -1,8 +1,11 @@
+import functools
 import os
 
 from app.utils.images.local import LocalImageHandler
 from app.utils.images.s3 import S3ImageHandler
 
+# One handler is shared, so that the keys it knows are stored, and its signed URLs, are seen by every caller
+@functools.cache
 def get_image_handler():
     storage_backend = os.getenv('STORAGE_BACKEND', 'local')
     
@@ -14,8 +17,7 @@ def get_image_handler():
           )
     elif storage_backend == 's3':
         return S3ImageHandler(
-            bucket_name=os.getenv("S3_IMAGE_BUCKET"),
-            tmp_directory=os.getenv("LOCAL_IMAGE_DIRECTORY")
+            bucket_name=os.getenv("S3_IMAGE_BUCKET")
         )
     else:
         raise ValueError(f"Unknown STORAGE_BACKEND: {storage_backend}")
@@ -1,7 +1,10 @@
-import urllib
 import os
+import shutil
+import tempfile
+from starlette.concurrency import run_in_threadpool
 
 from app.utils.images.base import BaseImageHandler
+from app.utils.images.content import is_content_key
 
 class LocalImageHandler(BaseImageHandler):
     def __init__(self, local_directory, api_url, image_mount_path):
@@ -10,16 +13,71 @@ class LocalImageHandler(BaseImageHandler):
         self.api_url = api_url
         self.image_mount_path = image_mount_path
 
-    def download_image(self, url, image_name):
-        file_path = os.path.join(self.local_directory, image_name)
-        urllib.request.urlretrieve(url, file_path)
-        return file_path
-
     def save_image(self, image_name, image_content):
-        # No action needed locally, image already saved by `download_image`
-        # TODO if directly uploading an image, we have not 'downloaded' the image
-        # TODO and thus we need to handle the saving
-        pass
+        image_file = self._open_for_write(image_name)
+        try:
+            with image_file:
+                image_file.write(image_content)
+        except BaseException:
+            os.remove(image_file.name)
+            raise
+        self._commit_write(image_name, image_file.name)
+
+    async def save_image_file(self, image_name, image_file):
+        await run_in_threadpool(self._save_image_file, image_name, image_file)
+
+    def _save_image_file(self, image_name, source_file):
+        image_file = self._open_for_write(image_name)
+        try:
+            with image_file:
+                shutil.copyfileobj(source_file, image_file)
+        except BaseException:
+            # Never leave a partially written image behind
+            os.remove(image_file.name)
+            raise
+        self._commit_write(image_name, image_file.name)
+
+    def image_exists(self, key):
+        return os.path.isfile(self._path(key))
+
+    def load_image(self, key):
+        with open(self._path(key), "rb") as image_file:
+            return image_file.read()
+
+    def delete_images(self, keys):
+        keys = list(keys)
+        self._forget_keys(keys)
+        failed = []
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                failed.append(key)
+        return failed
 
     def get_image_uri(self, key):
-        return os.path.join(self.api_url, self.image_mount_path, key)
+        return os.path.join(self.api_url, self.image_mount_path, self._relative_path(key))
+
+    def _relative_path(self, key):
+        # Content addressed images are sharded as `ab/cd/abcd...` by the first bytes of their hash,
+        # so no one directory grows too large. Older keys stay where they were until rewritten
+        if is_content_key(key):
+            return os.path.join(key[:2], key[2:4], key)
+        return key
+
+    def _path(self, key):
+        return os.path.join(self.local_directory, self._relative_path(key))
+
+    def _open_for_write(self, key):
+        # Images are written beside their final path and moved into place once complete, so that
+        # concurrent writes of the same content addressed image never expose a partial file
+        directory = os.path.dirname(self._path(key))
+        os.makedirs(directory, exist_ok=True)
+        return tempfile.NamedTemporaryFile(dir=directory, prefix=".", suffix=".tmp", delete=False)
+
+    def _commit_write(self, key, temporary_path):
+        os.chmod(temporary_path, 0o644)
+        os.replace(temporary_path, self._path(key))
+        self._remember_keys([key])
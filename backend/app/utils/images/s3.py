@@ -1,28 +1,118 @@
-import urllib
-import os
+import threading
+import time
+from collections import OrderedDict
 import boto3
+from botocore.exceptions import BotoCoreError, ClientError
+from starlette.concurrency import run_in_threadpool
 
 from app.utils.images.base import BaseImageHandler
+from app.utils.images.content import cache_control
 
 class S3ImageHandler(BaseImageHandler):
-    def __init__(self, bucket_name, tmp_directory):
+    # How long a presigned URL remains valid, in seconds
+    presigned_url_expiry = 3600
+    # Cached URLs are re-signed once they are this close to expiring, so that
+    # clients always receive a URL with a useful amount of life left in it
+    presigned_url_refresh_margin = 300
+    # Upper bound on the number of cached URLs, least recently used are evicted first
+    presigned_url_cache_size = 10000
+    # The most keys S3 accepts in a single `delete_objects` call
+    delete_batch_size = 1000
+
+    def __init__(self, bucket_name):
         super().__init__()
         self.s3 = boto3.client('s3', region_name='us-east-1')
         self.bucket_name = bucket_name
-        self.tmp_directory = tmp_directory
-
-    def download_image(self, url, image_name):
-        tmp_file_path = os.path.join(self.tmp_directory, image_name)
-        urllib.request.urlretrieve(url, tmp_file_path)
-        return tmp_file_path
+        # Maps key -> (presigned URL, monotonic time after which it must be re-signed)
+        self._uri_cache = OrderedDict()
+        # Sync routes are served from a thread pool, so the cache may be shared across threads
+        self._uri_cache_lock = threading.Lock()
 
     def save_image(self, image_name, image_content):
-        self.s3.put_object(Bucket=self.bucket_name, Key=image_name, Body=image_content)
-        # TODO - do we want to delete the local tmp image here?
+        self.s3.put_object(Bucket=self.bucket_name, Key=image_name, Body=image_content, CacheControl=cache_control(image_name))
+        self._remember_keys([image_name])
+
+    async def save_image_file(self, image_name, image_file):
+        # boto3 reads the file itself, in parts for larger images
+        await run_in_threadpool(
+            self.s3.upload_fileobj, image_file, self.bucket_name, image_name,
+            ExtraArgs={"CacheControl": cache_control(image_name)},
+        )
+        self._remember_keys([image_name])
+
+    def image_exists(self, key):
+        try:
+            self.s3.head_object(Bucket=self.bucket_name, Key=key)
+        except ClientError as e:
+            # S3 answers 403 for a missing key when the caller may not list the bucket,
+            # in which case the image is treated as missing and fetched again
+            if e.response.get("Error", {}).get("Code") in ("403", "AccessDenied", "404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    def load_image(self, key):
+        return self.s3.get_object(Bucket=self.bucket_name, Key=key)["Body"].read()
+
+    def delete_images(self, keys):
+        keys = list(keys)
+        # Forgotten up front, as a key that fails to delete may still have been deleted
+        self._forget_keys(keys)
+        failed = []
+        # `delete_objects` takes at most this many keys per call
+        for start in range(0, len(keys), self.delete_batch_size):
+            batch = keys[start:start + self.delete_batch_size]
+            try:
+                # Quiet mode only reports the keys that failed
+                response = self.s3.delete_objects(
+                    Bucket=self.bucket_name,
+                    Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+                )
+            except (BotoCoreError, ClientError):
+                failed.extend(batch)
+                continue
+            failed.extend(error["Key"] for error in response.get("Errors", []))
+
+        # Signed URLs for deleted images are of no further use
+        with self._uri_cache_lock:
+            for key in keys:
+                self._uri_cache.pop(key, None)
+
+        return failed
 
     def get_image_uri(self, key):
+        return self.get_image_uris([key])[key]
+
+    def get_image_uris(self, keys):
+        now = time.monotonic()
+        uris = {}
+        misses = []
+
+        with self._uri_cache_lock:
+            for key in keys:
+                cached = self._uri_cache.get(key)
+                if cached is not None and cached[1] > now:
+                    self._uri_cache.move_to_end(key)
+                    uris[key] = cached[0]
+                else:
+                    misses.append(key)
+
+        # Signing is a local HMAC computation, but still worth avoiding per book per request
+        refresh_at = now + self.presigned_url_expiry - self.presigned_url_refresh_margin
+        signed = {key: self._generate_presigned_url(key) for key in misses}
+
+        with self._uri_cache_lock:
+            for key, uri in signed.items():
+                self._uri_cache[key] = (uri, refresh_at)
+                self._uri_cache.move_to_end(key)
+            while len(self._uri_cache) > self.presigned_url_cache_size:
+                self._uri_cache.popitem(last=False)
+
+        return uris | signed
+
+    def _generate_presigned_url(self, key):
         return self.s3.generate_presigned_url(
             'get_object',
             Params={'Bucket': self.bucket_name, 'Key': key},
-            ExpiresIn=3600
-        )
\ No newline at end of file
+            ExpiresIn=self.presigned_url_expiry
+        )
@@ -0,0 +1,35 @@
+import os
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+from app.utils.images.content import cache_control, is_content_key
+
+class ImageStaticFiles(StaticFiles):
+    """Serves locally stored images with long-lived caching.
+
+    Starlette already answers `If-None-Match`, `If-Modified-Since` and `Range` requests,
+    this adds a `Cache-Control` suited to each key, and for content addressed keys a
+    strong ETag taken from the key itself, which survives copies, restores and mtime changes.
+    """
+
+    def file_response(
+        self,
+        full_path: os.PathLike | str,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        key = os.path.basename(full_path)
+        headers = {"cache-control": cache_control(key)}
+        if is_content_key(key):
+            # The bytes under a content addressed key are written once, so its name identifies them
+            headers["etag"] = f'"{os.path.splitext(key)[0]}"'
+
+        response = FileResponse(full_path, status_code=status_code, headers=headers, stat_result=stat_result)
+        # Checked after the headers are set, so that the ETag compared is the one clients were sent
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
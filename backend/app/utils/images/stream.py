@@ -0,0 +1,15 @@
+from typing import AsyncIterator
+
+
+class ImageTooLargeError(ValueError):
+    pass
+
+
+async def limit_stream(chunks: AsyncIterator[bytes], max_size: int) -> AsyncIterator[bytes]:
+    """Pass chunks through, raising `ImageTooLargeError` once more than `max_size` bytes have been seen."""
+    size = 0
+    async for chunk in chunks:
+        size += len(chunk)
+        if size > max_size:
+            raise ImageTooLargeError(f"Image exceeds the maximum size of {max_size} bytes")
+        yield chunk
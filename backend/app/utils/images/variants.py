@@ -0,0 +1,119 @@
+import asyncio
+import functools
+import io
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from PIL import ExifTags, Image as PILImage, ImageOps
+from starlette.concurrency import run_in_threadpool
+
+from app.utils.images.factory import get_image_handler
+
+logger = logging.getLogger(__name__)
+
+# Name => the box each variant is fitted within, in pixels, largest first. Covers are roughly 2:3
+COVER_VARIANTS = {
+    "large": (640, 960),
+    "medium": (320, 480),
+    "thumbnail": (160, 240),
+}
+VARIANT_EXTENSION = ".webp"
+VARIANT_QUALITY = 80
+# EXIF orientations that turn the image on its side
+TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+# Resizing is CPU bound, so it runs in worker processes rather than on the event loop or its threads.
+# Process pools need /dev/shm, which Lambda lacks; there, 0 renders on the thread pool instead
+IMAGE_VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', min(2, os.cpu_count() or 1)))
+
+
+def variant_key(stem: str, variant: str) -> str:
+    """Variants are keyed by their original's key, less its extension, see `app.utils.images.content.storage_stem`"""
+    return f"{stem}-{variant}{VARIANT_EXTENSION}"
+
+
+def variant_keys(stem: str) -> list[str]:
+    """The key of every variant a cover may have"""
+    return [variant_key(stem, variant) for variant in COVER_VARIANTS]
+
+
+def render_variants(content: bytes) -> dict[str, bytes]:
+    """Each variant of the cover in `content`, as WebP. Runs in a worker process.
+
+    Variants are only ever scaled down, each from the next largest, so a cover
+    smaller than a variant's box is recompressed at its own size.
+    """
+    with PILImage.open(io.BytesIO(content)) as original:
+        # JPEGs can be decoded at a fraction of their size, which is far cheaper than decoding in full
+        width, height = next(iter(COVER_VARIANTS.values()))
+        if original.getexif().get(ExifTags.Base.Orientation) in TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+        original.draft("RGB", (width, height))
+
+        # Animated GIFs keep their first frame
+        image = ImageOps.exif_transpose(original)
+        image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+
+    variants = {}
+    for name, box in COVER_VARIANTS.items():
+        image.thumbnail(box, PILImage.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, format="WEBP", quality=VARIANT_QUALITY, method=4)
+        variants[name] = buffer.getvalue()
+    return variants
+
+
+@functools.cache
+def get_variant_executor() -> Executor | None:
+    if IMAGE_VARIANT_WORKERS <= 0:
+        return None
+
+    try:
+        # Forking a process that is already running threads is unsafe, so workers are started fresh
+        return ProcessPoolExecutor(max_workers=IMAGE_VARIANT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    except (OSError, NotImplementedError):
+        logger.warning("Unable to start image workers, resizing covers on the thread pool instead")
+        return None
+
+
+class CoverVariantRenderer:
+    """Renders and stores resized variants of covers already in storage.
+
+    Variants are an optimization, as clients fall back to the original. If a cover
+    cannot be read, decoded or its variants stored, it is left without them.
+    """
+
+    def __init__(self, image_handler, executor: Executor | None = None):
+        self.image_handler = image_handler
+        # None runs on the event loop's default thread pool
+        self.executor = executor
+
+    async def create(self, stem: str, extension: str) -> list[str]:
+        """Returns the names of the variants stored"""
+        try:
+            content = await run_in_threadpool(self.image_handler.load_image, stem + extension)
+            loop = asyncio.get_running_loop()
+            rendered = await loop.run_in_executor(self.executor, render_variants, content)
+        except Exception:
+            logger.exception("Unable to render variants of %s", stem + extension)
+            return []
+
+        stored = []
+        for name, variant in rendered.items():
+            try:
+                await run_in_threadpool(self.image_handler.save_image, variant_key(stem, name), variant)
+            except Exception:
+                logger.exception("Unable to store the %s variant of %s", name, stem + extension)
+                continue
+            stored.append(name)
+        return stored
+
+    async def create_many(self, images: list[tuple[str, str]]) -> list[list[str]]:
+        """Variants for many (stem, extension) covers at once, in order"""
+        return list(await asyncio.gather(*(self.create(stem, extension) for stem, extension in images)))
+
+
+@functools.cache
+def get_cover_variant_renderer() -> CoverVariantRenderer:
+    return CoverVariantRenderer(get_image_handler(), get_variant_executor())
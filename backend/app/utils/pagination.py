@@ -0,0 +1,104 @@
+import base64
+import binascii
+import json
+from typing import Any
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, or_
+
+from app.models.bookshelf import SortDirection, SortKey
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+# Cursors are opaque to clients. Internally they are the sort key the page was
+# produced with, plus the sort value and ID of the last row on that page
+def encode_cursor(sort_key: SortKey, value: Any, row_id: int) -> str:
+    payload = json.dumps([sort_key.value, value, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str, sort_key: SortKey) -> tuple[Any, int]:
+    try:
+        key, value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+    # A cursor is only meaningful for the ordering that produced it
+    if key != sort_key.value or not isinstance(row_id, int):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor does not match the requested sort key",
+        )
+
+    return value, row_id
+
+
+# Ranked results (e.g. full-text search) have no stable key to seek on, so
+# their cursors wrap a plain offset instead
+def encode_offset_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"offset": offset}).encode("utf-8")).decode("ascii")
+
+
+def decode_offset_cursor(cursor: str) -> int:
+    try:
+        offset = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))["offset"]
+    except (ValueError, TypeError, KeyError, binascii.Error):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+    if not isinstance(offset, int) or offset < 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+    return offset
+
+
+def keyset_order_by(column, id_column, sort_direction: SortDirection) -> list:
+    if sort_direction == SortDirection.descending:
+        return [column.desc(), id_column.desc()]
+    return [column.asc(), id_column.asc()]
+
+
+def keyset_condition(column, id_column, sort_direction: SortDirection, value: Any, row_id: int):
+    """Rows strictly after (value, row_id) in the given ordering.
+
+    SQLite sorts NULLs first ascending and last descending, so nullable
+    columns like `rating` need the NULL block handled explicitly.
+    """
+    if sort_direction == SortDirection.descending:
+        if value is None:
+            return and_(column.is_(None), id_column < row_id)
+        return or_(
+            column < value,
+            and_(column == value, id_column < row_id),
+            column.is_(None),
+        )
+
+    if value is None:
+        return or_(
+            and_(column.is_(None), id_column > row_id),
+            column.is_not(None),
+        )
+    return or_(column > value, and_(column == value, id_column > row_id))
+
+
+def paginate(statement, column, id_column, sort_key: SortKey, sort_direction: SortDirection, cursor: str | None, limit: int):
+    """Apply keyset ordering, the cursor predicate and a LIMIT to `statement`.
+
+    One extra row is requested so the caller can tell whether there is a next page.
+    """
+    if cursor is not None:
+        value, row_id = decode_cursor(cursor, sort_key)
+        statement = statement.where(keyset_condition(column, id_column, sort_direction, value, row_id))
+
+    return statement.order_by(*keyset_order_by(column, id_column, sort_direction)).limit(limit + 1)
+
+
+def next_page(rows: list, sort_key: SortKey, limit: int) -> tuple[list, str | None]:
+    """Trim the look-ahead row and build the cursor pointing past the last row."""
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(sort_key, getattr(last, sort_key.value), last.id)
@@ -0,0 +1,171 @@
+"""Time and memory of listing the books that are not on a bookshelf.
+
+Compares the previous implementation, a `NOT IN (SELECT DISTINCT ...)` returning
+every such book fully serialized, against the paged `NOT EXISTS` anti-join. The
+bookshelf is new and holds a handful of books, which is when the listing is at
+its largest. "All pages" follows `next_cursor` 500 books at a time, as the
+frontend's book picker does.
+
+Memory is the peak traced by `tracemalloc` while serving a request, so it covers
+the ORM objects, the models and the JSON body. Timings are with tracing off.
+
+From the `backend` directory, run `python -m benchmarks.bench_books_not_on_bookshelf`
+"""
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import httpx
+from fastapi import APIRouter, Depends, FastAPI
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlmodel import SQLModel, create_engine, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+# Cover URIs are built locally rather than presigned, which would need S3 credentials
+os.environ["STORAGE_BACKEND"] = "local"
+os.environ.setdefault("API_URL", "http://localhost:8000")
+os.environ.setdefault("API_IMAGE_MOUNT_PATH", "images")
+
+from app.db.loaders import shape  # noqa: E402
+from app.db.sqlite import get_async_db  # noqa: E402
+from app.models.book import Book, BookPublic, ReadStatus  # noqa: E402
+from app.models.book_bookshelf import BookBookshelfLink  # noqa: E402
+from app.models.bookshelf import Bookshelf, SortDirection, SortKey  # noqa: E402
+from app.models.image import Image, ImageSource, resolve_image_uris  # noqa: E402
+from app.routers import bookshelves  # noqa: E402
+
+SIZES = (10_000, 100_000)
+SHELVED = 10
+REPEATS = 5
+
+previous = APIRouter()
+
+
+# The previous implementation
+@previous.get("/{bookshelf_id}/books/exclude/")
+async def get_books_not_on_bookshelf(bookshelf_id: int, db: AsyncSession = Depends(get_async_db)):
+    subquery = (
+        select(BookBookshelfLink.book_id)
+        .where(BookBookshelfLink.bookshelf_id == bookshelf_id)
+        .distinct()
+    )
+    query = shape(select(Book), BookPublic).where(Book.id.not_in(subquery))
+    result = await db.exec(query)
+    books = [BookPublic.model_validate(book) for book in result.fetchall()]
+    resolve_image_uris([book.image for book in books])
+    return [book.model_dump() for book in books]
+
+
+def seed(path: Path, size: int) -> None:
+    engine = create_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(
+            insert(Book),
+            [
+                {
+                    "title": f"Book {i}",
+                    "author": f"Author {i % 500}",
+                    "year": 1900 + i % 120,
+                    "rating": i % 5 + 1,
+                    "review": "A review of a few words",
+                    "read_status": ReadStatus.read.name,
+                }
+                for i in range(size)
+            ],
+        )
+        connection.execute(
+            insert(Image),
+            [
+                {"book_id": i + 1, "source": ImageSource.open_library.name, "source_id": f"OL{i + 1}M", "extension": ".jpg"}
+                for i in range(size)
+            ],
+        )
+        connection.execute(
+            insert(Bookshelf),
+            [{"title": "New", "description": "A new bookshelf", "sort_key": SortKey.title.name, "sort_direction": SortDirection.ascending.name}],
+        )
+        connection.execute(insert(BookBookshelfLink), [{"book_id": i + 1, "bookshelf_id": 1} for i in range(SHELVED)])
+    engine.dispose()
+
+
+def build_app(engine: AsyncEngine) -> FastAPI:
+    async def get_async_db_override():
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            yield session
+
+    app = FastAPI()
+    app.include_router(bookshelves.router, prefix="/bookshelves")
+    app.include_router(previous, prefix="/previous")
+    app.dependency_overrides[get_async_db] = get_async_db_override
+    return app
+
+
+async def fetch(client: httpx.AsyncClient, path: str, params: dict | None, follow: bool) -> tuple[int, int]:
+    """The number of books and bytes received for `path`, following cursors if `follow`"""
+    books = size = 0
+    params = dict(params or {})
+    while True:
+        response = await client.get(path, params=params)
+        assert response.status_code == 200
+        size += len(response.content)
+        page = response.json()
+        if isinstance(page, list):
+            return len(page), size
+        books += len(page["books"])
+        if not follow or page["next_cursor"] is None:
+            return books, size
+        params["cursor"] = page["next_cursor"]
+
+
+async def measure(client: httpx.AsyncClient, path: str, params: dict | None = None, follow: bool = False) -> tuple[list[float], int, int, int]:
+    books, size = await fetch(client, path, params, follow)
+
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        await fetch(client, path, params, follow)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    await fetch(client, path, params, follow)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return timings, peak, books, size
+
+
+def report(label: str, timings: list[float], peak: int, books: int, size: int) -> None:
+    mean = statistics.fmean(timings) * 1e3
+    print(f"{label:<40} {books:>7} books  {size / 1024:>9.0f}KiB  mean {mean:9.1f}ms  peak {peak / 1024 ** 2:7.1f}MiB")
+
+
+async def main() -> None:
+    cases = {
+        "previous (NOT IN, every book)": ("/previous/1/books/exclude/", None, False),
+        "NOT EXISTS, first page": ("/bookshelves/1/books/exclude/", {"sort_key": "title"}, False),
+        "NOT EXISTS, summary first page": ("/bookshelves/1/books/exclude/", {"sort_key": "title", "summary": True}, False),
+        "NOT EXISTS, summary all pages": ("/bookshelves/1/books/exclude/", {"sort_key": "title", "summary": True, "limit": 500}, True),
+    }
+
+    for size in SIZES:
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "bench.db"
+            seed(path, size)
+            engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+            transport = httpx.ASGITransport(app=build_app(engine))
+
+            print(f"{size} books, {SHELVED} on the bookshelf")
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                for label, (path_, params, follow) in cases.items():
+                    report(label, *await measure(client, path_, params, follow))
+            await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,123 @@
+"""Per-request latency of the hot GET paths with each form-rewriting middleware.
+
+Compares the previous `BaseHTTPMiddleware` implementation against the pure ASGI
+`FormToJSONMiddleware` on `GET /books/` and `GET /bookshelves/`.
+
+From the `backend` directory, run `python -m benchmarks.bench_middleware`
+"""
+import asyncio
+import base64
+import json
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlmodel.pool import StaticPool
+from starlette.datastructures import UploadFile
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.db.sqlite import get_async_db
+from app.main import FormToJSONMiddleware
+from app.models.book import Book, ReadStatus
+from app.models.bookshelf import Bookshelf, SortDirection, SortKey
+from app.routers import books, bookshelves
+from benchmarks.timing import report
+
+REQUESTS = 2000
+WARMUP = 200
+
+
+# The previous implementation, as it was. Only GET requests are made here,
+# so every request takes its pass-through path but still pays for the wrapping
+class BaseHTTPFormToJSONMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        content_type = request.headers.get("Content-Type", "").split(";", 1)[0]
+        if content_type == "multipart/form-data":
+            form_data = await request.form()
+            # This can include a File of type UploadFile
+            json_data = {}
+            for key, value in form_data.items():
+                if isinstance(value, UploadFile):
+                    file_bytes = await value.read()
+                    json_data[key] = base64.b64encode(file_bytes).decode("utf-8")
+                else:
+                    json_data[key] = value
+            # Convert JSON data to bytes and set as the new request body
+            json_body = json.dumps(json_data).encode("utf-8")
+            # Update the request scope
+            request.scope["headers"] = [
+                (b"content-type", b"application/json"),
+                *(header for header in request.scope["headers"] if header[0] != b"content-type"),
+            ]
+            request._body = json_body  # Set the new body directly
+
+        return await call_next(request)
+
+
+async def seeded_engine() -> AsyncEngine:
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as connection:
+        await connection.run_sync(SQLModel.metadata.create_all)
+    async with AsyncSession(engine) as session:
+        session.add_all(
+            Book(title=f"Book {i}", author="Author", year=2000, read_status=ReadStatus.read)
+            for i in range(20)
+        )
+        session.add_all(
+            Bookshelf(
+                title=f"Bookshelf {i}",
+                description="Description",
+                sort_key=SortKey.id,
+                sort_direction=SortDirection.ascending,
+            )
+            for i in range(5)
+        )
+        await session.commit()
+    return engine
+
+
+def build_app(middleware, engine: AsyncEngine) -> FastAPI:
+    async def get_async_db_override():
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            yield session
+
+    app = FastAPI()
+    app.add_middleware(middleware)
+    app.include_router(books.router, prefix="/books")
+    app.include_router(bookshelves.router, prefix="/bookshelves")
+    app.dependency_overrides[get_async_db] = get_async_db_override
+    return app
+
+
+async def measure(app: FastAPI, path: str) -> list[float]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(WARMUP):
+            await client.get(path)
+
+        timings = []
+        for _ in range(REQUESTS):
+            start = time.perf_counter()
+            response = await client.get(path)
+            timings.append(time.perf_counter() - start)
+            assert response.status_code == 200
+        return timings
+
+
+async def main() -> None:
+    engine = await seeded_engine()
+    apps = {
+        "BaseHTTPMiddleware": build_app(BaseHTTPFormToJSONMiddleware, engine),
+        "pure ASGI": build_app(FormToJSONMiddleware, engine),
+    }
+    for path in ("/books/", "/bookshelves/"):
+        for label, app in apps.items():
+            report(f"GET {path} [{label}]", await measure(app, path))
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+"""Open Library search latency with a fresh client per search versus the shared pooled client.
+
+A local stub stands in for openlibrary.org. "Cold" reproduces the previous
+behaviour of opening a new `httpx.AsyncClient` (and connection) for every
+search. "Warm" reuses the application-scoped client from `app.utils.http_client`.
+Against the real API each cold search additionally pays for a TLS handshake.
+
+From the `backend` directory, run `python -m benchmarks.bench_open_library_client`
+"""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from app.services.open_library.local import LocalOpenLibraryHandler
+from app.utils import http_client
+from benchmarks.timing import report
+
+SEARCHES = 500
+
+STUB_RESPONSE = json.dumps({
+    "docs": [
+        {
+            "title": "The Grapes of Wrath",
+            "author_name": ["John Steinbeck"],
+            "first_publish_year": 1939,
+            "cover_edition_key": "OL37811454M",
+            "edition_key": ["OL37811454M", "OL46855753M"],
+        }
+    ]
+}).encode("utf-8")
+
+
+class StubOpenLibrary(BaseHTTPRequestHandler):
+    # Keep-alive requires HTTP/1.1
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; avoid delayed-ACK stalls between them
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(STUB_RESPONSE)))
+        self.end_headers()
+        self.wfile.write(STUB_RESPONSE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ColdOpenLibraryHandler(LocalOpenLibraryHandler):
+    # The previous implementation: a new client, and so a new connection, per search
+    async def search_by_title(self, title):
+        async with httpx.AsyncClient() as client:
+            response = await client.get(self._build_search_url(title=title), timeout=self.search_timeout)
+            response.raise_for_status()
+            return response.json()
+
+
+async def measure(handler: LocalOpenLibraryHandler) -> list[float]:
+    timings = []
+    for i in range(SEARCHES):
+        start = time.perf_counter()
+        await handler.search_by_title(f"title {i}")
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+async def main() -> None:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOpenLibrary)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    search_title_url = f"http://127.0.0.1:{server.server_port}/search.json?title={{title}}&"
+
+    cold = ColdOpenLibraryHandler()
+    warm = LocalOpenLibraryHandler()
+    cold.search_title_url = warm.search_title_url = search_title_url
+
+    report("cold (client per search)", await measure(cold), width=32)
+    report("warm (shared pooled client)", await measure(warm), width=32)
+
+    await http_client.close_http_client()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
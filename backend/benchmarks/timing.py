@@ -0,0 +1,11 @@
+"""Helpers shared by the benchmarks"""
+import statistics
+
+
+def report(label: str, timings: list[float], width: int = 42) -> None:
+    """Print the mean, median and 99th percentile of `timings`, in seconds, as microseconds"""
+    timings = sorted(timings)
+    mean = statistics.fmean(timings) * 1e6
+    p50 = timings[len(timings) // 2] * 1e6
+    p99 = timings[int(len(timings) * 0.99)] * 1e6
+    print(f"{label:<{width}} mean {mean:8.1f}us  p50 {p50:8.1f}us  p99 {p99:8.1f}us")
@@ -107,7 +107,7 @@ function Book({ book, preview }: BookProps) {
       if (currentBook.image) {
         const coverImage: Partial<AvailableCoverImageInterface> = {
           unique_id: currentBook.image.source_id,
-          thumb_uri: currentBook.image.uri,
+          thumb_uri: currentBook.image.variant_uris?.thumbnail ?? currentBook.image.uri,
           uri: currentBook.image.uri,
         };
         setSelectedCoverImage(coverImage);
@@ -132,7 +132,7 @@ function Book({ book, preview }: BookProps) {
         // Put selected image first
         selectedCoverImages.push({
           unique_id: localCurrentBook.image.source_id,
-          thumb_uri: localCurrentBook.image.uri,
+          thumb_uri: localCurrentBook.image.variant_uris?.thumbnail ?? localCurrentBook.image.uri,
           uri: localCurrentBook.image.uri,
         });
       }
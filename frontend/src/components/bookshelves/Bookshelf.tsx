@@ -17,6 +17,7 @@ import useLazyLoad from "../../hooks/useLazyLoad";
 import LazyImage from "../common/LazyLoadImage";
 import {
   BookInterface,
+  BookSummaryInterface,
   BookshelfWithBooksInterface,
   SortableBookProperties,
 } from "../../interfaces/book_and_bookshelf";
@@ -43,7 +44,7 @@ function Bookshelf({ bookshelfId, preview }: BookshelfProps) {
     useState<BookshelfWithBooksInterface | null>(null);
   const [booksToAdd, setBooksToAdd] = useState<number[]>([]);
   const [booksThatCanBeAdded, setBooksThatCanBeAdded] = useState<
-    BookInterface[]
+    BookSummaryInterface[]
   >([]);
   const [loading, setLoading] = useState(true);
   const [showModal, setShowModal] = useState(false);
@@ -159,7 +160,7 @@ function Bookshelf({ bookshelfId, preview }: BookshelfProps) {
   };
 
   const fetchBooksThatCanBeAdded = async () => {
-    const booksThatCanBeAdded: BookInterface[] | boolean =
+    const booksThatCanBeAdded: BookSummaryInterface[] | boolean =
       await GetBooksNotOnBookshelf(_bookshelfId);
     if (typeof booksThatCanBeAdded == "boolean") {
       return false;
@@ -369,7 +370,7 @@ function Bookshelf({ bookshelfId, preview }: BookshelfProps) {
                   height="150px"
                   src={
                     book.image !== null
-                      ? book.image.uri
+                      ? book.image.variant_uris?.medium ?? book.image.uri
                       : createPlaceholderImage(
                           320,
                           484,
@@ -431,8 +432,8 @@ function Bookshelf({ bookshelfId, preview }: BookshelfProps) {
                   <LazyImage
                     key={String(book.id)}
                     src={
-                      book.image !== null
-                        ? book.image.uri
+                      book.thumbnail_uri !== null
+                        ? book.thumbnail_uri
                         : createPlaceholderImage(
                             320,
                             484,
@@ -16,6 +16,24 @@ export interface BookWithBookshelvesInterface extends BookInterface {
   bookshelves?: BookshelfInterface[];
 }
 
+export interface BookPageInterface {
+  books: BookWithBookshelvesInterface[];
+  next_cursor: string | null;
+}
+
+// Just enough of a book to pick it from a grid of covers
+export interface BookSummaryInterface {
+  id: number;
+  title: string;
+  author: string;
+  thumbnail_uri: string | null;
+}
+
+export interface BookSummaryPageInterface {
+  books: BookSummaryInterface[];
+  next_cursor: string | null;
+}
+
 export interface SortableBookProperties {
   id: number;
   title: string;
@@ -50,6 +68,7 @@ export interface BookshelfInterface {
 
 export interface BookshelfWithBooksInterface extends BookshelfInterface {
   books: BookInterface[];
+  next_cursor?: string | null;
 }
 
 export interface CreateOrUpdateBookshelfInterface {
@@ -66,6 +85,8 @@ export interface CoverImageInterface {
   source_id: string;
   extension: string;
   uri: string;
+  // Resized WebP copies by size: "thumbnail", "medium" and "large". Older covers may have none
+  variant_uris?: Record<string, string>;
 }
 
 enum CoverImageType {
@@ -1,5 +1,6 @@
 import { Base } from "./base";
 import {
+  BookPageInterface,
   BookWithBookshelvesInterface,
   CreateOrUpdateBookInterface,
 } from "../interfaces/book_and_bookshelf";
@@ -8,7 +9,21 @@ import { WorkInterface } from "../interfaces/work";
 export const GetBooks = async (): Promise<
   BookWithBookshelvesInterface[] | boolean
 > => {
-  return await Base("/books/");
+  // The API returns books a page at a time, so we follow cursors until exhausted
+  const books: BookWithBookshelvesInterface[] = [];
+  let cursor: string | null = null;
+  do {
+    const query: string = cursor
+      ? `?cursor=${encodeURIComponent(cursor)}&limit=500`
+      : "?limit=500";
+    const page: BookPageInterface | boolean = await Base(`/books/${query}`);
+    if (typeof page == "boolean") {
+      return page;
+    }
+    books.push(...page.books);
+    cursor = page.next_cursor;
+  } while (cursor);
+  return books;
 };
 
 export const CreateBook = async (
@@ -1,6 +1,7 @@
 import { Base } from "./base";
 import {
-  BookInterface,
+  BookSummaryInterface,
+  BookSummaryPageInterface,
   CreateOrUpdateBookshelfInterface,
 } from "../interfaces/book_and_bookshelf";
 import {
@@ -29,7 +30,27 @@ export const CreateBookshelf = async (
 export const GetBookshelf = async (
   id: number
 ): Promise<BookshelfWithBooksInterface | boolean> => {
-  return await Base(`/bookshelves/${id}`);
+  // The API returns a bookshelf's books a page at a time, so we follow cursors until exhausted
+  let bookshelf: BookshelfWithBooksInterface | null = null;
+  let cursor: string | null | undefined = null;
+  do {
+    const query: string = cursor
+      ? `?cursor=${encodeURIComponent(cursor)}&limit=500`
+      : "?limit=500";
+    const page: BookshelfWithBooksInterface | boolean = await Base(
+      `/bookshelves/${id}${query}`
+    );
+    if (typeof page == "boolean") {
+      return page;
+    }
+    if (bookshelf === null) {
+      bookshelf = page;
+    } else {
+      bookshelf.books.push(...page.books);
+    }
+    cursor = page.next_cursor;
+  } while (cursor);
+  return bookshelf;
 };
 
 export const UpdateBookshelf = async (
@@ -53,8 +74,24 @@ export const DeleteBookshelf = async (id: number): Promise<boolean> => {
 
 export const GetBooksNotOnBookshelf = async (
   id: number
-): Promise<BookInterface[] | boolean> => {
-  return await Base(`/bookshelves/${id}/books/exclude/`);
+): Promise<BookSummaryInterface[] | boolean> => {
+  // Only summaries are needed to pick books, and they come a page at a time
+  const books: BookSummaryInterface[] = [];
+  let cursor: string | null = null;
+  do {
+    const query: string = cursor
+      ? `?summary=true&cursor=${encodeURIComponent(cursor)}&limit=500`
+      : "?summary=true&limit=500";
+    const page: BookSummaryPageInterface | boolean = await Base(
+      `/bookshelves/${id}/books/exclude/${query}`
+    );
+    if (typeof page == "boolean") {
+      return page;
+    }
+    books.push(...page.books);
+    cursor = page.next_cursor;
+  } while (cursor);
+  return books;
 };
 
 export const AddBooksToBookshelf = async (
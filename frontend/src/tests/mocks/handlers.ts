@@ -4,7 +4,7 @@ import {
   BookWithBookshelvesInterface,
   BookshelfWithBooksInterface,
   BookshelfInterface,
-  BookInterface,
+  BookSummaryPageInterface,
 } from "../../interfaces/book_and_bookshelf";
 import { WorkInterface } from "../../interfaces/work";
 dotenv.config({ path: ".env.development" });
@@ -60,6 +60,7 @@ export const bookshelfHandlers = [
           },
         },
       ],
+      next_cursor: null,
     };
     return HttpResponse.json(response);
   }),
@@ -93,6 +94,7 @@ export const bookshelfHandlers = [
           },
         },
       ],
+      next_cursor: null,
     };
     return HttpResponse.json(response);
   }),
@@ -100,27 +102,17 @@ export const bookshelfHandlers = [
   http.get(
     `${process.env.REACT_APP_API_URL}/bookshelves/1/books/exclude/`,
     () => {
-      const response: BookInterface[] = [
-        {
-          id: 3,
-          title: "The Grapes of Wrath",
-          author: "John Steinbeck",
-          year: 1939,
-          olids: '["OL37811454M","OL46855753M","OL13890061M","OL7641090M"]',
-          read_status: "read",
-          read_start_date: "2022-02-13T05:00:00.000Z",
-          read_end_date: "2022-02-21T05:00:00.000Z",
-          rating: 5,
-          review: "I liked it!",
-          image: {
-            id: 1,
-            source: "open_library",
-            source_id: "OL14994208M",
-            uri: "/images/OL14994208M.jpg",
-            extension: ".jpg",
+      const response: BookSummaryPageInterface = {
+        books: [
+          {
+            id: 3,
+            title: "The Grapes of Wrath",
+            author: "John Steinbeck",
+            thumbnail_uri: "/images/OL14994208M.jpg",
           },
-        },
-      ];
+        ],
+        next_cursor: null,
+      };
       return HttpResponse.json(response);
     }
   ),
@@ -189,7 +181,7 @@ export const bookHandlers = [
         },
       },
     ];
-    return HttpResponse.json(response);
+    return HttpResponse.json({ books: response, next_cursor: null });
   }),
 
   http.get(`${process.env.REACT_APP_API_URL}/books/1`, () => {
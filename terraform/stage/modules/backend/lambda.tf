@@ -97,9 +97,16 @@ resource "aws_iam_policy" "lambda_vpc_policy" {
         Effect   = "Allow"
         Action   = [
           "s3:PutObject",
-          "s3:GetObject"
+          "s3:GetObject",
+          "s3:DeleteObject"
         ]
         Resource = "arn:aws:s3:::${aws_s3_bucket.images_bucket.bucket}/*"  # The bucket you're writing to
+      },
+      {
+        # Without it, checking for a missing cover returns 403 rather than 404
+        Effect   = "Allow"
+        Action   = "s3:ListBucket"
+        Resource = "arn:aws:s3:::${aws_s3_bucket.images_bucket.bucket}"
       }
     ] 
   })
@@ -155,10 +162,14 @@ resource "aws_lambda_function" "lambda_function" {
   environment {
     variables = {
       DATABASE_URL                  = "sqlite:////mnt/lambda/${var.app_name}.db",
+      # The database is on EFS, where WAL and memory mapping are unsafe across Lambda instances
+      SQLITE_PROFILE                = "production"
       LOCAL_IMAGE_DIRECTORY         = "/tmp",
       S3_IMAGE_BUCKET               = aws_s3_bucket.images_bucket.bucket,
       STORAGE_BACKEND               = "s3"
       NON_VPC_LAMBDA_FUNCTION_NAME  = "${var.app_name}-backend-lambda-function-no-vpc-${var.environment}"
+      # Lambda has no /dev/shm for process pools, so covers are resized on threads
+      IMAGE_VARIANT_WORKERS         = "0"
     }
   }
 